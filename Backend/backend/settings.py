@@ -156,3 +156,11 @@ REST_FRAMEWORK = {
 }
 CSRF_TRUSTED_ORIGINS = ['http://localhost:3000', 'http://localhost:8000']
 CORS_ALLOW_CREDENTIALS = True
+
+# Code execution sandbox (see coding/additional/config.py for every option)
+CODE_EXECUTION = {
+    'BACKEND': 'docker',  # 'docker', 'local' or 'fake'
+    'CONTAINER': 'test_container',
+    'POOL_SIZE': 4,
+    'JOB_DB_PATH': BASE_DIR / 'submission_jobs.sqlite3',
+}
@@ -0,0 +1,123 @@
+import collections
+import math
+import threading
+import time
+
+from . import config, jobs
+
+# Kinds of work with their own admission budget, so a surge of "Run" clicks
+# can't use up the room kept for graded submissions.
+RUN = "run"
+SUBMIT = "submit"
+
+# Completions counted for the throughput estimate behind Retry-After
+THROUGHPUT_WINDOW = 60
+
+
+class Overloaded(Exception):
+    def __init__(self, budget, retry_after):
+        super().__init__(f"The {budget} queue is full.")
+        self.budget = budget
+        self.retry_after = retry_after
+
+
+class Budget:
+    """
+    Bounded admission for one kind of work in this process: at most
+    ADMISSION_LIMITS[name] requests are in the system at once, the rest are
+    turned away with an estimate of when to retry.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.rejected = 0
+        self.completions = collections.deque()
+
+    def limit(self):
+        return config.get('ADMISSION_LIMITS')[self.name]
+
+    def pending(self):
+        return self.outstanding
+
+    def throughput(self):
+        # Completions per second over the recent window (or as much of it
+        # as has been observed)
+        now = time.monotonic()
+        while self.completions and self.completions[0] < now - THROUGHPUT_WINDOW:
+            self.completions.popleft()
+        if not self.completions:
+            return 0.0
+        return len(self.completions) / max(now - self.completions[0], 1)
+
+    def retry_after(self, pending):
+        """
+        Seconds until enough of the work ahead has finished to make room,
+        at the current throughput.
+        """
+        rate = self.throughput()
+        if not rate:
+            return config.get('ADMISSION_DEFAULT_RETRY_AFTER')
+        return max(1, min(math.ceil((pending - self.limit() + 1) / rate), config.get('ADMISSION_MAX_RETRY_AFTER')))
+
+    def _ensure_room(self):
+        pending = self.pending()
+        if pending >= self.limit():
+            self.rejected += 1
+            raise Overloaded(self.name, self.retry_after(pending))
+
+    def check(self):
+        # For work that is tracked elsewhere (queued jobs): only look
+        with self.lock:
+            self._ensure_room()
+
+    def acquire(self):
+        """
+        Admit one request or raise Overloaded; every successful acquire()
+        must be paired with release().
+        """
+        with self.lock:
+            self._ensure_room()
+            self.outstanding += 1
+
+    def release(self):
+        with self.lock:
+            self.outstanding -= 1
+            self.completions.append(time.monotonic())
+
+    def stats(self):
+        with self.lock:
+            return {
+                "limit": self.limit(),
+                "pending": self.pending(),
+                "rejected": self.rejected,
+                "throughput_per_second": self.throughput(),
+            }
+
+
+class SubmitBudget(Budget):
+    """
+    Graded submissions also count the queued and running jobs in the shared
+    job queue, so the bound holds across every backend process.
+    """
+
+    def pending(self):
+        return self.outstanding + jobs.pending_count()
+
+    def throughput(self):
+        return super().throughput() + jobs.finished_since(THROUGHPUT_WINDOW) / THROUGHPUT_WINDOW
+
+
+BUDGETS = {
+    RUN: Budget(RUN),
+    SUBMIT: SubmitBudget(SUBMIT),
+}
+
+
+def get_budget(name):
+    return BUDGETS[name]
+
+
+def stats():
+    return {name: budget.stats() for name, budget in BUDGETS.items()}
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from . import config
+
+
+def cache_key(language, flags, source_code):
+    """
+    Content address of a compiled submission: language, compiler flags and
+    the SHA-256 of the source.
+    """
+    source_hash = hashlib.sha256(source_code.encode("utf-8")).hexdigest()
+    material = json.dumps([language, list(flags), source_hash])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Size-bounded LRU index of the artifacts compiled inside the sandbox.
+    Entries in use by a running submission are pinned and never evicted.
+    Evicting only forgets an artifact: the sandbox's artifacts are shared
+    by every backend process, so the sandbox deletes them itself.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> size in bytes
+        self.pins = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, key):
+        """
+        Pin and return True when the artifact is already compiled.
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return False
+            self.hits += 1
+            self.entries.move_to_end(key)
+            self.pins[key] = self.pins.get(key, 0) + 1
+            return True
+
+    def add(self, key, size):
+        """
+        Record a freshly compiled artifact, pinned for the caller.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries[key]
+            self.entries[key] = size
+            self.entries.move_to_end(key)
+            self.total_bytes += size
+            self.pins[key] = self.pins.get(key, 0) + 1
+        self._evict()
+
+    def release(self, key):
+        with self.lock:
+            if self.pins.get(key, 0) > 1:
+                self.pins[key] -= 1
+            else:
+                self.pins.pop(key, None)
+        self._evict()
+
+    def invalidate(self, key):
+        with self.lock:
+            size = self.entries.pop(key, None)
+            if size is not None:
+                self.total_bytes -= size
+
+    def _evict(self):
+        with self.lock:
+            for key in list(self.entries):
+                if self.total_bytes <= self.max_bytes:
+                    break
+                if key in self.pins:
+                    continue
+                self.total_bytes -= self.entries.pop(key)
+                self.evictions += 1
+
+    def contains(self, key):
+        # Peek without pinning or counting a lookup
+        with self.lock:
+            return key in self.entries
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class HitCounter:
+    """
+    Hits and misses of the sandbox's C/C++ compiler cache, as reported back
+    by compile requests.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, outcome):
+        with self.lock:
+            if outcome == "hit":
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+compiler_cache_counter = HitCounter()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ArtifactCache(config.get('ARTIFACT_CACHE_MAX_BYTES'))
+        return _cache
@@ -0,0 +1,284 @@
+import base64
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tarfile
+import subprocess
+import tempfile
+import threading
+import time
+
+from . import config, docker_api
+from .sandbox_pool import SandboxError, SandboxPool
+from .scheduler import SandboxScheduler
+
+LOCAL_WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'sandbox', 'worker.py')
+
+
+def pool_languages():
+    # Languages whose warm workers are sized on their own, if pools adapt
+    return config.get('POOL_LANGUAGES') if config.get('POOL_ADAPTIVE') else None
+
+
+class ExecutorBackend:
+    """
+    Where submissions are compiled and run.  Every backend speaks the
+    sandbox worker protocol: execute() takes one request (ping, upload,
+    stage, compile, run, run_batch, discard) and returns the worker's
+    answer, or raises Cancelled if cancel (a CancelToken) fires first.
+    """
+    name = None
+
+    def execute(self, payload, timeout=None, cancel=None):
+        raise NotImplementedError
+
+    def sandboxes(self):
+        """
+        Names of the healthy sandboxes a submission can be placed on, or an
+        empty list when the backend has a single one.
+        """
+        return []
+
+    def least_loaded(self, candidates=None):
+        return None
+
+    def stats(self):
+        return {"name": self.name}
+
+    def close(self):
+        pass
+
+
+class DockerBackend(ExecutorBackend):
+    """
+    Warm workers inside the sandbox containers (CONTAINERS, or just
+    CONTAINER).  They are started through the Docker Engine API on the
+    daemon socket (DOCKER_TRANSPORT 'api') or with the docker CLI ('cli').
+    With several containers each submission is scheduled onto the
+    least-loaded healthy one.
+    """
+    name = "docker"
+
+    def __init__(self):
+        self.command = ["python3", config.get('WORKER_SCRIPT')]
+        self.transport = config.get('DOCKER_TRANSPORT')
+        self.client = docker_api.DockerClient(config.get('DOCKER_SOCKET')) if self.transport == 'api' else None
+        containers = config.get('CONTAINERS') or [config.get('CONTAINER')]
+        self.scheduler = SandboxScheduler(containers, self.make_pool)
+
+    def make_pool(self, container, replacing):
+        if replacing:
+            self.restart(container)
+        if self.transport == 'api':
+            return SandboxPool(
+                self.command,
+                config.get('POOL_SIZE'),
+                factory=lambda: docker_api.DockerExecWorker(self.client, container, self.command),
+                languages=pool_languages(),
+            )
+        return SandboxPool(["docker", "exec", "-i", container] + self.command, config.get('POOL_SIZE'),
+                           languages=pool_languages())
+
+    def restart(self, container):
+        # Replace an unhealthy sandbox with a freshly started container
+        if self.transport == 'api':
+            self.client.restart(container)
+        else:
+            try:
+                subprocess.run(["docker", "restart", "-t", "0", container], capture_output=True, timeout=60)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                raise SandboxError(f"Could not restart {container}: {e}")
+
+    def execute(self, payload, timeout=None, cancel=None):
+        return self.scheduler.execute(payload, timeout, cancel)
+
+    def sandboxes(self):
+        names = self.scheduler.names()
+        return names if len(self.scheduler.sandboxes) > 1 else []
+
+    def least_loaded(self, candidates=None):
+        return self.scheduler.least_loaded(candidates)
+
+    def stats(self):
+        return {"name": self.name, "transport": self.transport, "sandboxes": self.scheduler.stats()}
+
+    def close(self):
+        self.scheduler.close()
+
+
+class LocalBackend(ExecutorBackend):
+    """
+    Warm workers running directly on this host.  Isolation comes from the
+    worker's rlimits and per-run temp directories inside a private root,
+    optionally wrapped in unshare(1) namespaces.  Lowest latency, meant for
+    single-host deployments that trust that level of isolation.
+    """
+    name = "local"
+
+    def __init__(self):
+        self.root = config.get('LOCAL_ROOT') or tempfile.mkdtemp(prefix="sandbox-")
+        self.owns_root = not config.get('LOCAL_ROOT')
+        if self.owns_root:
+            # A worker started as root runs programs under a uid of its own,
+            # which has to reach its workspace under runs/
+            os.chmod(self.root, 0o711)
+        command = [sys.executable, os.path.abspath(LOCAL_WORKER_SCRIPT)]
+        if config.get('LOCAL_UNSHARE'):
+            command = list(config.get('LOCAL_UNSHARE_COMMAND')) + command
+        env = dict(os.environ, SANDBOX_CODE_ROOT=self.root)
+        self.pool = SandboxPool(command, config.get('POOL_SIZE'), env, languages=pool_languages())
+
+    def execute(self, payload, timeout=None, cancel=None):
+        return self.pool.execute(payload, timeout, cancel)
+
+    def stats(self):
+        return {"name": self.name, "pool": self.pool.stats()}
+
+    def close(self):
+        self.pool.close()
+        if self.owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+class FakeBackend(ExecutorBackend):
+    """
+    Deterministic in-process stand-in for tests and benchmarks.  Programs
+    "echo" their input: stdout is the input followed by a newline, unless
+    the source contains FAKE_COMPILE_ERROR, which fails to compile.  Output
+    is checked token by token.  Every request takes FAKE_LATENCY_MS.
+    """
+    name = "fake"
+    COMPILE_ERROR_MARKER = "FAKE_COMPILE_ERROR"
+
+    def __init__(self):
+        self.latency = config.get('FAKE_LATENCY_MS') / 1000
+        self.artifacts = {}
+        self.bundles = {}
+        self.testdata = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def unpack(data):
+        members = {}
+        with tarfile.open(fileobj=io.BytesIO(base64.b64decode(data))) as tar:
+            for member in tar.getmembers():
+                members[member.name] = tar.extractfile(member).read().decode("utf-8")
+        return members
+
+    def bundle_member(self, payload, name):
+        with self.lock:
+            return self.bundles[payload["bundle"]][name]
+
+    def case_input(self, payload, case):
+        if "testdata" in payload:
+            with self.lock:
+                return self.testdata[payload["testdata"]][f"inputs/{case}"]
+        if "bundle" in payload:
+            return self.bundle_member(payload, f"inputs/{case}")
+        return payload["input"]
+
+    def expected_output(self, payload, case):
+        expected = payload.get("expected")
+        if isinstance(expected, list):
+            expected = expected[case]
+        return expected
+
+    def echo(self, input_text, expected=None):
+        stdout = input_text + "\n"
+        return {
+            "stdout": stdout,
+            "stderr": "",
+            "returncode": 0,
+            "time_ms": int(self.latency * 1000),
+            "cpu_ms": 0,
+            "memory_kb": 0,
+            "verdict": "OK" if expected is None or stdout.split() == expected.split() else "WA",
+        }
+
+    def execute(self, payload, timeout=None, cancel=None):
+        if self.latency:
+            time.sleep(self.latency)
+        if cancel is not None:
+            cancel.check()
+        op = payload.get("op")
+        if op == "ping":
+            return {"ok": True}
+        if op == "upload":
+            members = self.unpack(payload["data"])
+            with self.lock:
+                self.bundles[payload["bundle"]] = members
+                response = {"bundle": payload["bundle"]}
+                if "testdata" in payload:
+                    response["testdata_staged"] = payload["testdata"] in self.testdata
+            return response
+        if op == "stage":
+            members = self.unpack(payload["data"])
+            with self.lock:
+                self.testdata.setdefault(payload["testdata"], members)
+            return {"testdata": payload["testdata"], "staged": True}
+        if op == "compile":
+            if "bundle" in payload:
+                source = next(text for name, text in self.bundles[payload["bundle"]].items()
+                              if name.startswith("code."))
+            else:
+                source = payload["source"]
+            if self.COMPILE_ERROR_MARKER in source:
+                return {"compile_error": "fake compile error"}
+            artifact = payload.get("key") or hashlib.sha256(source.encode("utf-8")).hexdigest()
+            with self.lock:
+                cached = artifact in self.artifacts
+                self.artifacts[artifact] = source
+            return {"artifact": artifact, "size": len(source), "cached": cached}
+        if op == "run":
+            with self.lock:
+                known = payload["artifact"] in self.artifacts
+            if not known:
+                return {"error": "Unknown artifact"}
+            case = payload.get("case")
+            return self.echo(self.case_input(payload, case), self.expected_output(payload, case))
+        if op == "run_batch":
+            with self.lock:
+                known = payload["artifact"] in self.artifacts
+            if not known:
+                return {"error": "Unknown artifact"}
+            if "cases" in payload:
+                cases = payload["cases"]
+                inputs = [self.case_input(payload, case) for case in cases]
+            else:
+                inputs = payload["inputs"]
+                cases = list(range(len(inputs)))
+            results = []
+            for case, input_text in zip(cases, inputs):
+                results.append(self.echo(input_text, self.expected_output(payload, case)))
+                if payload.get("stop_on_first_failure") and results[-1]["verdict"] != "OK":
+                    break
+            return {"results": results}
+        if op == "discard":
+            with self.lock:
+                self.artifacts.pop(payload.get("artifact"), None)
+                self.bundles.pop(payload.get("bundle"), None)
+            return {"ok": True}
+        return {"error": f"Unknown op: {op}"}
+
+
+BACKENDS = {
+    DockerBackend.name: DockerBackend,
+    LocalBackend.name: LocalBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = config.get('BACKEND')
+            if name not in BACKENDS:
+                raise SandboxError(f"Unknown execution backend: {name}")
+            _backend = BACKENDS[name]()
+        return _backend
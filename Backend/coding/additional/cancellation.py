@@ -0,0 +1,120 @@
+import threading
+from contextlib import contextmanager
+
+
+class Cancelled(Exception):
+    def __init__(self):
+        super().__init__("The execution was cancelled.")
+
+
+class CancelToken:
+    """
+    Cancellation flag of one execution.  Sandbox requests in flight
+    register how to abort themselves (on_cancel); cancel() runs those right
+    away so the sandbox is freed, and later work checks the flag.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks = []
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.event.set()
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            callback()
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """
+        Call callback if the token is cancelled while the block runs.
+        Raises Cancelled up front if it already is.
+        """
+        with self.lock:
+            if self.event.is_set():
+                raise Cancelled()
+            self.callbacks.append(callback)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.callbacks.remove(callback)
+
+
+@contextmanager
+def child_of(parent):
+    """
+    A token of its own for part of an execution: cancelled along with
+    parent (if any), but cancelling it leaves parent alone.
+    """
+    token = CancelToken()
+    if parent is None:
+        yield token
+        return
+    with parent.on_cancel(token.cancel):
+        yield token
+
+
+class Slots:
+    """
+    At most one execution per slot (student, problem): claiming a slot
+    cancels the execution that held it before.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = {}  # slot -> CancelToken of its current execution
+        self.superseded = 0
+        self.cancelled = 0
+
+    def claim(self, slot):
+        token = CancelToken()
+        with self.lock:
+            previous = self.tokens.get(slot)
+            self.tokens[slot] = token
+            if previous is not None:
+                self.superseded += 1
+        if previous is not None:
+            previous.cancel()
+        return token
+
+    def release(self, slot, token):
+        with self.lock:
+            if self.tokens.get(slot) is token:
+                del self.tokens[slot]
+
+    def cancel(self, slot):
+        """
+        Cancel the slot's current execution; False if there is none.
+        """
+        with self.lock:
+            token = self.tokens.pop(slot, None)
+            if token is not None:
+                self.cancelled += 1
+        if token is None:
+            return False
+        token.cancel()
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "in_flight": len(self.tokens),
+                "superseded": self.superseded,
+                "cancelled": self.cancelled,
+            }
+
+
+slots = Slots()
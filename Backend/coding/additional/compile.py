@@ -1,94 +1,710 @@
+import base64
+import hashlib
+import io
 import json
-import subprocess
-import tempfile
-import os
+import queue
+import tarfile
+import threading
+import uuid
 from django.http import JsonResponse
+from . import artifact_cache, backends, cancellation, config, fair_queue, result_memo, sandbox_pool, scheduler
 
 
-def compilation(source_code, input_data, expected_output, language):
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # Shared by every submission; its size is the global parallelism cap.
+    # Graded submissions go first, and students share each class fairly.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = fair_queue.FairExecutor(
+                max_workers=config.get('MAX_PARALLEL_GLOBAL'),
+                quantum=config.get('FAIR_QUANTUM'),
+                thread_name_prefix="sample-runner",
+            )
+        return _executor
+
+
+def default_schedule(schedule=None):
+    # Priority class and fair-share key (student) of an execution
+    return dict({"priority": fair_queue.SAMPLE_RUN, "tenant": None}, **(schedule or {}))
+
+
+def get_artifact_cache():
+    # Only an index: the artifacts are shared by every backend process, so
+    # the sandbox evicts them itself (ARTIFACT_CACHE_MAX_BYTES per sandbox)
+    return artifact_cache.get_cache()
+
+
+EXTENSIONS = {'python': 'py', 'c': 'c', 'cpp': 'cpp', 'java': 'java'}
+
+
+def sample_input(sample):
+    return "\n".join(map(str, sample["input"]))  # Convert each item to a string
+
+
+def tar_bundle(members):
+    # In-memory gzipped tar of (name, text) members; compression mostly
+    # drops the tar format's zero padding
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for name, text in members:
+            data = text.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return archive.getvalue()
+
+
+def submission_bundle(source_code, language, samples):
+    """
+    In-memory tar of the source and every sample's input, so a submission
+    reaches the sandbox in a single transfer.  With staged test data the
+    samples are left out and only the source travels.
+    """
+    members = [(f"code.{EXTENSIONS[language]}", source_code)]
+    members += [(f"inputs/{index}", sample_input(sample)) for index, sample in enumerate(samples)]
+    return tar_bundle(members)
+
+
+def testdata_id(samples):
+    # Content hash of a problem's test cases: an edited problem is a new
+    # version and gets staged afresh
+    return hashlib.sha256(json.dumps(samples, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def testdata_bundle(samples):
+    # Inputs only: submissions can read the sandbox's files, so expected
+    # outputs never go there and travel with each run instead
+    return tar_bundle([(f"inputs/{index}", sample_input(sample)) for index, sample in enumerate(samples)])
+
+
+_staged = set()
+_staging = {}  # test data id -> Event set once its staging finishes
+_staged_lock = threading.Lock()
+
+
+def stage_testdata(samples, sandbox=None):
+    """
+    Write a problem's test cases into the sandbox once, keyed by their
+    content hash.  Returns the test data id runs refer to, or None if it
+    couldn't be staged.  Concurrent callers for the same test data share
+    one upload.
+    """
+    testdata = scheduler.placed(testdata_id(samples), sandbox)
+    with _staged_lock:
+        staging = _staging.get(testdata)
+        leader = staging is None
+        if leader:
+            staging = _staging[testdata] = threading.Event()
+    if not leader:
+        staging.wait()
+        with _staged_lock:
+            return testdata if testdata in _staged else None
+    try:
+        return send_testdata(testdata, samples)
+    finally:
+        with _staged_lock:
+            del _staging[testdata]
+        staging.set()
+
+
+def send_testdata(testdata, samples):
+    try:
+        response = backends.get_backend().execute({
+            "op": "stage",
+            "testdata": testdata,
+            "data": base64.b64encode(testdata_bundle(samples)).decode("ascii"),
+        })
+    except sandbox_pool.SandboxError:
+        return None
+    if not response.get("staged"):
+        return None
+    with _staged_lock:
+        _staged.add(testdata)
+    return testdata
+
+
+def stage_problems(problems):
+    """
+    Stage the sample and hidden test cases of every problem on every
+    sandbox, e.g. when a contest starts, so the first submissions don't
+    pay for it.
+    """
+    for problem in problems:
+        for test_case in ("samples", "hidden_samples"):
+            samples = problem.get(test_case)
+            if not isinstance(samples, list) or not samples:
+                continue
+            for sandbox in backends.get_backend().sandboxes() or [None]:
+                with _staged_lock:
+                    staged = scheduler.placed(testdata_id(samples), sandbox) in _staged
+                if not staged:
+                    stage_testdata(samples, sandbox)
+
+
+def choose_sandbox(source_code, language, exclude=()):
+    """
+    Sandbox to place a submission on when the backend has several: the
+    least-loaded healthy one, preferring those that already hold its
+    compiled artifact.  None lets the backend decide.
+    """
+    backend = backends.get_backend()
+    names = [name for name in backend.sandboxes() if name not in exclude]
+    if not names:
+        return None
+    key = artifact_cache.cache_key(language, config.get('COMPILER_FLAGS').get(language, []), source_code)
+    cache = get_artifact_cache()
+    holding = [name for name in names if cache.contains(scheduler.placed(key, name))]
+    try:
+        return backend.least_loaded(holding or names)
+    except sandbox_pool.SandboxError:
+        return None
+
+
+def upload_bundle(source_code, language, samples, sandbox=None):
+    """
+    Push the submission's bundle into the sandbox.  The samples travel as
+    the problem's staged test data, staged first if the sandbox doesn't have
+    it yet; only when staging fails do their inputs go into the bundle.
+    Returns {"bundle": id, "testdata": id or None} or an error.
+    """
+    bundle_id = scheduler.placed(uuid.uuid4().hex, sandbox)
+    testdata = scheduler.placed(testdata_id(samples), sandbox)
+    try:
+        uploaded = backends.get_backend().execute({
+            "op": "upload",
+            "bundle": bundle_id,
+            "testdata": testdata,
+            "data": base64.b64encode(submission_bundle(source_code, language, [])).decode("ascii"),
+        })
+        if "error" in uploaded or uploaded.get("testdata_staged"):
+            return dict(uploaded, testdata=testdata)
+        testdata = stage_testdata(samples, sandbox)
+        if testdata:
+            return dict(uploaded, testdata=testdata)
+        # Fall back to carrying the inputs with the submission
+        discard_bundle(bundle_id)
+        return backends.get_backend().execute({
+            "op": "upload",
+            "bundle": bundle_id,
+            "data": base64.b64encode(submission_bundle(source_code, language, samples)).decode("ascii"),
+        })
+    except sandbox_pool.SandboxError as e:
+        return {"error": str(e)}
+
+
+def discard_bundle(bundle_id):
+    try:
+        backends.get_backend().execute({"op": "discard", "bundle": bundle_id})
+    except sandbox_pool.SandboxError:
+        pass
+
+
+def compile_submission(source_code, language, bundle_id=None, sandbox=None, cancel=None):
+    """
+    Compile the submission once inside the sandbox.  Returns an artifact
+    handle to run test cases against, or a compile error.  Byte-identical
+    sources reuse the cached artifact without invoking the compiler.  With
+    a bundle the sandbox reads the source from it instead of the request.
+    Raises cancellation.Cancelled if cancel is cancelled meanwhile.
+    """
+    # Determine the file extension based on language
+    ext = EXTENSIONS.get(language)
+    if not ext:
+        return {"error": "Unsupported language"}
+
+    flags = config.get('COMPILER_FLAGS').get(language, [])
+    key = scheduler.placed(artifact_cache.cache_key(language, flags, source_code), sandbox)
+    cache = get_artifact_cache()
+    if cache.lookup(key):
+        return {"artifact": key}
+
+    compile_time_limit = config.get('COMPILE_TIME_LIMIT')
     try:
-        # Determine the file extension based on language
-        ext = {'python': 'py', 'c': 'c', 'cpp': 'cpp', 'java': 'java'}.get(language)
-        if not ext:
-            return {"error": "Unsupported language"}
-
-        # Set up the temporary directory path
-        temp_dir = "temp_dir"
-        os.makedirs(temp_dir, exist_ok=True)
-
-        # Define paths for source code and input file on the local host
-        host_source_file_path = os.path.join(temp_dir, f"code.{ext}")
-        host_input_file_path = os.path.join(temp_dir, "input.txt")
-
-        # Write the source code to a file in temp_dir
-        with open(host_source_file_path, "w") as source_file:
-            source_file.write(source_code)
-
-        # Convert input_data items to strings and write them to a file in temp_dir
-        with open(host_input_file_path, "w") as input_file:
-            input_file.write("\n".join(map(str, input_data)))  # Convert each item to a string
-
-        # Define paths for source code and input file in the Docker container
-        container_source_file_path = f"/code/code.{ext}"
-        container_input_file_path = "/code/input.txt"
-
-        # Copy the source code and input file into the Docker container
-        subprocess.run(["docker", "cp", host_source_file_path, f"test_container:{container_source_file_path}"])
-        subprocess.run(["docker", "cp", host_input_file_path, f"test_container:{container_input_file_path}"])
-
-        # Execute compile.sh inside the container
-        result = subprocess.run(
-            [
-                "docker", "exec", "test_container",
-                "bash", "/code/compile.sh", language, container_source_file_path, container_input_file_path
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-
-        # Capture and return output
-        return {
-            "input": input_data,
-            "expected_output": expected_output,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "status": "Success" if result.returncode == 0 else "Error"
+        payload = {"bundle": bundle_id} if bundle_id else {"source": source_code}
+        compiled = backends.get_backend().execute({
+            **payload,
+            "op": "compile",
+            "language": language,
+            "flags": flags,
+            "key": key,
+            "compile_time_limit": compile_time_limit,
+            "artifact_cache_max_bytes": config.get('ARTIFACT_CACHE_MAX_BYTES'),
+            "warm_jvm": config.get('JAVA_WARM_JVM'),
+        }, timeout=compile_time_limit + config.get('SANDBOX_GRACE_SECONDS'), cancel=cancel)
+    except sandbox_pool.SandboxError as e:
+        return {"error": str(e)}
+
+    if "compiler_cache" in compiled:
+        artifact_cache.compiler_cache_counter.record(compiled["compiler_cache"])
+    if "artifact" in compiled:
+        cache.add(key, compiled["size"])
+    return compiled
+
+
+def execution_stats():
+    return {
+        "artifact_cache": get_artifact_cache().stats(),
+        "compiler_cache": artifact_cache.compiler_cache_counter.stats(),
+        "backend": backends.get_backend().stats(),
+        "executor": get_executor().stats(),
+        "result_memo": result_memo.get_memo().stats(),
+        "cancellation": cancellation.slots.stats(),
+    }
+
+
+class CompiledArtifact:
+    """
+    The artifact a submission's samples run against.  If the sandbox lost
+    it (evicted for another backend process's compiles, or the container
+    was restarted) it is recompiled once and the samples that hit the loss
+    run again, within the same evaluation.
+    """
+
+    def __init__(self, key, recompile):
+        self.key = key
+        self.recompile = recompile
+        self.generation = 0
+        self.pinned = [key]
+        self.lock = threading.Lock()
+
+    def run(self, attempt):
+        """
+        attempt(key) against the artifact, once more after a recompile if
+        the sandbox answers "Unknown artifact".
+        """
+        with self.lock:
+            key, generation = self.key, self.generation
+        response = attempt(key)
+        if response.get("error") == "Unknown artifact":
+            key = self.replace(generation)
+            if key:
+                response = attempt(key)
+        return response
+
+    def replace(self, generation):
+        # The first sample to notice the loss recompiles; the others wait
+        # for it and use the result
+        with self.lock:
+            if generation == self.generation:
+                get_artifact_cache().invalidate(self.key)
+                compiled = self.recompile()
+                if "artifact" not in compiled:
+                    return None
+                self.key = compiled["artifact"]
+                self.pinned.append(self.key)
+                self.generation += 1
+            return self.key
+
+    def release(self):
+        # Unpin; the index decides when to forget the artifact
+        for key in self.pinned:
+            get_artifact_cache().release(key)
+
+
+def execution_limits(problem, language):
+    """
+    Time (seconds) and memory (MB) limits for one test case: the problem's
+    own time_limit/memory_limit if set, else the per-language defaults.
+    Also how much output a case may produce and how it is checked.
+    """
+    return {
+        "time_limit": float(problem.get("time_limit") or config.get('TIME_LIMITS').get(language, 2)),
+        "memory_limit_mb": int(problem.get("memory_limit") or config.get('MEMORY_LIMITS_MB').get(language, 256)),
+        "output_limit_kb": config.get('OUTPUT_LIMIT_KB'),
+        "output_excerpt_kb": config.get('OUTPUT_EXCERPT_KB'),
+        "checker": dict(config.get('OUTPUT_CHECKER'), **(problem.get("checker") or {})),
+    }
+
+
+def compilation(artifact, input_data, expected_output, language, limits, stdin=None, cancel=None):
+    # Run the already compiled artifact against a single sample; stdin
+    # points at its input in the staged test data or the submission's
+    # bundle, if there is one.  The sandbox checks the output against the
+    # expected one, sent along, as it is produced.
+    stdin = stdin or {"input": "\n".join(map(str, input_data))}  # Convert each item to a string
+    stdin = dict(stdin, expected=str(expected_output))
+    result = artifact.run(lambda key: run_artifact(key, stdin, language, limits, cancel))
+    if "error" in result:
+        return {"error": result["error"]}
+
+    return sample_result(input_data, expected_output, result)
+
+
+def run_artifact(artifact, stdin, language, limits, cancel):
+    try:
+        result = backends.get_backend().execute({
+            **stdin,
+            "op": "run",
+            "language": language,
+            "artifact": artifact,
+            "time_limit": limits["time_limit"],
+            "memory_limit_mb": limits["memory_limit_mb"],
+            "output_limit_kb": limits["output_limit_kb"],
+            "output_excerpt_kb": limits["output_excerpt_kb"],
+            "checker": limits["checker"],
+            "zygote": config.get('PYTHON_ZYGOTE'),
+            "warm_jvm": config.get('JAVA_WARM_JVM'),
+        }, timeout=limits["time_limit"] + config.get('SANDBOX_GRACE_SECONDS'), cancel=cancel)
+    except sandbox_pool.SandboxError as e:
+        return {"error": str(e)}
+    return result
+
+
+def sample_result(input_data, expected_output, result):
+    # Capture and return output; stdout/stderr are excerpts, and diff says
+    # where a wrong answer first differs
+    sample = {
+        "input": input_data,
+        "expected_output": expected_output,
+        "stdout": result["stdout"],
+        "stderr": result["stderr"],
+        "output_truncated": result.get("output_truncated", False),
+        "time_ms": result["time_ms"],
+        "memory_kb": result["memory_kb"],
+        "verdict": result["verdict"],
+        "status": "Success" if result["verdict"] == "OK" else "Error"
+    }
+    if "diff" in result:
+        sample["diff"] = result["diff"]
+    return sample
+
+
+def run_batch(artifact, samples, language, limits, on_result=None, collect=True, stop_on_first_failure=False,
+              cases=None, cancel=None):
+    """
+    Run every sample in one interpreter inside the sandbox (Python harness
+    mode) and hand the per-sample results back in order.  cases ({"testdata"}
+    or {"bundle"}) says where in the sandbox the inputs are.  With
+    stop_on_first_failure the sandbox stops at the first failing sample and
+    the rest are skipped.
+    """
+    if cases:
+        stdin = dict(cases, cases=list(range(len(samples))))
+    else:
+        stdin = {"inputs": [sample_input(sample) for sample in samples]}
+    stdin["expected"] = [str(sample["output"]) for sample in samples]
+
+    def attempt(key):
+        try:
+            return backends.get_backend().execute({
+                **stdin,
+                "op": "run_batch",
+                "language": language,
+                "artifact": key,
+                "time_limit": limits["time_limit"],
+                "memory_limit_mb": limits["memory_limit_mb"],
+                "output_limit_kb": limits["output_limit_kb"],
+                "output_excerpt_kb": limits["output_excerpt_kb"],
+                "checker": limits["checker"],
+                "stop_on_first_failure": stop_on_first_failure,
+            }, timeout=limits["time_limit"] * len(samples) + config.get('SANDBOX_GRACE_SECONDS'), cancel=cancel)
+        except sandbox_pool.SandboxError as e:
+            return {"error": str(e)}
+
+    response = artifact.run(attempt)
+
+    results = []
+    for index, sample in enumerate(samples):
+        if "error" in response:
+            result = {"error": response["error"]}
+        elif index >= len(response["results"]):
+            result = skipped_result(sample)
+        else:
+            result = sample_result(sample["input"], sample["output"], response["results"][index])
+        if on_result:
+            on_result(index, result)
+        if collect:
+            results.append(result)
+    return results
+
+
+def sample_passed(result):
+    # The sandbox has already compared the output (verdict WA otherwise)
+    return result.get("status") == "Success"
+
+
+def skipped_result(sample):
+    return {
+        "input": sample["input"],
+        "expected_output": sample["output"],
+        "stdout": "",
+        "stderr": "",
+        "status": "Skipped"
+    }
+
+
+def run_samples(artifact, samples, language, limits, on_result=None, collect=True, stop_on_first_failure=False,
+                cases=None, schedule=None, cancel=None):
+    """
+    Run the samples concurrently, at most MAX_PARALLEL_PER_SUBMISSION at a
+    time, and return the results in the order of the samples.  on_result is
+    called with (index, result) as soon as each sample finishes; with
+    collect=False results are only handed to on_result and not kept.
+    Samples queue for the shared executor under the given schedule, each
+    costing its time limit.
+
+    With stop_on_first_failure the first failing sample settles the verdict:
+    samples still running are stopped and those that haven't started are
+    skipped instead of run.  Once cancel is cancelled the remaining samples
+    are skipped too and cancellation.Cancelled is raised.
+    """
+    slots = threading.BoundedSemaphore(config.get('MAX_PARALLEL_PER_SUBMISSION'))
+
+    def run(index, sample, settled):
+        try:
+            if settled.cancelled:
+                result = skipped_result(sample)
+            else:
+                stdin = dict(cases, case=index) if cases else None
+                try:
+                    result = compilation(artifact, sample["input"], sample["output"], language, limits, stdin,
+                                         settled)
+                except cancellation.Cancelled:
+                    if cancel and cancel.cancelled:
+                        raise
+                    # Stopped because another sample already failed
+                    result = skipped_result(sample)
+                if stop_on_first_failure and not sample_passed(result) and result.get("status") != "Skipped":
+                    settled.cancel()
+            if on_result:
+                on_result(index, result)
+            return result if collect else None
+        finally:
+            slots.release()
+
+    schedule = default_schedule(schedule)
+    futures = []
+    # Cancelled by the caller's cancel, or by the first failure under
+    # stop_on_first_failure
+    with cancellation.child_of(cancel) as settled:
+        for index, sample in enumerate(samples):
+            slots.acquire()
+            futures.append(get_executor().submit(
+                run, index, sample, settled,
+                priority=schedule["priority"],
+                tenant=schedule["tenant"],
+                cost=limits["time_limit"],
+            ))
+        results = [future.result() for future in futures]
+    if cancel:
+        cancel.check()
+    return results
+
+
+def compile_error_result(sample, compile_error):
+    return {
+        "input": sample["input"],
+        "expected_output": sample["output"],
+        "stdout": "",
+        "stderr": compile_error,
+        "verdict": "CE",
+        "status": "Error"
+    }
+
+
+# Characters of the program's output quoted in a compact result's diff
+COMPACT_DIFF_CHARS = 32
+
+
+def compact_result(result):
+    """
+    Per-case summary for graded submissions: verdict, time, memory and
+    where the output first went wrong.  Inputs, outputs and (hidden)
+    expected outputs are left out; full logs exist only for sample cases
+    (sample_log).
+    """
+    compact = {"status": result.get("status", "Error")}
+    for field in ("verdict", "time_ms", "memory_kb", "error"):
+        if field in result:
+            compact[field] = result[field]
+    if "diff" in result:
+        compact["diff"] = {
+            "position": result["diff"]["position"],
+            "actual": result["diff"]["actual"][:COMPACT_DIFF_CHARS],
         }
+    return compact
+
+
+def load_problem(PROBLEMS_FILE_PATH, problem_id):
+    # Load problem data
+    with open(PROBLEMS_FILE_PATH, 'r') as f:
+        problems_data = json.load(f)
+    return get_problem_by_id(problems_data, problem_id)
 
+
+def evaluate(user_code, language, samples, limits, on_result=None, collect=True, stop_on_first_failure=False,
+             schedule=None, cancel=None):
+    """
+    Compile the submission and run it against every sample under the given
+    execution limits.  schedule ({"priority", "tenant"}) places its runs in
+    the shared executor's queues.  Identical evaluations share one run while
+    it is in flight, and deterministic results are remembered for a while.
+    Raises cancellation.Cancelled once cancel (a CancelToken) is cancelled.
+    """
+    key = result_memo.run_key(user_code, language, samples, limits, stop_on_first_failure)
+    while True:
+        if cancel:
+            cancel.check()
+        leading = []
+
+        def run():
+            # Only the caller that actually runs it sees results as they come
+            leading.append(True)
+            results = evaluate_submission(user_code, language, samples, limits, on_result, True,
+                                          stop_on_first_failure, schedule, cancel)
+            if cancel:
+                # Results of a cancelled run are incomplete; don't remember them
+                cancel.check()
+            return results
+
+        try:
+            results = result_memo.get_memo().run(key, run)
+            break
+        except cancellation.Cancelled:
+            if leading or (cancel and cancel.cancelled):
+                raise
+            # The run this one joined was cancelled by its own caller; run it again
+    if not leading and on_result:
+        for index, result in enumerate(results):
+            on_result(index, result)
+    if collect:
+        # Callers own their copy; the remembered results stay untouched
+        return [dict(result) for result in results]
+
+
+def evaluate_submission(user_code, language, samples, limits, on_result, collect, stop_on_first_failure, schedule,
+                        cancel=None):
+    # Everything of one submission happens on one sandbox; source and
+    # inputs travel there together, once
+    failed = []
+    while True:
+        sandbox = choose_sandbox(user_code, language, failed)
+        uploaded = upload_bundle(user_code, language, samples, sandbox) if language in EXTENSIONS else {}
+        if "error" not in uploaded or sandbox is None:
+            break
+        # That sandbox is failing; place the submission elsewhere
+        failed.append(sandbox)
+    bundle_id = uploaded.get("bundle")
+    # Where the runs read their cases from
+    cases = None
+    if uploaded.get("testdata"):
+        cases = {"testdata": uploaded["testdata"]}
+    elif bundle_id:
+        cases = {"bundle": bundle_id}
+    try:
+        return evaluate_bundle(user_code, language, samples, limits, on_result, collect, stop_on_first_failure,
+                               bundle_id, cases, sandbox, schedule, cancel)
     finally:
-        # Clean up the files in temp_dir
-        if os.path.exists(host_source_file_path):
-            os.remove(host_source_file_path)
-        if os.path.exists(host_input_file_path):
-            os.remove(host_input_file_path)
+        if bundle_id:
+            discard_bundle(bundle_id)
 
 
+def evaluate_bundle(user_code, language, samples, limits, on_result, collect, stop_on_first_failure, bundle_id,
+                    cases, sandbox, schedule, cancel=None):
+    # Compile once; a compile error fails every sample without running any
+    compiled = compile_submission(user_code, language, bundle_id, sandbox, cancel)
+    if "error" in compiled or "compile_error" in compiled:
+        results = []
+        for index, sample in enumerate(samples):
+            if "error" in compiled:
+                result = {"error": compiled["error"]}
+            else:
+                result = compile_error_result(sample, compiled["compile_error"])
+            if on_result:
+                on_result(index, result)
+            if collect:
+                results.append(result)
+        return results
 
-    
-def compilecode(PROBLEMS_FILE_PATH, problem_id, user_code, test_case, language):
+    # Run every sample against the same artifact
+    artifact = CompiledArtifact(
+        compiled["artifact"], lambda: compile_submission(user_code, language, bundle_id, sandbox, cancel),
+    )
     try:
-        # Load problem data
-        with open(PROBLEMS_FILE_PATH, 'r') as f:
-            problems_data = json.load(f)
-        problem = get_problem_by_id(problems_data, problem_id)
-        
+        if language == 'python' and config.get('PYTHON_HARNESS'):
+            return run_batch(artifact, samples, language, limits, on_result, collect, stop_on_first_failure,
+                             cases, cancel)
+        return run_samples(artifact, samples, language, limits, on_result, collect, stop_on_first_failure,
+                           cases, schedule, cancel)
+    finally:
+        artifact.release()
+
+
+def stream_results(user_code, language, samples, limits, stop_on_first_failure=False, schedule=None, cancel=None):
+    """
+    Generator yielding (index, result) pairs in completion order while the
+    submission runs in the background.  A cancelled run just ends the stream.
+    """
+    finished = object()
+    pending = queue.Queue()
+
+    def run():
+        try:
+            evaluate(
+                user_code,
+                language,
+                samples,
+                limits,
+                on_result=lambda index, result: pending.put((index, result)),
+                collect=False,
+                stop_on_first_failure=stop_on_first_failure,
+                schedule=schedule,
+                cancel=cancel,
+            )
+        except cancellation.Cancelled:
+            pass
+        finally:
+            pending.put(finished)
+
+    threading.Thread(target=run, name="result-stream", daemon=True).start()
+    while True:
+        item = pending.get()
+        if item is finished:
+            return
+        yield item
+
+
+def compilecode(PROBLEMS_FILE_PATH, problem_id, user_code, test_case, language, schedule=None, cancel=None):
+    try:
+        problem = load_problem(PROBLEMS_FILE_PATH, problem_id)
+
         # Check if the problem and test case exist
         if not problem or test_case not in problem:
             return JsonResponse({"error": "Problem not found or invalid test case."}, status=404)
 
-        # Retrieve the samples for the specified test case
-        samples = problem[test_case]
+        results = evaluate(user_code, language, problem[test_case], execution_limits(problem, language),
+                           schedule=schedule, cancel=cancel)
+        return JsonResponse({"results": results})
 
-        # Collect results for each sample only once
-        results = []
-        for sample in samples:
-            input_data = sample["input"]
-            expected_output = sample["output"]
-            result = compilation(user_code, input_data, expected_output, language)
-            results.append(result)
+    except cancellation.Cancelled:
+        # A newer run of the same problem (or an explicit cancel) took over
+        return JsonResponse({"error": "Run cancelled.", "cancelled": True}, status=409)
 
-        return JsonResponse({"results": results})
+    except (IndexError, KeyError, FileNotFoundError):
+        return JsonResponse({"error": "Problem not found or invalid index."}, status=404)
+
+
+def sample_log(PROBLEMS_FILE_PATH, problem_id, user_code, language, case, schedule=None):
+    """
+    Full result (input, expected output, stdout, stderr) of one sample case.
+    The samples are evaluated as a whole, so right after a Run of the same
+    code this is answered from the result memo.
+    """
+    try:
+        problem = load_problem(PROBLEMS_FILE_PATH, problem_id)
+        if not problem or 'samples' not in problem:
+            return JsonResponse({"error": "Problem not found."}, status=404)
+        samples = problem['samples']
+        if not 0 <= case < len(samples):
+            return JsonResponse({"error": "Invalid case index."}, status=404)
+
+        results = evaluate(user_code, language, samples, execution_limits(problem, language), schedule=schedule)
+        return JsonResponse({"case": case, "result": results[case]})
 
     except (IndexError, KeyError, FileNotFoundError):
         return JsonResponse({"error": "Problem not found or invalid index."}, status=404)
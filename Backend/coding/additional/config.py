@@ -0,0 +1,124 @@
+from django.conf import settings
+
+# Defaults for the code execution settings; override any of them through
+# CODE_EXECUTION in backend/settings.py.
+DEFAULTS = {
+    # Where code runs: 'docker' (sandbox container), 'local' (rlimit sandbox
+    # on this host) or 'fake' (deterministic in-process stand-in for tests)
+    'BACKEND': 'docker',
+    # Name of the sandbox container built from the repository dockerfile
+    'CONTAINER': 'test_container',
+    # Several sandbox containers to spread submissions over, e.g.
+    # ['sandbox-1', 'sandbox-2']; CONTAINER alone when unset
+    'CONTAINERS': None,
+    # Consecutive failed requests after which a sandbox is drained and
+    # replaced
+    'SANDBOX_UNHEALTHY_AFTER': 3,
+    # How the docker backend reaches the daemon: 'api' (Engine API over a
+    # pooled Unix-socket connection) or 'cli' (a docker exec process)
+    'DOCKER_TRANSPORT': 'api',
+    'DOCKER_SOCKET': '/var/run/docker.sock',
+    # Path of the worker script inside the sandbox
+    'WORKER_SCRIPT': '/code/sandbox/worker.py',
+    # Scratch root for the local backend; a private temp dir when unset
+    'LOCAL_ROOT': None,
+    # Run local workers inside fresh namespaces (needs unprivileged userns)
+    'LOCAL_UNSHARE': False,
+    'LOCAL_UNSHARE_COMMAND': ['unshare', '--user', '--map-root-user', '--net', '--pid', '--fork', '--mount-proc'],
+    # Simulated latency of every fake backend request
+    'FAKE_LATENCY_MS': 0,
+    # Number of warm workers kept per sandbox when POOL_ADAPTIVE is off
+    'POOL_SIZE': 4,
+    # Size the warm workers per language instead: each POOL_LANGUAGES
+    # language gets workers warmed for it (zygote, JVM), grown while its
+    # requests queue or its load calls for more and shrunk when idle, all
+    # within POOL_MEMORY_BUDGET_MB per sandbox.  POOL_SIZE is ignored then.
+    'POOL_ADAPTIVE': False,
+    'POOL_LANGUAGES': ['python', 'c', 'cpp', 'java'],
+    # Workers a language never goes below; None keeps enough for one
+    # submission's samples to run at once (MAX_PARALLEL_PER_SUBMISSION)
+    'POOL_MIN_PER_LANGUAGE': None,
+    'POOL_MAX_PER_LANGUAGE': 8,
+    'POOL_MEMORY_BUDGET_MB': 4096,
+    # Memory an idle warm worker of each language holds (worker process plus
+    # its zygote or JVM)
+    'WARM_WORKER_MEMORY_MB': {'python': 64, 'c': 32, 'cpp': 32, 'java': 640},
+    # Seconds between sizing rounds, and how fast demand is forgotten (a
+    # request this many seconds old counts half)
+    'POOL_RESIZE_INTERVAL': 5,
+    'POOL_DEMAND_HALF_LIFE': 30,
+    # Workers per average busy worker, and the mean queue wait beyond which
+    # a language gets another worker
+    'POOL_HEADROOM': 1.5,
+    'POOL_TARGET_QUEUE_WAIT_MS': 50,
+    # Seconds to wait for a free worker before giving up
+    'POOL_ACQUIRE_TIMEOUT': 30,
+    # Idle workers are pinged before reuse once they've been idle this long
+    'POOL_HEALTH_CHECK_INTERVAL': 30,
+    # Extra compiler flags per language, e.g. {'cpp': ['-O2']}
+    'COMPILER_FLAGS': {},
+    # Total size of compiled artifacts kept in each sandbox before LRU
+    # eviction; enforced by the sandbox, since every backend process shares them
+    'ARTIFACT_CACHE_MAX_BYTES': 256 * 1024 * 1024,
+    # Wall-clock seconds per test case, per language; a problem's own
+    # time_limit takes precedence
+    'TIME_LIMITS': {'python': 2, 'c': 1, 'cpp': 1, 'java': 3},
+    # Memory per test case in MB, per language; a problem's own memory_limit
+    # takes precedence
+    'MEMORY_LIMITS_MB': {'python': 256, 'c': 256, 'cpp': 256, 'java': 256},
+    # Output (stdout and stderr together) a test case may produce before it
+    # is stopped as OLE, and how much of each stream comes back in results
+    'OUTPUT_LIMIT_KB': 16 * 1024,
+    'OUTPUT_EXCERPT_KB': 64,
+    # How the sandbox compares stdout with the expected output: mode 'exact',
+    # 'whitespace' (same tokens) or 'float' (numbers within float_tolerance).
+    # A problem's own "checker" takes precedence.
+    'OUTPUT_CHECKER': {'mode': 'whitespace', 'ignore_case': True, 'float_tolerance': 1e-6},
+    # Run all samples of a Python submission in one interpreter instead of
+    # starting python3 per sample
+    'PYTHON_HARNESS': False,
+    # Fork Python runs from a warm zygote with common modules pre-imported
+    'PYTHON_ZYGOTE': True,
+    # Compile and run Java in a warm JVM (JavaRunner) instead of cold
+    # javac/java processes
+    'JAVA_WARM_JVM': True,
+    # Wall-clock seconds a compiler may run
+    'COMPILE_TIME_LIMIT': 10,
+    # Extra seconds allowed for the sandbox round-trip before a worker that
+    # hasn't answered is killed and replaced
+    'SANDBOX_GRACE_SECONDS': 5,
+    # Samples of one submission that may run at the same time
+    'MAX_PARALLEL_PER_SUBMISSION': 4,
+    # Sample runs in flight across all submissions in this process
+    'MAX_PARALLEL_GLOBAL': 16,
+    # Execution seconds a student may use per turn when students take turns
+    # within a priority class (deficit round-robin)
+    'FAIR_QUANTUM': 2,
+    # Requests admitted at once per kind of work ('run' for Run, 'submit'
+    # for graded submissions, queued jobs included); beyond that callers get
+    # 429 with a Retry-After estimate
+    'ADMISSION_LIMITS': {'run': 32, 'submit': 64},
+    # Retry-After when there is no recent throughput to estimate from, and
+    # the most ever suggested
+    'ADMISSION_DEFAULT_RETRY_AFTER': 5,
+    'ADMISSION_MAX_RETRY_AFTER': 60,
+    # Results of identical evaluations (same source, language, test cases
+    # and limits) kept this many seconds, and at most this many of them;
+    # concurrent identical evaluations always share one run
+    'RESULT_MEMO_TTL': 300,
+    'RESULT_MEMO_MAX_ENTRIES': 1000,
+    # SQLite file backing the asynchronous submission queue
+    'JOB_DB_PATH': 'submission_jobs.sqlite3',
+    # Background threads per process draining the submission queue
+    'JOB_WORKERS': 4,
+    # Running jobs not finished after this many seconds are picked up again
+    'JOB_STALE_AFTER': 300,
+    # Done and failed jobs are deleted this many seconds after they finish,
+    # checked at most every JOB_PRUNE_INTERVAL seconds
+    'JOB_RETENTION': 7 * 24 * 3600,
+    'JOB_PRUNE_INTERVAL': 600,
+}
+
+
+def get(name):
+    return getattr(settings, 'CODE_EXECUTION', {}).get(name, DEFAULTS[name])
@@ -0,0 +1,294 @@
+import http.client
+import json
+import queue
+import socket
+import struct
+import threading
+import time
+from urllib.parse import quote
+
+from .sandbox_pool import SandboxError, SandboxWorker
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP/1.1 connection to the Docker daemon's Unix socket.
+    """
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class ExecStream:
+    """
+    The hijacked connection of an attached exec: raw bytes to the process's
+    stdin, and its stdout/stderr multiplexed into frames of an 8-byte header
+    (stream id, 3 zero bytes, big-endian length) followed by the payload.
+    """
+    STDOUT = 1
+
+    def __init__(self, sock, buffered=b""):
+        self.sock = sock
+        self.raw = buffered
+        self.stdout = b""
+        self.eof = False
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    def _read_raw(self, size):
+        while len(self.raw) < size:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                return None
+            self.raw += chunk
+        data, self.raw = self.raw[:size], self.raw[size:]
+        return data
+
+    def _read_frame(self):
+        header = self._read_raw(8)
+        if header is None:
+            self.eof = True
+            return False
+        stream, length = struct.unpack(">BxxxL", header)
+        payload = self._read_raw(length)
+        if payload is None:
+            self.eof = True
+            return False
+        # stderr frames are dropped, like stderr=DEVNULL for the CLI
+        if stream == self.STDOUT:
+            self.stdout += payload
+        return True
+
+    def peek(self):
+        # Block until at least one byte of stdout is available
+        while not self.stdout and not self.eof:
+            self._read_frame()
+        return self.stdout[:1]
+
+    def readline(self):
+        while b"\n" not in self.stdout and not self.eof:
+            self._read_frame()
+        if b"\n" in self.stdout:
+            line, self.stdout = self.stdout.split(b"\n", 1)
+            return line + b"\n"
+        line, self.stdout = self.stdout, b""
+        return line
+
+    def close_stdin(self):
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def close(self):
+        self.eof = True
+        try:
+            # Wakes up a read blocked in another thread
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class DockerClient:
+    """
+    Minimal Docker Engine API client.  Control requests share a small pool
+    of keep-alive connections; every attached exec gets its own connection,
+    which the daemon hijacks for the exec's streams.
+    """
+    API_VERSION = "v1.41"
+
+    def __init__(self, socket_path, pool_size=4, timeout=30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.connections = queue.LifoQueue(maxsize=pool_size)
+        self.lock = threading.Lock()
+
+    def _connection(self):
+        try:
+            return self.connections.get_nowait()
+        except queue.Empty:
+            return UnixHTTPConnection(self.socket_path, self.timeout)
+
+    def _release(self, connection):
+        try:
+            self.connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(self, method, path, body=None):
+        """
+        Send one API request and return (status, decoded JSON body or None).
+        A pooled connection the daemon has closed in the meantime is retried
+        once on a fresh one.
+        """
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, f"/{self.API_VERSION}{path}", body=payload, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if attempt:
+                    raise SandboxError(f"Docker API request failed: {e}")
+                continue
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            try:
+                return response.status, json.loads(data) if data else None
+            except ValueError:
+                return response.status, None
+
+    def ping(self):
+        try:
+            status, _ = self.request("GET", "/_ping")
+        except SandboxError:
+            return False
+        return status == 200
+
+    def exec_create(self, container, command):
+        status, body = self.request("POST", f"/containers/{quote(container)}/exec", {
+            "AttachStdin": True,
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "Tty": False,
+            "Cmd": command,
+        })
+        if status != 201:
+            message = body.get("message") if body else status
+            raise SandboxError(f"Could not create exec in {container}: {message}")
+        return body["Id"]
+
+    def exec_start(self, exec_id):
+        """
+        Start an exec with its streams attached and return the hijacked
+        ExecStream.
+        """
+        body = json.dumps({"Detach": False, "Tty": False}).encode("utf-8")
+        request = (
+            f"POST /{self.API_VERSION}/exec/{exec_id}/start HTTP/1.1\r\n"
+            "Host: localhost\r\n"
+            "Content-Type: application/json\r\n"
+            "Connection: Upgrade\r\n"
+            "Upgrade: tcp\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        ).encode("ascii") + body
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+            sock.sendall(request)
+            response = b""
+            while b"\r\n\r\n" not in response:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    raise SandboxError("Docker daemon closed the exec stream.")
+                response += chunk
+        except OSError as e:
+            sock.close()
+            raise SandboxError(f"Could not start exec: {e}")
+        except SandboxError:
+            sock.close()
+            raise
+
+        head, buffered = response.split(b"\r\n\r\n", 1)
+        status = head.split(b"\r\n", 1)[0].split(b" ")
+        if len(status) < 2 or status[1] not in (b"101", b"200"):
+            sock.close()
+            raise SandboxError(f"Could not start exec: {head.decode('latin-1')}")
+        return ExecStream(sock, buffered)
+
+    def exec_inspect(self, exec_id):
+        status, body = self.request("GET", f"/exec/{exec_id}/json")
+        if status != 200:
+            raise SandboxError(f"Could not inspect exec {exec_id}")
+        return body
+
+    def restart(self, container):
+        status, body = self.request("POST", f"/containers/{quote(container)}/restart?t=0")
+        if status != 204:
+            message = body.get("message") if body else status
+            raise SandboxError(f"Could not restart {container}: {message}")
+
+    def exec_detached(self, container, command):
+        # Fire-and-forget command, e.g. killing a wedged worker
+        exec_id = self.exec_create(container, command)
+        self.request("POST", f"/exec/{exec_id}/start", {"Detach": True, "Tty": False})
+
+
+class DockerExecWorker(SandboxWorker):
+    """
+    Sandbox worker started through the Engine API (exec-create, then
+    exec-start with attached streams) rather than a docker exec CLI process.
+    """
+
+    def __init__(self, client, container, command):
+        self.client = client
+        self.container = container
+        self.pid = None
+        self.stream = client.exec_start(client.exec_create(container, command))
+        self.last_used = time.monotonic()
+        self.last_ttfb = None
+
+    def send(self, data):
+        self.stream.write(data)
+
+    def peek(self):
+        self.stream.peek()
+
+    def readline(self):
+        return self.stream.readline()
+
+    def kill(self):
+        # The API can't signal an exec; kill the worker from inside the
+        # container, then drop the stream so a blocked read returns.
+        if self.pid:
+            try:
+                self.client.exec_detached(self.container, ["kill", "-9", str(self.pid)])
+            except SandboxError:
+                pass
+        self.stream.close()
+
+    def terminate(self):
+        # SIGTERM lets the worker take its current run down with it
+        if self.pid:
+            try:
+                self.client.exec_detached(self.container, ["kill", "-TERM", str(self.pid)])
+                return
+            except SandboxError:
+                pass
+        self.kill()
+
+    def is_alive(self):
+        return not self.stream.eof
+
+    def ping(self, timeout=None):
+        try:
+            response = self.request({"op": "ping"}, timeout)
+        except SandboxError:
+            return False
+        self.pid = response.get("pid", self.pid)
+        return response.get("ok", False)
+
+    def close(self):
+        # EOF on stdin makes the worker exit
+        self.stream.close_stdin()
+        self.stream.close()
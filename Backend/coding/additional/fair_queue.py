@@ -0,0 +1,144 @@
+import collections
+import math
+import threading
+import time
+from concurrent.futures import Future
+
+# Priority classes, most urgent first.  A class only runs when every class
+# above it has nothing waiting.
+SUBMISSION = "submission"
+SAMPLE_RUN = "sample_run"
+STAFF_VALIDATION = "staff_validation"
+PRIORITIES = (SUBMISSION, SAMPLE_RUN, STAFF_VALIDATION)
+
+# Queue waits kept per class for the latency percentiles
+RECENT_WAITS = 1000
+
+
+class Task:
+    def __init__(self, fn, args, cost):
+        self.fn = fn
+        self.args = args
+        self.cost = cost
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+
+class ClassQueue:
+    """
+    Deficit round-robin over the tenants (students) of one priority class.
+    The tenant at the head of the ring is topped up by the quantum when its
+    turn comes and runs tasks while its credit covers their cost, so every
+    tenant gets the same share of execution time however much it queues.
+    """
+
+    def __init__(self, quantum):
+        self.quantum = quantum
+        self.queues = {}  # tenant -> deque of tasks
+        self.deficits = {}
+        self.ring = collections.deque()
+        self.waits = collections.deque(maxlen=RECENT_WAITS)
+        self.served = 0
+
+    def __len__(self):
+        return sum(len(tasks) for tasks in self.queues.values())
+
+    def push(self, tenant, task):
+        if tenant not in self.queues:
+            self.queues[tenant] = collections.deque()
+            self.deficits[tenant] = self.quantum if not self.ring else 0.0
+            self.ring.append(tenant)
+        self.queues[tenant].append(task)
+
+    def pop(self):
+        while True:
+            tenant = self.ring[0]
+            tasks = self.queues[tenant]
+            if self.deficits[tenant] >= tasks[0].cost:
+                task = tasks.popleft()
+                self.deficits[tenant] -= task.cost
+                if not tasks:
+                    # An idle tenant keeps no credit
+                    del self.queues[tenant]
+                    del self.deficits[tenant]
+                    self.ring.popleft()
+                    if self.ring:
+                        self.deficits[self.ring[0]] += self.quantum
+                self.served += 1
+                self.waits.append(time.monotonic() - task.queued_at)
+                return task
+            self.ring.rotate(-1)
+            self.deficits[self.ring[0]] += self.quantum
+
+    def stats(self):
+        waits = sorted(self.waits)
+
+        def percentile(fraction):
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, math.ceil(fraction * len(waits)) - 1)] * 1000
+
+        return {
+            "queued": len(self),
+            "tenants": len(self.ring),
+            "served": self.served,
+            "wait_p50_ms": percentile(0.5),
+            "wait_p99_ms": percentile(0.99),
+        }
+
+
+class FairExecutor:
+    """
+    Fixed set of worker threads fed by strict priority classes, with
+    per-tenant fair queuing inside each class.  submit() returns a
+    concurrent.futures.Future like ThreadPoolExecutor.submit().
+    """
+
+    def __init__(self, max_workers, quantum, thread_name_prefix="fair-executor"):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self.classes = {priority: ClassQueue(quantum) for priority in PRIORITIES}
+        self.condition = threading.Condition()
+        self.threads = []
+
+    def submit(self, fn, *args, priority=SAMPLE_RUN, tenant=None, cost=1.0):
+        task = Task(fn, args, cost)
+        with self.condition:
+            self.classes[priority].push(tenant, task)
+            if len(self.threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self.work,
+                    name=f"{self.thread_name_prefix}-{len(self.threads)}",
+                    daemon=True,
+                )
+                thread.start()
+                self.threads.append(thread)
+            self.condition.notify()
+        return task.future
+
+    def next_task(self):
+        with self.condition:
+            while True:
+                for priority in PRIORITIES:
+                    if self.classes[priority].ring:
+                        return self.classes[priority].pop()
+                self.condition.wait()
+
+    def work(self):
+        while True:
+            task = self.next_task()
+            if not task.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = task.fn(*task.args)
+            except BaseException as e:
+                task.future.set_exception(e)
+            else:
+                task.future.set_result(result)
+
+    def stats(self):
+        with self.condition:
+            return {
+                "workers": len(self.threads),
+                "classes": {priority: queue.stats() for priority, queue in self.classes.items()},
+            }
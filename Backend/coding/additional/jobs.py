@@ -0,0 +1,262 @@
+import json
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+from . import compile, config
+
+# Submission jobs live in a local SQLite file so the queue needs no broker and
+# is shared by every backend process on the host.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submission_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    results TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    claimed_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS submission_jobs_status ON submission_jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS submission_jobs_finished ON submission_jobs (finished_at);
+"""
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def connect():
+    connection = sqlite3.connect(str(config.get('JOB_DB_PATH')), timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema():
+    global _schema_ready
+    with _schema_lock:
+        if not _schema_ready:
+            connection = connect()
+            try:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+            finally:
+                connection.close()
+            _schema_ready = True
+
+
+def enqueue(problems_file, problem_id, user_code, language, test_case, stop_on_first_failure=False, schedule=None):
+    """
+    Queue a submission and return its job id right away.
+    """
+    ensure_schema()
+    start_workers()
+    job_id = uuid.uuid4().hex
+    payload = {
+        "problems_file": str(problems_file),
+        "problem_id": problem_id,
+        "user_code": user_code,
+        "language": language,
+        "test_case": test_case,
+        "stop_on_first_failure": stop_on_first_failure,
+        "schedule": schedule,
+    }
+    connection = connect()
+    try:
+        connection.execute(
+            "INSERT INTO submission_jobs (id, status, payload, results, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(payload), "[]", time.time()),
+        )
+    finally:
+        connection.close()
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id):
+    ensure_schema()
+    connection = connect()
+    try:
+        row = connection.execute("SELECT * FROM submission_jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        return None
+    results = json.loads(row["results"])
+    return {
+        "job_id": row["id"],
+        "status": row["status"],
+        "results": results,
+        "completed": sum(1 for result in results if result is not None),
+        "total": len(results),
+        "error": row["error"],
+    }
+
+
+def pending_count():
+    ensure_schema()
+    connection = connect()
+    try:
+        row = connection.execute(
+            "SELECT COUNT(*) FROM submission_jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+        ).fetchone()
+    finally:
+        connection.close()
+    return row[0]
+
+
+def finished_since(seconds):
+    ensure_schema()
+    connection = connect()
+    try:
+        row = connection.execute(
+            "SELECT COUNT(*) FROM submission_jobs WHERE finished_at >= ?", (time.time() - seconds,)
+        ).fetchone()
+    finally:
+        connection.close()
+    return row[0]
+
+
+def claim_next():
+    """
+    Atomically move the oldest queued job (or one abandoned by a dead
+    process) to running and return it.
+    """
+    connection = connect()
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        stale_before = time.time() - config.get('JOB_STALE_AFTER')
+        row = connection.execute(
+            "SELECT id, payload FROM submission_jobs"
+            " WHERE status = ? OR (status = ? AND claimed_at < ?)"
+            " ORDER BY created_at LIMIT 1",
+            (QUEUED, RUNNING, stale_before),
+        ).fetchone()
+        if row is None:
+            connection.execute("COMMIT")
+            return None
+        connection.execute(
+            "UPDATE submission_jobs SET status = ?, claimed_at = ? WHERE id = ?",
+            (RUNNING, time.time(), row["id"]),
+        )
+        connection.execute("COMMIT")
+        return row["id"], json.loads(row["payload"])
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.close()
+
+
+def update(job_id, **fields):
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    connection = connect()
+    try:
+        connection.execute(f"UPDATE submission_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+    finally:
+        connection.close()
+
+
+def store_result(job_id, index, result):
+    connection = connect()
+    try:
+        connection.execute(
+            "UPDATE submission_jobs SET results = json_set(results, ?, json(?)) WHERE id = ?",
+            (f"$[{index}]", json.dumps(result), job_id),
+        )
+    finally:
+        connection.close()
+
+
+def prune_finished():
+    """
+    Delete done and failed jobs finished more than JOB_RETENTION seconds
+    ago; returns how many were deleted.
+    """
+    connection = connect()
+    try:
+        cursor = connection.execute(
+            "DELETE FROM submission_jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - config.get('JOB_RETENTION')),
+        )
+    finally:
+        connection.close()
+    return cursor.rowcount
+
+
+def run_job(job_id, payload):
+    try:
+        problem = compile.load_problem(payload["problems_file"], payload["problem_id"])
+        if not problem or payload["test_case"] not in problem:
+            update(job_id, status=FAILED, error="Problem not found or invalid test case.", finished_at=time.time())
+            return
+        samples = problem[payload["test_case"]]
+
+        # Publish one slot per sample so pollers can show progress
+        update(job_id, results=json.dumps([None] * len(samples)))
+        compile.evaluate(
+            payload["user_code"],
+            payload["language"],
+            samples,
+            compile.execution_limits(problem, payload["language"]),
+            # Queued jobs are graded submissions; keep only the verdicts
+            on_result=lambda index, result: store_result(job_id, index, compile.compact_result(result)),
+            collect=False,
+            stop_on_first_failure=payload.get("stop_on_first_failure", False),
+            schedule=payload.get("schedule"),
+        )
+        update(job_id, status=DONE, finished_at=time.time())
+    except Exception as e:
+        traceback.print_exc()
+        update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+_pruned_at = 0.0
+_prune_lock = threading.Lock()
+
+
+def prune_if_due():
+    # One worker thread per process prunes now and then
+    global _pruned_at
+    with _prune_lock:
+        if _pruned_at and time.monotonic() - _pruned_at < config.get('JOB_PRUNE_INTERVAL'):
+            return
+        _pruned_at = time.monotonic()
+    prune_finished()
+
+
+def worker_loop():
+    while True:
+        try:
+            prune_if_due()
+            job = claim_next()
+        except sqlite3.Error:
+            traceback.print_exc()
+            job = None
+        if job is None:
+            # Poll as well, jobs may be queued by another process
+            _wakeup.wait(timeout=1)
+            _wakeup.clear()
+            continue
+        run_job(*job)
+
+
+def start_workers():
+    with _workers_lock:
+        if _workers:
+            return
+        for index in range(config.get('JOB_WORKERS')):
+            worker = threading.Thread(target=worker_loop, name=f"submission-job-{index}", daemon=True)
+            worker.start()
+            _workers.append(worker)
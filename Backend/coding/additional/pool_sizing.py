@@ -0,0 +1,165 @@
+import math
+import threading
+import time
+from collections import deque
+
+from . import config
+
+# Sizing decisions kept for the stats endpoint
+DECISION_HISTORY = 50
+
+
+class Demand:
+    """
+    Arrival rate, queue wait and service time of one language's requests,
+    as exponentially decaying sums: a request half_life seconds old counts
+    half as much as a new one.  Queue waits are also summed per sizing
+    round, since a mean over the past can't tell whether requests still
+    queue now.
+    """
+
+    def __init__(self, half_life):
+        self.half_life = half_life
+        self.lock = threading.Lock()
+        self.updated = time.monotonic()
+        self.arrivals = 0.0
+        self.waits = 0.0
+        self.wait_total = 0.0
+        self.services = 0.0
+        self.service_total = 0.0
+        self.round_waits = 0
+        self.round_wait_total = 0.0
+
+    def decay(self):
+        now = time.monotonic()
+        factor = 0.5 ** ((now - self.updated) / self.half_life)
+        self.updated = now
+        self.arrivals *= factor
+        self.waits *= factor
+        self.wait_total *= factor
+        self.services *= factor
+        self.service_total *= factor
+
+    def arrived(self):
+        with self.lock:
+            self.decay()
+            self.arrivals += 1
+
+    def waited(self, seconds):
+        with self.lock:
+            self.decay()
+            self.waits += 1
+            self.wait_total += seconds
+            self.round_waits += 1
+            self.round_wait_total += seconds
+
+    def served(self, seconds):
+        with self.lock:
+            self.decay()
+            self.services += 1
+            self.service_total += seconds
+
+    def snapshot(self):
+        with self.lock:
+            self.decay()
+            return {
+                # A steady rate r accumulates r * half_life / ln 2 arrivals
+                "arrival_rate": self.arrivals * math.log(2) / self.half_life,
+                "mean_wait_ms": self.wait_total / self.waits * 1000 if self.waits else 0.0,
+                "mean_service_ms": self.service_total / self.services * 1000 if self.services else 0.0,
+            }
+
+    def end_round(self):
+        """
+        Mean queue wait in ms since the last call, 0 if nothing waited.
+        """
+        with self.lock:
+            mean = self.round_wait_total / self.round_waits * 1000 if self.round_waits else 0.0
+            self.round_waits = 0
+            self.round_wait_total = 0.0
+            return mean
+
+
+def minimum_workers():
+    minimum = config.get('POOL_MIN_PER_LANGUAGE')
+    return config.get('MAX_PARALLEL_PER_SUBMISSION') if minimum is None else minimum
+
+
+def desired_workers(current, demand, round_wait_ms, queued):
+    """
+    Workers a language should have and why: enough that its average load
+    (arrival rate times service time, by Little's law) keeps them at most
+    1/POOL_HEADROOM busy, more while its requests queue (one per request
+    queued right now, at least one), and one fewer per round while it has
+    more than that.
+    """
+    busy = demand["arrival_rate"] * demand["mean_service_ms"] / 1000
+    needed = math.ceil(busy * config.get('POOL_HEADROOM'))
+    if (queued or round_wait_ms > config.get('POOL_TARGET_QUEUE_WAIT_MS')) and needed <= current:
+        return current + max(queued, 1), "queueing"
+    if needed > current:
+        return needed, "demand"
+    if needed < current:
+        # Shrink gradually so a short lull doesn't drop every warm worker
+        return current - 1, "idle"
+    return current, None
+
+
+def fit_budget(desired, pressure):
+    """
+    Worker targets per language within POOL_MEMORY_BUDGET_MB.  Every
+    language keeps minimum_workers() even beyond the budget;
+    the rest of it is handed out one worker at a time, most pressed
+    language (pressure: higher sorts first) first.
+    """
+    costs = config.get('WARM_WORKER_MEMORY_MB')
+    minimum = minimum_workers()
+    maximum = config.get('POOL_MAX_PER_LANGUAGE')
+    budget = config.get('POOL_MEMORY_BUDGET_MB')
+
+    targets = {language: minimum for language in desired}
+    used = sum(costs.get(language, 0) * minimum for language in desired)
+    wanting = sorted(desired, key=lambda language: pressure[language], reverse=True)
+    growing = True
+    while growing:
+        growing = False
+        for language in wanting:
+            cost = costs.get(language, 0)
+            if targets[language] < min(desired[language], maximum) and used + cost <= budget:
+                targets[language] += 1
+                used += cost
+                growing = True
+    return targets
+
+
+class SizingLog:
+    """
+    Recent sizing decisions and how many of each kind there were.
+    """
+
+    def __init__(self):
+        self.decisions = deque(maxlen=DECISION_HISTORY)
+        self.grown = 0
+        self.shrunk = 0
+        self.budget_limited = 0
+
+    def record(self, language, previous, target, reason):
+        if target > previous:
+            self.grown += 1
+        else:
+            self.shrunk += 1
+        self.decisions.append({
+            "at": time.time(),
+            "language": language,
+            "from": previous,
+            "to": target,
+            "reason": reason,
+        })
+
+    def stats(self):
+        return {
+            "grown": self.grown,
+            "shrunk": self.shrunk,
+            "budget_limited": self.budget_limited,
+            "decisions": list(self.decisions),
+        }
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from . import config
+
+
+def run_key(user_code, language, samples, limits, stop_on_first_failure):
+    """
+    Identity of an evaluation: the source, the language and its compiler
+    flags, the exact test cases and limits, and the fail-fast mode.
+    """
+    material = json.dumps([
+        language,
+        config.get('COMPILER_FLAGS').get(language, []),
+        hashlib.sha256(user_code.encode("utf-8")).hexdigest(),
+        samples,
+        limits,
+        stop_on_first_failure,
+    ], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def deterministic(results):
+    # Timeouts depend on load, skips on completion order and errors on the
+    # sandbox's health; only results free of those are worth repeating.
+    return all(
+        "error" not in result and result.get("verdict") != "TLE" and result.get("status") != "Skipped"
+        for result in results
+    )
+
+
+class ResultMemo:
+    """
+    Coalesces concurrent identical evaluations into one (single-flight) and
+    remembers deterministic results for a while in a size-bounded TTL cache.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, results)
+        self.in_flight = {}  # key -> Future of the leader's results
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def run(self, key, evaluate):
+        """
+        Return the results for key: remembered ones, those of an identical
+        evaluation already running, or those of calling evaluate() now.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self.entries[key]
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self.in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return flight.result()
+
+        try:
+            results = evaluate()
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[key]
+            flight.set_exception(e)
+            raise
+        with self.lock:
+            del self.in_flight[key]
+            if deterministic(results):
+                self.entries[key] = (time.monotonic() + self.ttl, results)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        flight.set_result(results)
+        return results
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def get_memo():
+    global _memo
+    with _memo_lock:
+        if _memo is None:
+            _memo = ResultMemo(config.get('RESULT_MEMO_MAX_ENTRIES'), config.get('RESULT_MEMO_TTL'))
+        return _memo
@@ -0,0 +1,436 @@
+import json
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from . import config, pool_sizing
+from .cancellation import Cancelled
+
+
+class SandboxError(Exception):
+    pass
+
+
+class PoolBusy(SandboxError):
+    # Every worker stayed busy past POOL_ACQUIRE_TIMEOUT; says nothing about
+    # the sandbox's health
+    pass
+
+
+class LatencyStats:
+    """
+    Running count, mean and max of a latency, in milliseconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total += seconds * 1000
+            self.max = max(self.max, seconds * 1000)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "mean_ms": self.total / self.count if self.count else 0.0,
+                "max_ms": self.max,
+            }
+
+
+class SandboxWorker:
+    """
+    One long-lived worker process inside the sandbox, driven over a
+    JSON-lines channel on its stdin/stdout.
+    """
+
+    def __init__(self, command, env=None):
+        try:
+            self.process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                env=env,
+            )
+        except OSError as e:
+            raise SandboxError(f"Could not start sandbox worker: {e}")
+        self.last_used = time.monotonic()
+        self.last_ttfb = None
+        # Language the pool warmed it for, None for a generic worker
+        self.language = None
+
+    # Transport; subclasses drive workers over other channels
+
+    def send(self, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def peek(self):
+        # Block until the first byte of the answer is available
+        self.process.stdout.peek(1)
+
+    def readline(self):
+        return self.process.stdout.readline()
+
+    def kill(self):
+        self.process.kill()
+
+    def terminate(self):
+        # Ask the worker to stop its current run and exit (see SIGTERM in
+        # worker.py); used when the execution is cancelled
+        self.process.terminate()
+
+    def request(self, payload, timeout=None):
+        """
+        Send one request and block until the worker answers it.  A worker
+        that doesn't answer within timeout seconds is killed.  The time to
+        the first byte of the answer is kept in last_ttfb.
+        """
+        watchdog = None
+        if timeout:
+            watchdog = threading.Timer(timeout, self.kill)
+            watchdog.start()
+        started = time.monotonic()
+        try:
+            self.send(json.dumps(payload).encode("utf-8") + b"\n")
+            self.peek()
+            self.last_ttfb = time.monotonic() - started
+            line = self.readline()
+        except (BrokenPipeError, OSError) as e:
+            raise SandboxError(f"Sandbox worker channel failed: {e}")
+        finally:
+            if watchdog:
+                watchdog.cancel()
+        if not line:
+            raise SandboxError("Sandbox worker exited unexpectedly.")
+        self.last_used = time.monotonic()
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise SandboxError("Sandbox worker sent a malformed response.")
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def ping(self, timeout=None):
+        try:
+            return self.request({"op": "ping"}, timeout).get("ok", False)
+        except SandboxError:
+            return False
+
+    def close(self):
+        if self.is_alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+class SandboxPool:
+    """
+    Pool of warm sandbox workers.  Workers are health-checked before reuse
+    and replaced when they die.  factory, if given, creates workers instead
+    of running command locally.
+
+    Without languages the pool keeps size generic workers.  With languages
+    every worker is warmed for one of them (its zygote or JVM) and serves
+    that language's requests; requests without a language take any idle
+    worker.  A sizer then grows and shrinks each language's workers from its
+    arrival rate and queue wait, within POOL_MEMORY_BUDGET_MB.
+    """
+
+    def __init__(self, command, size, env=None, factory=None, languages=None):
+        self.command = command
+        self.env = env
+        self.factory = factory
+        self.adaptive = bool(languages)
+        self.languages = list(languages) if languages else [None]
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.idle = {language: deque() for language in self.languages}
+        # Live workers per language, idle or busy, and how many it should have
+        self.workers = {language: 0 for language in self.languages}
+        initial = pool_sizing.minimum_workers() if self.adaptive else size
+        self.targets = {language: initial for language in self.languages}
+        self.started = False
+        self.closed = False
+        self.sizer = None
+        # Requests waiting for a free worker, in total and per language
+        self.waiting = 0
+        self.queued = {language: 0 for language in self.languages}
+        self.demand = {
+            language: pool_sizing.Demand(config.get('POOL_DEMAND_HALF_LIFE')) for language in self.languages
+        }
+        self.sizing = pool_sizing.SizingLog()
+        # Mean queue wait per language during the last sizing round
+        self.round_wait = {language: 0.0 for language in self.languages}
+        # Worker start to first answer, and request to first byte of answer
+        self.spawn_latency = LatencyStats()
+        self.request_latency = LatencyStats()
+
+    @property
+    def size(self):
+        with self.lock:
+            return sum(self.workers.values())
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            workers = []
+            try:
+                for language in self.languages:
+                    for _ in range(self.targets[language]):
+                        workers.append(self.spawn(language))
+            except SandboxError:
+                for worker in workers:
+                    worker.close()
+                raise
+            for worker in workers:
+                self.idle[worker.language].append(worker)
+                self.workers[worker.language] += 1
+            self.started = True
+            if self.adaptive:
+                self.sizer = threading.Thread(target=self.sizing_loop, name="sandbox-pool-sizer", daemon=True)
+                self.sizer.start()
+
+    def spawn(self, language):
+        started = time.monotonic()
+        worker = self.factory() if self.factory else SandboxWorker(self.command, self.env)
+        worker.language = language
+        if not worker.ping(config.get('POOL_ACQUIRE_TIMEOUT')):
+            worker.close()
+            raise SandboxError("Sandbox worker did not answer after starting.")
+        try:
+            # Generic workers keep a warm Python zygote, as they always have
+            worker.request({
+                "op": "warm",
+                "language": language or "python",
+                "zygote": config.get('PYTHON_ZYGOTE'),
+                "warm_jvm": config.get('JAVA_WARM_JVM'),
+            }, config.get('POOL_ACQUIRE_TIMEOUT'))
+        except SandboxError:
+            worker.close()
+            raise
+        self.spawn_latency.record(time.monotonic() - started)
+        return worker
+
+    def take(self, language):
+        # An idle worker of the language, or of any language for requests
+        # that have none (or one without workers of its own)
+        if language in self.idle:
+            bucket = self.idle[language]
+        else:
+            bucket = max(self.idle.values(), key=len)
+        return bucket.popleft() if bucket else None
+
+    def _checkout(self, language):
+        deadline = time.monotonic() + config.get('POOL_ACQUIRE_TIMEOUT')
+        with self.available:
+            self.waiting += 1
+            if language in self.queued:
+                self.queued[language] += 1
+            try:
+                while True:
+                    worker = self.take(language)
+                    if worker is not None:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolBusy("No sandbox worker became available in time.")
+                    self.available.wait(remaining)
+            finally:
+                self.waiting -= 1
+                if language in self.queued:
+                    self.queued[language] -= 1
+
+        idle_for = time.monotonic() - worker.last_used
+        if not worker.is_alive() or (idle_for > config.get('POOL_HEALTH_CHECK_INTERVAL') and not worker.ping()):
+            worker.close()
+            try:
+                worker = self.spawn(worker.language)
+            except SandboxError:
+                # Keep the slot; the next checkout tries again
+                self.put(worker)
+                raise
+        return worker
+
+    def put(self, worker):
+        # Hand a worker back, or retire it if its language now has more
+        # workers than it should
+        with self.available:
+            retire = self.closed or self.workers[worker.language] > self.targets[worker.language]
+            if retire:
+                self.workers[worker.language] -= 1
+            else:
+                self.idle[worker.language].append(worker)
+                self.available.notify_all()
+        if retire:
+            worker.close()
+
+    @contextmanager
+    def acquire(self, language=None):
+        """
+        Borrow a worker (for language, if given) for the duration of the
+        block.  A worker whose channel broke is discarded and replaced
+        instead of being handed back.
+        """
+        self.start()
+        worker = self._checkout(language)
+        try:
+            yield worker
+        except SandboxError:
+            worker.close()
+            try:
+                worker = self.spawn(worker.language)
+            except SandboxError:
+                # The dead worker keeps the slot and is replaced on checkout
+                pass
+            raise
+        finally:
+            self.put(worker)
+
+    def execute(self, payload, timeout=None, cancel=None):
+        """
+        Run one request on a free worker.  If cancel (a CancelToken) fires
+        meanwhile, the worker is stopped and replaced, and Cancelled is
+        raised.
+        """
+        language = payload.get("language")
+        demand = self.demand.get(language) if language else None
+        if demand:
+            demand.arrived()
+        queued_at = time.monotonic()
+        with self.acquire(language) as worker:
+            started = time.monotonic()
+            if demand:
+                demand.waited(started - queued_at)
+            if cancel is None:
+                response = worker.request(payload, timeout)
+            else:
+                try:
+                    with cancel.on_cancel(worker.terminate):
+                        response = worker.request(payload, timeout)
+                except SandboxError:
+                    if cancel.cancelled:
+                        raise Cancelled()
+                    raise
+            if demand:
+                demand.served(time.monotonic() - started)
+            self.request_latency.record(worker.last_ttfb)
+            return response
+
+    def sizing_loop(self):
+        while not self.closed:
+            time.sleep(config.get('POOL_RESIZE_INTERVAL'))
+            try:
+                self.resize()
+            except Exception:
+                pass
+
+    def resize(self):
+        """
+        One sizing round: pick each language's target from its demand and
+        the memory budget, retire idle workers beyond it (busy ones are
+        retired when handed back) and start the missing ones.
+        """
+        with self.lock:
+            current = dict(self.workers)
+            queued = dict(self.queued)
+        snapshots = {language: self.demand[language].snapshot() for language in self.languages}
+        round_wait = {language: self.demand[language].end_round() for language in self.languages}
+        desired, reasons = {}, {}
+        for language in self.languages:
+            desired[language], reasons[language] = pool_sizing.desired_workers(
+                current[language], snapshots[language], round_wait[language], queued[language],
+            )
+        pressure = {
+            language: (queued[language], round_wait[language], desired[language] - current[language])
+            for language in self.languages
+        }
+        targets = pool_sizing.fit_budget(desired, pressure)
+
+        retired = []
+        with self.lock:
+            if self.closed:
+                return
+            self.round_wait = round_wait
+            for language in self.languages:
+                target = targets[language]
+                reason = reasons[language]
+                if target < min(desired[language], config.get('POOL_MAX_PER_LANGUAGE')):
+                    self.sizing.budget_limited += 1
+                    reason = "budget"
+                if target != self.targets[language]:
+                    self.sizing.record(language, self.targets[language], target, reason)
+                self.targets[language] = target
+                idle = self.idle[language]
+                while self.workers[language] > target and idle:
+                    retired.append(idle.pop())
+                    self.workers[language] -= 1
+        for worker in retired:
+            worker.close()
+
+        for language in self.languages:
+            while True:
+                with self.lock:
+                    if self.closed or self.workers[language] >= self.targets[language]:
+                        break
+                    # Count it now so concurrent hand-backs see the slot taken
+                    self.workers[language] += 1
+                try:
+                    worker = self.spawn(language)
+                except SandboxError:
+                    with self.lock:
+                        self.workers[language] -= 1
+                    break
+                self.put(worker)
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                "size": sum(self.workers.values()),
+                "idle": sum(len(idle) for idle in self.idle.values()),
+                "waiting": self.waiting,
+            }
+            if self.adaptive:
+                costs = config.get('WARM_WORKER_MEMORY_MB')
+                stats["languages"] = {
+                    language: {
+                        "workers": self.workers[language],
+                        "idle": len(self.idle[language]),
+                        "target": self.targets[language],
+                        "queued": self.queued[language],
+                        "round_wait_ms": self.round_wait[language],
+                        "memory_mb": self.workers[language] * costs.get(language, 0),
+                    }
+                    for language in self.languages
+                }
+                stats["memory_budget_mb"] = config.get('POOL_MEMORY_BUDGET_MB')
+                stats["memory_used_mb"] = sum(entry["memory_mb"] for entry in stats["languages"].values())
+                stats["sizing"] = self.sizing.stats()
+        if self.adaptive:
+            for language in self.languages:
+                stats["languages"][language].update(self.demand[language].snapshot())
+        stats["spawn_ttfb"] = self.spawn_latency.stats()
+        stats["request_ttfb"] = self.request_latency.stats()
+        return stats
+
+    def close(self):
+        with self.available:
+            self.closed = True
+            workers = [worker for idle in self.idle.values() for worker in idle]
+            for idle in self.idle.values():
+                idle.clear()
+            self.available.notify_all()
+        for worker in workers:
+            worker.close()
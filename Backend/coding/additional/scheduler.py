@@ -0,0 +1,174 @@
+import threading
+import time
+
+from . import config
+from .sandbox_pool import PoolBusy, SandboxError
+
+# Ids of artifacts, bundles and test data placed on a specific sandbox end in
+# "@<sandbox name>", so every later request about them reaches that sandbox.
+PLACEMENT_SEPARATOR = "@"
+ROUTED_FIELDS = ("artifact", "key", "bundle", "testdata")
+
+
+def placed(identifier, sandbox):
+    if sandbox is None:
+        return identifier
+    return f"{identifier}{PLACEMENT_SEPARATOR}{sandbox}"
+
+
+def placement(payload):
+    for field in ROUTED_FIELDS:
+        value = payload.get(field)
+        if value and PLACEMENT_SEPARATOR in value:
+            return value.rsplit(PLACEMENT_SEPARATOR, 1)[1]
+    return None
+
+
+class Sandbox:
+    """
+    One sandbox (container) with its worker pool and scheduling state.
+    """
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.in_flight = 0
+        self.dispatched = 0
+        self.failures = 0
+        self.healthy = True
+        self.replacements = 0
+
+    def load(self):
+        return self.in_flight / max(self.pool.size, 1)
+
+    def stats(self):
+        pool = self.pool.stats()
+        return {
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "queue_depth": pool["waiting"],
+            "dispatched": self.dispatched,
+            "consecutive_failures": self.failures,
+            "replacements": self.replacements,
+            "pool": pool,
+        }
+
+
+class SandboxScheduler:
+    """
+    Spreads work over several sandboxes.  New work goes to the least-loaded
+    healthy sandbox; requests about a placed artifact or bundle go where it
+    lives.  A sandbox that keeps failing is marked unhealthy, drained of its
+    in-flight requests and then replaced through make_pool(name, replacing).
+    """
+
+    def __init__(self, names, make_pool):
+        self.make_pool = make_pool
+        self.sandboxes = {name: Sandbox(name, make_pool(name, False)) for name in names}
+        self.lock = threading.Lock()
+        self.monitor = None
+
+    def names(self):
+        with self.lock:
+            return [name for name, sandbox in self.sandboxes.items() if sandbox.healthy]
+
+    def least_loaded(self, candidates=None):
+        with self.lock:
+            healthy = [sandbox for sandbox in self.sandboxes.values()
+                       if sandbox.healthy and (candidates is None or sandbox.name in candidates)]
+            if not healthy:
+                healthy = [sandbox for sandbox in self.sandboxes.values() if sandbox.healthy]
+            if not healthy:
+                raise SandboxError("No healthy sandbox available.")
+            return min(healthy, key=lambda sandbox: (sandbox.load(), sandbox.dispatched)).name
+
+    def execute(self, payload, timeout=None, cancel=None):
+        self.start_monitor()
+        name = placement(payload)
+        with self.lock:
+            if name is None or name not in self.sandboxes:
+                name = None
+        if name is None:
+            name = self.least_loaded()
+
+        with self.lock:
+            sandbox = self.sandboxes[name]
+            sandbox.in_flight += 1
+            sandbox.dispatched += 1
+        try:
+            response = sandbox.pool.execute(payload, timeout, cancel)
+        except PoolBusy:
+            # A loaded sandbox is not a failing one
+            raise
+        except SandboxError:
+            self.record_failure(sandbox)
+            raise
+        else:
+            with self.lock:
+                sandbox.failures = 0
+            return response
+        finally:
+            with self.lock:
+                sandbox.in_flight -= 1
+
+    def record_failure(self, sandbox):
+        with self.lock:
+            sandbox.failures += 1
+            if sandbox.failures >= config.get('SANDBOX_UNHEALTHY_AFTER'):
+                # Stop sending it new work; the monitor replaces it once its
+                # in-flight requests are done
+                sandbox.healthy = False
+
+    def start_monitor(self):
+        with self.lock:
+            if self.monitor is not None:
+                return
+            self.monitor = threading.Thread(target=self.monitor_loop, name="sandbox-monitor", daemon=True)
+            self.monitor.start()
+
+    def monitor_loop(self):
+        while True:
+            time.sleep(config.get('POOL_HEALTH_CHECK_INTERVAL'))
+            for sandbox in list(self.sandboxes.values()):
+                try:
+                    self.check(sandbox)
+                except Exception:
+                    pass
+
+    def check(self, sandbox):
+        if sandbox.healthy:
+            # Only probe sandboxes with nothing to do; busy ones report
+            # failures through their own requests
+            if sandbox.in_flight == 0:
+                try:
+                    sandbox.pool.execute({"op": "ping"}, config.get('SANDBOX_GRACE_SECONDS'))
+                except PoolBusy:
+                    pass
+                except SandboxError:
+                    self.record_failure(sandbox)
+            return
+        if sandbox.in_flight:
+            return
+        self.replace(sandbox)
+
+    def replace(self, sandbox):
+        sandbox.pool.close()
+        try:
+            pool = self.make_pool(sandbox.name, True)
+            pool.start()
+        except SandboxError:
+            # Try again on the next round
+            return
+        with self.lock:
+            sandbox.pool = pool
+            sandbox.failures = 0
+            sandbox.healthy = True
+            sandbox.replacements += 1
+
+    def stats(self):
+        with self.lock:
+            return {name: sandbox.stats() for name, sandbox in self.sandboxes.items()}
+
+    def close(self):
+        for sandbox in self.sandboxes.values():
+            sandbox.pool.close()
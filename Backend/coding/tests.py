@@ -1,3 +1,601 @@
-from django.test import TestCase
+import json
+import jwt
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .additional import (
+    admission, artifact_cache, backends, cancellation, compile, fair_queue, jobs, pool_sizing, result_memo,
+    scheduler,
+)
+from . import views
+from .additional.sandbox_pool import PoolBusy, SandboxError
+from .views_contest import contest_problem
+
+# The fake backend's programs echo their input, so a sample passes when its
+# expected output is its input
+PASSING = {"input": ["7"], "output": "7"}
+FAILING = {"input": ["7"], "output": "8"}
+
+
+def fake_backend(**overrides):
+    return override_settings(CODE_EXECUTION=dict({
+        'BACKEND': 'fake',
+        'PYTHON_HARNESS': False,
+        'MAX_PARALLEL_PER_SUBMISSION': 1,
+    }, **overrides))
+
+
+def reset_singletons():
+    # Every test gets a fresh backend, executor, memo and caches built from
+    # its own settings
+    backends._backend = None
+    compile._executor = None
+    result_memo._memo = None
+    artifact_cache._cache = None
+    with compile._staged_lock:
+        compile._staged.clear()
+
+
+class EvaluationTestCase(SimpleTestCase):
+    def setUp(self):
+        reset_singletons()
+        self.addCleanup(reset_singletons)
+
+    def evaluate(self, samples, code="print(input())", language="python", **kwargs):
+        limits = compile.execution_limits({}, language)
+        return compile.evaluate(code, language, samples, limits, **kwargs)
+
+
+@fake_backend()
+class EvaluateTests(EvaluationTestCase):
+    def test_each_sample_gets_its_verdict(self):
+        results = self.evaluate([PASSING, FAILING])
+        self.assertEqual([result["status"] for result in results], ["Success", "Error"])
+        self.assertEqual([result["verdict"] for result in results], ["OK", "WA"])
+
+    def test_compile_error_fails_every_sample(self):
+        results = self.evaluate([PASSING, PASSING], code="FAKE_COMPILE_ERROR", language="cpp")
+        self.assertEqual([result["verdict"] for result in results], ["CE", "CE"])
+
+    def test_results_are_reported_as_they_finish(self):
+        reported = []
+        results = self.evaluate([PASSING, FAILING], on_result=lambda index, result: reported.append(index),
+                                collect=False)
+        self.assertIsNone(results)
+        self.assertEqual(sorted(reported), [0, 1])
+
+    def test_stop_on_first_failure_skips_the_rest(self):
+        results = self.evaluate([FAILING, PASSING, PASSING], stop_on_first_failure=True)
+        self.assertEqual([result["status"] for result in results], ["Error", "Skipped", "Skipped"])
+
+    @fake_backend(PYTHON_HARNESS=True)
+    def test_stop_on_first_failure_in_harness_mode(self):
+        results = self.evaluate([PASSING, FAILING, PASSING], stop_on_first_failure=True)
+        self.assertEqual([result["status"] for result in results], ["Success", "Error", "Skipped"])
+
+    def test_lost_artifact_is_recompiled(self):
+        backend = backends.get_backend()
+        execute = backend.execute
+        lost = []
+
+        def forgetful(payload, *args, **kwargs):
+            if payload["op"] == "run" and not lost:
+                # The sandbox evicted it right after compiling
+                lost.append(payload["artifact"])
+                backend.artifacts.clear()
+            return execute(payload, *args, **kwargs)
+
+        with mock.patch.object(backend, "execute", forgetful):
+            results = self.evaluate([PASSING, PASSING])
+        self.assertEqual(len(lost), 1)
+        self.assertEqual([result["status"] for result in results], ["Success", "Success"])
+
+
+@fake_backend(FAKE_LATENCY_MS=100)
+class ResultMemoTests(EvaluationTestCase):
+    def test_concurrent_identical_evaluations_share_one_run(self):
+        results = []
+        start = threading.Barrier(4)
+
+        def submit():
+            start.wait()
+            results.append(self.evaluate([PASSING, PASSING]))
+
+        threads = [threading.Thread(target=submit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = result_memo.get_memo().stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["coalesced"] + stats["hits"], 3)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_deterministic_results_are_remembered(self):
+        first = self.evaluate([PASSING, FAILING])
+        second = self.evaluate([PASSING, FAILING])
+        self.assertEqual(first, second)
+        self.assertEqual(result_memo.get_memo().stats()["hits"], 1)
+
+    def test_skipped_results_are_not_remembered(self):
+        self.evaluate([FAILING, PASSING], stop_on_first_failure=True)
+        self.evaluate([FAILING, PASSING], stop_on_first_failure=True)
+        self.assertEqual(result_memo.get_memo().stats()["misses"], 2)
+
+    def test_callers_own_their_results(self):
+        self.evaluate([PASSING])[0]["status"] = "Tampered"
+        self.assertEqual(self.evaluate([PASSING])[0]["status"], "Success")
+
+
+@fake_backend(FAKE_LATENCY_MS=100)
+class CancellationTests(EvaluationTestCase):
+    def test_cancelled_evaluation_raises(self):
+        token = cancellation.CancelToken()
+        threading.Timer(0.05, token.cancel).start()
+        with self.assertRaises(cancellation.Cancelled):
+            self.evaluate([PASSING, PASSING], cancel=token)
+
+    def test_cancelled_results_are_not_remembered(self):
+        token = cancellation.CancelToken()
+        token.cancel()
+        with self.assertRaises(cancellation.Cancelled):
+            self.evaluate([PASSING], cancel=token)
+        self.assertEqual(result_memo.get_memo().stats()["entries"], 0)
+
+    def test_follower_of_a_cancelled_run_runs_it_again(self):
+        token = cancellation.CancelToken()
+        outcome = {}
+
+        def lead():
+            try:
+                self.evaluate([PASSING, PASSING], cancel=token)
+            except cancellation.Cancelled:
+                outcome["leader"] = "cancelled"
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        memo = result_memo.get_memo()
+        while not memo.in_flight:
+            time.sleep(0.01)
+        follower = threading.Thread(target=lambda: outcome.update(follower=self.evaluate([PASSING, PASSING])))
+        follower.start()
+        while not memo.stats()["coalesced"]:
+            time.sleep(0.01)
+        token.cancel()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(outcome["leader"], "cancelled")
+        self.assertEqual([result["status"] for result in outcome["follower"]], ["Success", "Success"])
+        self.assertEqual(memo.stats()["misses"], 2)
+
+    def test_claiming_a_slot_cancels_its_previous_run(self):
+        slots = cancellation.Slots()
+        first = slots.claim(("student", "1"))
+        second = slots.claim(("student", "1"))
+        self.assertTrue(first.cancelled)
+        self.assertFalse(second.cancelled)
+        slots.release(("student", "1"), second)
+        self.assertFalse(second.cancelled)
+
+
+class FairQueueTests(SimpleTestCase):
+    def test_tenants_take_turns(self):
+        queue = fair_queue.ClassQueue(quantum=1)
+        for _ in range(3):
+            queue.push("busy", fair_queue.Task(None, ("busy",), 1))
+        queue.push("quiet", fair_queue.Task(None, ("quiet",), 1))
+        order = [queue.pop().args[0] for _ in range(4)]
+        self.assertEqual(order, ["busy", "quiet", "busy", "busy"])
+
+    def test_expensive_tasks_wait_for_credit(self):
+        queue = fair_queue.ClassQueue(quantum=1)
+        slow = [fair_queue.Task(None, ("slow",), 2) for _ in range(2)]
+        fast = [fair_queue.Task(None, ("fast",), 1) for _ in range(4)]
+        for task in slow:
+            queue.push("slow", task)
+        for task in fast:
+            queue.push("fast", task)
+        order = [queue.pop().args[0] for _ in range(6)]
+        # Each tenant gets the same execution time, not the same task count
+        self.assertEqual(order[:3], ["fast", "slow", "fast"])
+        self.assertEqual(order.count("slow"), 2)
+
+    def test_higher_priority_classes_run_first(self):
+        executor = fair_queue.FairExecutor(max_workers=1, quantum=1)
+        gate = threading.Event()
+        order = []
+        blocker = executor.submit(gate.wait, priority=fair_queue.SUBMISSION)
+        futures = [
+            executor.submit(order.append, priority, priority=priority)
+            for priority in (fair_queue.STAFF_VALIDATION, fair_queue.SAMPLE_RUN, fair_queue.SUBMISSION)
+        ]
+        gate.set()
+        blocker.result()
+        for future in futures:
+            future.result()
+        self.assertEqual(order, [fair_queue.SUBMISSION, fair_queue.SAMPLE_RUN, fair_queue.STAFF_VALIDATION])
+
+
+class JobQueueTests(EvaluationTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.problems_file = os.path.join(directory, "questions.json")
+        with open(self.problems_file, "w") as problems_file:
+            json.dump({"problems": [{"id": 1, "hidden_samples": [PASSING, FAILING]}]}, problems_file)
+        settings = fake_backend(JOB_DB_PATH=os.path.join(directory, "jobs.sqlite3"), JOB_RETENTION=60)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        jobs._schema_ready = False
+        self.addCleanup(setattr, jobs, "_schema_ready", False)
+        # Jobs are run by the test itself, not background workers
+        patcher = mock.patch.object(jobs, "start_workers")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_next_job(self):
+        job = jobs.claim_next()
+        self.assertIsNotNone(job)
+        jobs.run_job(*job)
+        return job[0]
+
+    def test_job_runs_to_compact_results(self):
+        job_id = jobs.enqueue(self.problems_file, 1, "print(input())", "python", "hidden_samples")
+        self.assertEqual(jobs.get_job(job_id)["status"], jobs.QUEUED)
+        self.assertEqual(jobs.pending_count(), 1)
+
+        self.assertEqual(self.run_next_job(), job_id)
+        job = jobs.get_job(job_id)
+        self.assertEqual(job["status"], jobs.DONE)
+        self.assertEqual([result["verdict"] for result in job["results"]], ["OK", "WA"])
+        self.assertNotIn("expected_output", job["results"][1])
+        self.assertEqual(jobs.pending_count(), 0)
+
+    def test_jobs_run_oldest_first(self):
+        first = jobs.enqueue(self.problems_file, 1, "print(input())", "python", "hidden_samples")
+        second = jobs.enqueue(self.problems_file, 1, "print(input())", "python", "hidden_samples")
+        self.assertEqual(self.run_next_job(), first)
+        self.assertEqual(self.run_next_job(), second)
+        self.assertIsNone(jobs.claim_next())
+
+    def test_unknown_problem_fails_the_job(self):
+        job_id = jobs.enqueue(self.problems_file, 2, "print(input())", "python", "hidden_samples")
+        self.run_next_job()
+        job = jobs.get_job(job_id)
+        self.assertEqual(job["status"], jobs.FAILED)
+        self.assertEqual(job["error"], "Problem not found or invalid test case.")
+
+    def test_finished_jobs_are_pruned_after_retention(self):
+        old = jobs.enqueue(self.problems_file, 1, "print(input())", "python", "hidden_samples")
+        self.run_next_job()
+        jobs.update(old, finished_at=time.time() - 120)
+        recent = jobs.enqueue(self.problems_file, 1, "print(input())", "python", "hidden_samples")
+        self.run_next_job()
+        waiting = jobs.enqueue(self.problems_file, 1, "print(input())", "python", "hidden_samples")
+
+        self.assertEqual(jobs.prune_finished(), 1)
+        self.assertIsNone(jobs.get_job(old))
+        self.assertEqual(jobs.get_job(recent)["status"], jobs.DONE)
+        self.assertEqual(jobs.get_job(waiting)["status"], jobs.QUEUED)
+
+    def test_status_view(self):
+        job_id = jobs.enqueue(self.problems_file, 1, "print(input())", "python", "hidden_samples")
+        self.run_next_job()
+        factory = RequestFactory()
+
+        response = views.submissionStatus(factory.get(f"/submit/status/{job_id}/"), job_id)
+        self.assertEqual(response.status_code, 200)
+        job = json.loads(response.content)
+        self.assertEqual(job["status"], jobs.DONE)
+        self.assertEqual([result["verdict"] for result in job["results"]], ["OK", "WA"])
+
+        self.assertEqual(views.submissionStatus(factory.get("/submit/status/missing/"), "missing").status_code, 404)
+        self.assertEqual(views.submissionStatus(factory.post(f"/submit/status/{job_id}/"), job_id).status_code, 405)
+
+
+class StubPool:
+    # Stands in for a sandbox's worker pool; raises error while it is set
+    size = 1
+
+    def __init__(self):
+        self.error = None
+        self.closed = False
+
+    def execute(self, payload, timeout=None, cancel=None):
+        if self.error is not None:
+            raise self.error
+        return {"ok": True}
+
+    def start(self):
+        pass
+
+    def stats(self):
+        return {"waiting": 0}
+
+    def close(self):
+        self.closed = True
+
+
+@override_settings(CODE_EXECUTION={'SANDBOX_UNHEALTHY_AFTER': 2})
+class SchedulerHealthTests(SimpleTestCase):
+    def setUp(self):
+        self.pools = []
+        self.scheduler = scheduler.SandboxScheduler(["sandbox"], self.make_pool)
+        self.sandbox = self.scheduler.sandboxes["sandbox"]
+        # Health checks are driven by the test, not the monitor thread
+        patcher = mock.patch.object(self.scheduler, "start_monitor")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_pool(self, name, replacing):
+        self.pools.append(StubPool())
+        return self.pools[-1]
+
+    def fail(self, error):
+        self.pools[-1].error = error
+        with self.assertRaises(SandboxError):
+            self.scheduler.execute({"op": "run"})
+        self.pools[-1].error = None
+
+    def test_consecutive_failures_mark_the_sandbox_unhealthy(self):
+        self.fail(SandboxError("worker died"))
+        self.scheduler.execute({"op": "run"})
+        self.fail(SandboxError("worker died"))
+        self.assertTrue(self.sandbox.healthy)
+        self.fail(SandboxError("worker died"))
+        self.assertFalse(self.sandbox.healthy)
+        with self.assertRaises(SandboxError):
+            self.scheduler.least_loaded()
+
+    def test_a_busy_pool_is_not_a_failure(self):
+        for _ in range(5):
+            self.fail(PoolBusy("No sandbox worker became available in time."))
+        self.assertTrue(self.sandbox.healthy)
+        self.assertEqual(self.sandbox.failures, 0)
+
+    def test_unhealthy_sandbox_is_replaced_once_idle(self):
+        self.fail(SandboxError("worker died"))
+        self.fail(SandboxError("worker died"))
+        old_pool = self.sandbox.pool
+        self.sandbox.in_flight = 1
+        self.scheduler.check(self.sandbox)
+        self.assertIs(self.sandbox.pool, old_pool)
+
+        self.sandbox.in_flight = 0
+        self.scheduler.check(self.sandbox)
+        self.assertTrue(old_pool.closed)
+        self.assertIsNot(self.sandbox.pool, old_pool)
+        self.assertTrue(self.sandbox.healthy)
+        self.assertEqual(self.sandbox.replacements, 1)
+
+
+class ContestProblemTests(SimpleTestCase):
+    PROBLEM = {
+        "title": "Sum", "role": "dev", "level": "easy", "problem_statement": "Add two numbers",
+        "samples": [PASSING], "hidden_samples": [FAILING],
+    }
+
+    def test_problem_limits_reach_the_sandbox(self):
+        problem = contest_problem(0, dict(self.PROBLEM, time_limit=5, memory_limit=64,
+                                          checker={"mode": "float", "float_tolerance": 1e-4}))
+        # Through questions.json, as the execution path reads it
+        problem = json.loads(json.dumps(problem))
+        limits = compile.execution_limits(problem, "python")
+        self.assertEqual(limits["time_limit"], 5.0)
+        self.assertEqual(limits["memory_limit_mb"], 64)
+        self.assertEqual(limits["checker"]["mode"], "float")
+        self.assertEqual(limits["checker"]["float_tolerance"], 1e-4)
+
+    def test_problems_without_limits_get_the_defaults(self):
+        problem = contest_problem(2, self.PROBLEM)
+        self.assertEqual(problem["id"], 3)
+        self.assertNotIn("time_limit", problem)
+        self.assertEqual(compile.execution_limits(problem, "python"), compile.execution_limits({}, "python"))
+
+
+class CancelRunViewTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        patcher = mock.patch.object(cancellation, "slots", cancellation.Slots())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cancel(self, claims=None):
+        request = self.factory.post("/compile/cancel/", json.dumps({"problem_id": 1}),
+                                    content_type="application/json")
+        if claims is not None:
+            request.COOKIES["jwt"] = jwt.encode(claims, "test", algorithm="HS256")
+        return views.cancelRun(request)
+
+    def test_students_cancel_their_own_run(self):
+        token = cancellation.slots.claim(("student-1", "1"))
+        response = self.cancel({"student_id": "student-1"})
+        self.assertEqual(json.loads(response.content), {"cancelled": True})
+        self.assertTrue(token.cancelled)
+
+    def test_nothing_to_cancel(self):
+        response = self.cancel({"student_id": "student-1"})
+        self.assertEqual(json.loads(response.content), {"cancelled": False})
+
+    def test_non_students_are_refused_without_ending_their_session(self):
+        token = cancellation.slots.claim(("student-1", "1"))
+        self.assertEqual(self.cancel().status_code, 403)
+        self.assertEqual(self.cancel({"staff_user": "staff-1"}).status_code, 403)
+        self.assertFalse(token.cancelled)
+
+
+@fake_backend()
+class CompileLogViewTests(EvaluationTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        problems_file = os.path.join(directory, "questions.json")
+        with open(problems_file, "w") as problems:
+            json.dump({"problems": [{"id": 1, "samples": [PASSING, FAILING]}]}, problems)
+        patcher = mock.patch.object(views, "PROBLEMS_FILE_PATH", problems_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def log(self, case, problem_id=1):
+        request = RequestFactory().post("/compile/log/", json.dumps({
+            "user_code": "print(input())", "language": "python", "problem_id": problem_id, "case": case,
+        }), content_type="application/json")
+        return views.compileLog(request)
+
+    def test_full_result_of_one_case(self):
+        response = self.log(1)
+        self.assertEqual(response.status_code, 200)
+        log = json.loads(response.content)
+        self.assertEqual(log["case"], 1)
+        self.assertEqual(log["result"]["verdict"], "WA")
+        self.assertEqual(log["result"]["expected_output"], "8")
+
+    def test_logs_after_a_run_come_from_the_memo(self):
+        self.log(0)
+        self.log(1)
+        self.assertEqual(result_memo.get_memo().stats()["misses"], 1)
+
+    def test_unknown_problem_or_case(self):
+        self.assertEqual(self.log(2).status_code, 404)
+        self.assertEqual(self.log(0, problem_id=2).status_code, 404)
+        self.assertEqual(views.compileLog(RequestFactory().get("/compile/log/")).status_code, 405)
+
+
+@fake_backend()
+class ExecutionStatsViewTests(EvaluationTestCase):
+    def test_stats_cover_every_layer(self):
+        self.evaluate([PASSING], code="int main() {}", language="cpp")
+        response = views.executionStats(RequestFactory().get("/compile/stats/"))
+        self.assertEqual(response.status_code, 200)
+        stats = json.loads(response.content)
+        self.assertEqual(set(stats), {"artifact_cache", "compiler_cache", "backend", "executor", "result_memo",
+                                      "cancellation", "admission"})
+        self.assertEqual(stats["backend"]["name"], "fake")
+        self.assertEqual(stats["result_memo"]["misses"], 1)
+
+    def test_only_get_is_allowed(self):
+        self.assertEqual(views.executionStats(RequestFactory().post("/compile/stats/")).status_code, 405)
+
+
+@override_settings(CODE_EXECUTION={
+    'ADMISSION_LIMITS': {'run': 2, 'submit': 2},
+    'ADMISSION_DEFAULT_RETRY_AFTER': 5,
+    'ADMISSION_MAX_RETRY_AFTER': 60,
+})
+class AdmissionTests(SimpleTestCase):
+    def full(self, budget):
+        budget.outstanding = budget.limit()
+        return budget
+
+    def post(self, view, path):
+        request = RequestFactory().post(path, json.dumps({"user_code": "print(1)", "language": "python",
+                                                          "problem_id": 1}), content_type="application/json")
+        return view(request)
+
+    def test_requests_past_the_limit_are_turned_away(self):
+        budget = admission.Budget(admission.RUN)
+        budget.acquire()
+        budget.acquire()
+        with self.assertRaises(admission.Overloaded) as raised:
+            budget.acquire()
+        # Nothing has finished yet to estimate from
+        self.assertEqual(raised.exception.retry_after, 5)
+        budget.release()
+        budget.acquire()
+        self.assertEqual(budget.stats()["rejected"], 1)
+
+    def test_retry_after_follows_throughput(self):
+        budget = admission.Budget(admission.RUN)
+        with mock.patch.object(admission.time, "monotonic", return_value=1000.0):
+            # One completion a second
+            budget.completions.extend(990.0 + second for second in range(10))
+            budget.outstanding = 5
+            with self.assertRaises(admission.Overloaded) as raised:
+                budget.acquire()
+            self.assertEqual(raised.exception.retry_after, 4)
+            budget.outstanding = 1000
+            with self.assertRaises(admission.Overloaded) as raised:
+                budget.acquire()
+            self.assertEqual(raised.exception.retry_after, 60)
+
+    def test_full_run_budget_answers_429(self):
+        budget = self.full(admission.Budget(admission.RUN))
+        with mock.patch.dict(admission.BUDGETS, {admission.RUN: budget}), \
+                mock.patch.object(views.compile, "compilecode") as compilecode:
+            response = self.post(views.compileCode, "/compile/")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "5")
+        self.assertEqual(json.loads(response.content)["retry_after"], 5)
+        compilecode.assert_not_called()
+
+    def test_full_submit_budget_queues_nothing(self):
+        budget = self.full(admission.SubmitBudget(admission.SUBMIT))
+        with mock.patch.dict(admission.BUDGETS, {admission.SUBMIT: budget}), \
+                mock.patch.object(admission.jobs, "pending_count", return_value=0), \
+                mock.patch.object(admission.jobs, "finished_since", return_value=0), \
+                mock.patch.object(views.jobs, "enqueue") as enqueue:
+            response = self.post(views.compileHidden, "/submit/")
+        self.assertEqual(response.status_code, 429)
+        enqueue.assert_not_called()
+
+
+@override_settings(CODE_EXECUTION={
+    'POOL_HEADROOM': 1.5,
+    'POOL_TARGET_QUEUE_WAIT_MS': 50,
+    'POOL_MIN_PER_LANGUAGE': 1,
+    'POOL_MAX_PER_LANGUAGE': 10,
+    'POOL_MEMORY_BUDGET_MB': 1000,
+    'WARM_WORKER_MEMORY_MB': {'python': 100, 'java': 300},
+})
+class PoolSizingTests(SimpleTestCase):
+    def demand(self, arrival_rate, mean_service_ms):
+        return {"arrival_rate": arrival_rate, "mean_wait_ms": 0.0, "mean_service_ms": mean_service_ms}
+
+    def test_steady_arrivals_give_their_rate(self):
+        clock = mock.patch.object(pool_sizing.time, "monotonic", return_value=0.0)
+        now = clock.start()
+        self.addCleanup(clock.stop)
+        demand = pool_sizing.Demand(half_life=10)
+        for tick in range(1000):
+            now.return_value = tick / 10
+            demand.arrived()
+            demand.served(0.2)
+        snapshot = demand.snapshot()
+        self.assertAlmostEqual(snapshot["arrival_rate"], 10, delta=0.5)
+        self.assertAlmostEqual(snapshot["mean_service_ms"], 200)
+
+    def test_queue_waits_are_reported_per_round(self):
+        demand = pool_sizing.Demand(half_life=10)
+        demand.waited(0.2)
+        demand.waited(0.4)
+        self.assertAlmostEqual(demand.end_round(), 300)
+        self.assertEqual(demand.end_round(), 0.0)
+
+    def test_desired_workers(self):
+        # 10 requests a second of 500 ms each keep 5 workers busy
+        busy = self.demand(10, 500)
+        self.assertEqual(pool_sizing.desired_workers(2, busy, 0, 0), (8, "demand"))
+        self.assertEqual(pool_sizing.desired_workers(8, busy, 0, 0), (8, None))
+        self.assertEqual(pool_sizing.desired_workers(8, busy, 0, 3), (11, "queueing"))
+        self.assertEqual(pool_sizing.desired_workers(8, busy, 80, 0), (9, "queueing"))
+        self.assertEqual(pool_sizing.desired_workers(12, busy, 0, 0), (11, "idle"))
+
+    def test_budget_goes_to_the_most_pressed_language_first(self):
+        targets = pool_sizing.fit_budget({"python": 5, "java": 5}, {"python": 1, "java": 2})
+        self.assertEqual(targets, {"python": 4, "java": 2})
+
+    @override_settings(CODE_EXECUTION={'POOL_MIN_PER_LANGUAGE': 1, 'POOL_MEMORY_BUDGET_MB': 100,
+                                       'WARM_WORKER_MEMORY_MB': {'python': 100, 'java': 300}})
+    def test_every_language_keeps_its_minimum(self):
+        targets = pool_sizing.fit_budget({"python": 5, "java": 5}, {"python": 1, "java": 2})
+        self.assertEqual(targets, {"python": 1, "java": 1})
@@ -7,6 +7,12 @@ from . import views
 urlpatterns = [
     path('compile/',views.compileCode,name='compile'),
     path('submit/',views.compileHidden,name='compile_hidden'),
+    path('submit/status/<str:job_id>/', views.submissionStatus, name='submission_status'),
+    path('compile/stats/', views.executionStats, name='execution_stats'),
+    path('compile/log/', views.compileLog, name='compile_log'),
+    path('compile/cancel/', views.cancelRun, name='cancel_run'),
+    path('compile/stream/', views.compileCodeStream, name='compile_stream'),
+    path('submit/stream/', views.compileHiddenStream, name='compile_hidden_stream'),
     path('userinput/', views.userInput, name='user_code'),
     path('manualProblems/', views_auto.fetch_Questions, name='fetch_questions'),
     path('publish/',views_auto.publish_questions,name='publish_questions'),
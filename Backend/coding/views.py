@@ -1,8 +1,9 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
+import jwt
 import os
-from .additional import compile, csvtojson, filepath
+from .additional import admission, cancellation, compile, csvtojson, fair_queue, filepath, jobs
 from .models import FileUploadProblems
 import csv
 import traceback
@@ -17,6 +18,56 @@ temp_questions_collection = db['tempQuestions']
 
 PROBLEMS_FILE_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'Frontend', 'public', 'json', 'questions.json')
 
+
+def stop_on_first_failure(contest_id):
+    # Opt-in per contest through testConfiguration in coding_assessments
+    if not contest_id:
+        return False
+    assessment = db.coding_assessments.find_one({"contestId": contest_id}, {"_id": 0, "testConfiguration": 1})
+    if not assessment:
+        return False
+    return bool(assessment.get("testConfiguration", {}).get("stop_on_first_failure", False))
+
+def token_claims(request):
+    # Claims of the jwt cookie, empty if there is none or it is invalid
+    jwt_token = request.COOKIES.get("jwt")
+    if not jwt_token:
+        return {}
+    try:
+        return jwt.decode(jwt_token, 'test', algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return {}
+
+def execution_schedule(request, priority):
+    """
+    Priority class and fair-share key for an execution request.  Staff
+    tokens validate problems at the lowest priority; students share each
+    class by the student_id in their JWT.
+    """
+    claims = token_claims(request)
+    if claims.get("staff_user"):
+        return {"priority": fair_queue.STAFF_VALIDATION, "tenant": f"staff:{claims['staff_user']}"}
+    tenant = claims.get("student_id") or request.META.get("REMOTE_ADDR")
+    return {"priority": priority, "tenant": tenant}
+
+def run_slot(request, problem_id):
+    # A student has at most one Run per problem in flight; a newer one
+    # cancels the older.  None without an authenticated student: callers
+    # behind one address must not cancel each other's runs.
+    student_id = token_claims(request).get("student_id")
+    if not student_id:
+        return None
+    return student_id, str(problem_id)
+
+def overloaded_response(error):
+    # Fast rejection while the executor is saturated
+    response = JsonResponse({
+        "error": "Too many submissions are being evaluated. Please try again shortly.",
+        "retry_after": error.retry_after,
+    }, status=429)
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
 @csrf_exempt
 def compileCode(request):
     if request.method == "POST":
@@ -31,7 +82,23 @@ def compileCode(request):
         problem_id = data.get('problem_id', 0)
 
         test_case = 'samples'
-        response = compile.compilecode(PROBLEMS_FILE_PATH, problem_id, user_code, test_case, language)
+        budget = admission.get_budget(admission.RUN)
+        try:
+            budget.acquire()
+        except admission.Overloaded as e:
+            return overloaded_response(e)
+        slot = run_slot(request, problem_id)
+        cancel = cancellation.slots.claim(slot) if slot else None
+        try:
+            response = compile.compilecode(
+                PROBLEMS_FILE_PATH, problem_id, user_code, test_case, language,
+                schedule=execution_schedule(request, fair_queue.SAMPLE_RUN),
+                cancel=cancel,
+            )
+        finally:
+            if slot:
+                cancellation.slots.release(slot, cancel)
+            budget.release()
         print(user_code)
         return response
 
@@ -49,13 +116,175 @@ def compileHidden(request):
         user_code = data.get('user_code', '')
         language = data.get('language', '')
         problem_id = data.get('problem_id', 0)
+        contest_id = data.get('contest_id', '')
 
         test_case = 'hidden_samples'
-        response = compile.compilecode(PROBLEMS_FILE_PATH, problem_id, user_code, test_case, language)
-        return response
+        try:
+            admission.get_budget(admission.SUBMIT).check()
+        except admission.Overloaded as e:
+            return overloaded_response(e)
+        # Queue the run and answer right away; poll submissionStatus for results
+        job_id = jobs.enqueue(
+            PROBLEMS_FILE_PATH, problem_id, user_code, language, test_case,
+            stop_on_first_failure=stop_on_first_failure(contest_id),
+            schedule=execution_schedule(request, fair_queue.SUBMISSION),
+        )
+        return JsonResponse({"job_id": job_id, "status": jobs.QUEUED}, status=202)
+
+    return JsonResponse({"error": "Invalid request method."}, status=405)
+
+@csrf_exempt
+def compileLog(request):
+    # Full log of one sample case, for clients showing compact results
+    if request.method == "POST":
+        data = json.loads(request.body)
+        user_code = data.get('user_code', '')
+        language = data.get('language', '')
+        problem_id = data.get('problem_id', 0)
+        case = int(data.get('case', 0))
+
+        budget = admission.get_budget(admission.RUN)
+        try:
+            budget.acquire()
+        except admission.Overloaded as e:
+            return overloaded_response(e)
+        try:
+            return compile.sample_log(
+                PROBLEMS_FILE_PATH, problem_id, user_code, language, case,
+                schedule=execution_schedule(request, fair_queue.SAMPLE_RUN),
+            )
+        finally:
+            budget.release()
+
+    return JsonResponse({"error": "Invalid request method."}, status=405)
+
+@csrf_exempt
+def cancelRun(request):
+    # Stop the student's Run of a problem that is still in flight
+    if request.method == "POST":
+        data = json.loads(request.body)
+        problem_id = data.get('problem_id', 0)
+        slot = run_slot(request, problem_id)
+        if slot is None:
+            # Not 401: the client treats that as an expired session
+            return JsonResponse({"error": "Only students can cancel a run."}, status=403)
+        return JsonResponse({"cancelled": cancellation.slots.cancel(slot)})
+
+    return JsonResponse({"error": "Invalid request method."}, status=405)
+
+def submissionStatus(request, job_id):
+    if request.method == "GET":
+        job = jobs.get_job(job_id)
+        if job is None:
+            return JsonResponse({"error": "Submission not found."}, status=404)
+        return JsonResponse(job)
+
+    return JsonResponse({"error": "Invalid request method."}, status=405)
+
+def executionStats(request):
+    if request.method == "GET":
+        stats = compile.execution_stats()
+        stats["admission"] = admission.stats()
+        return JsonResponse(stats)
 
     return JsonResponse({"error": "Invalid request method."}, status=405)
     
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class AdmittedStream:
+    """
+    Streaming body holding an admission slot.  Django closes it when the
+    response is done, so the slot comes back even if the client went away
+    before the stream started.
+    """
+
+    def __init__(self, events, budget):
+        self.events = events
+        self.budget = budget
+        self.released = False
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        if not self.released:
+            self.released = True
+            self.budget.release()
+
+
+def stream_compile(request, test_case):
+    # Shared by the streaming Run and Submit endpoints: one SSE "result"
+    # event per test case as soon as it finishes, then a "done" event.
+    data = json.loads(request.body)
+    user_code = data.get('user_code', '')
+    language = data.get('language', '')
+    problem_id = data.get('problem_id', 0)
+    # Only graded submissions honour the contest's fail-fast policy
+    fail_fast = test_case == 'hidden_samples' and stop_on_first_failure(data.get('contest_id', ''))
+    schedule = execution_schedule(
+        request, fair_queue.SUBMISSION if test_case == 'hidden_samples' else fair_queue.SAMPLE_RUN,
+    )
+
+    try:
+        problem = compile.load_problem(PROBLEMS_FILE_PATH, problem_id)
+    except (IndexError, KeyError, FileNotFoundError):
+        problem = None
+    if not problem or test_case not in problem:
+        return JsonResponse({"error": "Problem not found or invalid test case."}, status=404)
+    samples = problem[test_case]
+    limits = compile.execution_limits(problem, language)
+
+    # The admission slot is held until the stream has finished
+    budget = admission.get_budget(admission.SUBMIT if test_case == 'hidden_samples' else admission.RUN)
+    try:
+        budget.acquire()
+    except admission.Overloaded as e:
+        return overloaded_response(e)
+
+    def events():
+        # Runs are tied to the student's slot for the problem; graded
+        # submissions always run to completion
+        slot = run_slot(request, problem_id) if test_case == 'samples' else None
+        cancel = cancellation.slots.claim(slot) if slot else None
+        try:
+            yield sse_event("start", {"total": len(samples)})
+            results = compile.stream_results(user_code, language, samples, limits, fail_fast, schedule, cancel)
+            for index, result in results:
+                if test_case == 'hidden_samples':
+                    result = compile.compact_result(result)
+                yield sse_event("result", {"index": index, "result": result})
+            if cancel and cancel.cancelled:
+                yield sse_event("cancelled", {"total": len(samples)})
+            else:
+                yield sse_event("done", {"total": len(samples)})
+        finally:
+            if cancel:
+                # Also reached when the client goes away mid-stream
+                cancel.cancel()
+                cancellation.slots.release(slot, cancel)
+
+    response = StreamingHttpResponse(AdmittedStream(events(), budget), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+@csrf_exempt
+def compileCodeStream(request):
+    if request.method == "POST":
+        return stream_compile(request, 'samples')
+
+    return JsonResponse({"error": "Invalid request method."}, status=405)
+
+@csrf_exempt
+def compileHiddenStream(request):
+    if request.method == "POST":
+        return stream_compile(request, 'hidden_samples')
+
+    return JsonResponse({"error": "Invalid request method."}, status=405)
+
 @csrf_exempt
 def userInput(request):
     if request.method == 'POST':
@@ -8,6 +8,8 @@ from .models_contest import ContestDetails
 from datetime import datetime
 from bson import ObjectId
 import os
+import threading
+from .additional import compile
 
 
 # Update the MongoClient to use the provided connection string
@@ -19,6 +21,28 @@ final_questions_collection = db["finalQuestions"]
 coding_assessment = db["coding_assessment"]
 
 
+# Per-problem execution settings copied into questions.json when a problem
+# sets them; compile.execution_limits falls back to the defaults otherwise
+EXECUTION_FIELDS = ("time_limit", "memory_limit", "checker")
+
+
+def contest_problem(index, problem):
+    # One selected problem as questions.json holds it
+    transformed = {
+        "id": index + 1,
+        "title": problem["title"],
+        "role": problem["role"],
+        "level": problem["level"],
+        "problem_statement": problem["problem_statement"],
+        "samples": problem["samples"],
+        "hidden_samples": problem["hidden_samples"],
+    }
+    for field in EXECUTION_FIELDS:
+        if problem.get(field) is not None:
+            transformed[field] = problem[field]
+    return transformed
+
+
 def get_contests(request):
     # Fetch all contests from the Contest_Details collection
     contests = list(contest_collection.find({}, {"_id": 0}))  
@@ -161,18 +185,7 @@ def start_test(request):
 
             # Step 4: Transform problems to the desired structure
             transformed_problems = {
-                "problems": [
-                    {
-                        "id": index + 1,
-                        "title": problem["title"],
-                        "role": problem["role"],
-                        "level": problem["level"],
-                        "problem_statement": problem["problem_statement"],
-                        "samples": problem["samples"],
-                        "hidden_samples": problem["hidden_samples"],
-                    }
-                    for index, problem in enumerate(selected_problems)
-                ]
+                "problems": [contest_problem(index, problem) for index, problem in enumerate(selected_problems)]
             }
 
             # Step 5: Save transformed problems to a JSON file
@@ -189,6 +202,12 @@ def start_test(request):
             if not os.path.exists(file_path):
                 return JsonResponse({"error": "Failed to write file"}, status=500)
 
+            # Step 6: Stage the test cases in the sandboxes in the background;
+            # later runs only send the submission's source
+            threading.Thread(
+                target=compile.stage_problems, args=(transformed_problems["problems"],), daemon=True
+            ).start()
+
             return JsonResponse({
                 "message": "Test started successfully, and problems saved.",
                 "file_path": file_path
@@ -124,6 +124,7 @@ def create_assessment(request):
                 "deviceRestriction": test_configuration.get("deviceRestriction", False),
                 "noiseDetection": test_configuration.get("noiseDetection", False),
                 "passPercentage": test_configuration.get("passPercentage", ""),
+                "stop_on_first_failure": test_configuration.get("stop_on_first_failure", False),
             },
             "staffId": staff_id,
             "createdAt": datetime.utcnow(),
@@ -1,7 +1,7 @@
 // src/components/Buttons.js
 import React from 'react';
 
-function Buttons({ onCompile, onSubmit }) {
+function Buttons({ onCompile, onCancel, running, onSubmit }) {
   return (
     <div className="flex space-x-4 mt-4">
       <button
@@ -10,6 +10,14 @@ function Buttons({ onCompile, onSubmit }) {
       >
         Compile & Run
       </button>
+      {running && (
+        <button
+          onClick={onCancel}
+          className="bg-gray-500 text-white px-4 py-2 rounded"
+        >
+          Cancel Run
+        </button>
+      )}
       <button
         onClick={onSubmit}
         className="bg-green-500 text-white px-4 py-2 rounded"
@@ -11,10 +11,8 @@ function TestcaseResults({ results }) {
   // Get the active test case based on the active tab
   const activeTestCase = results[activeTab];
 
-  // Compare outputs to determine status dynamically
-  const isSuccess =
-    String(activeTestCase.expected_output || '').trim() ===
-    String(activeTestCase.stdout || '').trim();
+  // The server compares the output with the expected one
+  const isSuccess = activeTestCase.status === 'Success';
 
   return (
     <div className="mt-6">
@@ -41,6 +39,18 @@ function TestcaseResults({ results }) {
 
         <h3 className="text-lg font-semibold mt-2">Your Output</h3>
         <p>{activeTestCase.stdout ? activeTestCase.stdout.trim() : 'No output available'}</p>
+        {activeTestCase.output_truncated && <p className="text-gray-500">(output truncated)</p>}
+
+        {activeTestCase.diff && (
+          <>
+            <h3 className="text-lg font-semibold mt-2">First Difference</h3>
+            <p>
+              At {activeTestCase.diff.mode === 'exact' ? 'byte' : 'token'} {activeTestCase.diff.position}: expected{' '}
+              <code>{activeTestCase.diff.expected || '(end of output)'}</code>, got{' '}
+              <code>{activeTestCase.diff.actual || '(end of output)'}</code>
+            </p>
+          </>
+        )}
 
         <h3 className="text-lg font-semibold mt-2">Status</h3>
         <p
@@ -48,7 +58,7 @@ function TestcaseResults({ results }) {
             isSuccess ? 'text-green-500' : 'text-red-500'
           }`}
         >
-          {isSuccess ? 'Success' : 'Failure'}
+          {isSuccess ? 'Success' : activeTestCase.verdict && activeTestCase.verdict !== 'OK' ? `Failure (${activeTestCase.verdict})` : 'Failure'}
         </p>
 
         <h3 className="text-lg font-semibold mt-2">Execution Time</h3>
@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useRef } from "react";
-import axios from "axios";
+import api from "../../../axiosConfig";
 import { useParams, useNavigate } from "react-router-dom";
 import TestCaseSelection from "../../../components/staff/coding/TestCaseSelection";
 import ProblemDetails from "../../../components/staff/coding/ProblemDetails";
@@ -20,6 +20,9 @@ function ContestPage() {
   const [submissions, setSubmissions] = useState({});
   const mediaStreamRef = useRef(null);
   const [testEvaluations, setTestEvaluations] = useState([]);
+  const [running, setRunning] = useState(false);
+  // Only the latest Run clears the running state; older ones get cancelled
+  const latestRunRef = useRef(0);
 
   // Load problems and initialize submissions tracking
   useEffect(() => {
@@ -125,20 +128,17 @@ function ContestPage() {
     setCode(newCode);
   };
 
-  // Helper function to evaluate test results
+  // Helper function to evaluate test results; the server has already
+  // compared each output with the expected one
   const evaluateResults = (results) => {
-    return results.map((result) => {
-      const normalize = (str) =>
-        typeof str === "string" ? str.trim().replace(/\s+/g, " ").toLowerCase() : "";
-      const stdout = normalize(result.stdout);
-      const expectedOutput = normalize(result.expected_output.toString());
-      return stdout === expectedOutput ? "Success" : "Failure";
-    });
+    return results.map((result) => (result.status === "Success" ? "Success" : "Failure"));
   };
 
   const handleCompileAndRun = async () => {
+    const runId = ++latestRunRef.current;
+    setRunning(true);
     try {
-      const response = await axios.post("http://localhost:8000/compile/", {
+      const response = await api.post("/compile/", {
         user_code: code,
         language: language,
         problem_id: selectedProblemId,
@@ -150,20 +150,54 @@ function ContestPage() {
 
       setSubmitSummary(null);
     } catch (error) {
+      if (error.response && error.response.status === 409) {
+        // Superseded by a newer Run or cancelled on purpose
+        return;
+      }
       console.error("Error during compile and run:", error);
+      if (error.response && error.response.status === 429) {
+        alert(`The servers are busy. Please try again in ${error.response.data.retry_after} seconds.`);
+        return;
+      }
       alert("There was an error running your code. Please try again.");
+    } finally {
+      if (runId === latestRunRef.current) {
+        setRunning(false);
+      }
+    }
+  };
+
+  const handleCancelRun = async () => {
+    try {
+      await api.post("/compile/cancel/", {
+        problem_id: selectedProblemId,
+      });
+    } catch (error) {
+      console.error("Error cancelling the run:", error);
     }
   };
 
   const handleSubmit = async () => {
     try {
-      const response = await axios.post("http://localhost:8000/submit/", {
+      const response = await api.post("/submit/", {
         user_code: code,
         language: language,
         problem_id: selectedProblemId,
+        contest_id: contestId,
       });
 
-      const results = response.data.results;
+      // The submission is queued; poll its job until every test case is done
+      let job = response.data;
+      while (job.status === "queued" || job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 500));
+        const statusResponse = await api.get(`/submit/status/${job.job_id}/`);
+        job = statusResponse.data;
+      }
+      if (job.status !== "done") {
+        throw new Error(job.error || "Submission failed");
+      }
+
+      const results = job.results;
       const evaluations = evaluateResults(results);
       setTestEvaluations(evaluations);
 
@@ -190,6 +224,10 @@ function ContestPage() {
       setTestResults(null);
     } catch (error) {
       console.error("Error during submission:", error);
+      if (error.response && error.response.status === 429) {
+        alert(`The servers are busy. Please submit again in ${error.response.data.retry_after} seconds.`);
+        return;
+      }
       alert("There was an error submitting your code. Please try again.");
     }
   };
@@ -208,7 +246,7 @@ function ContestPage() {
         results: results,
       };
   
-      await axios.post("http://localhost:8000/api/finish_test/", payload);
+      await api.post("/api/finish_test/", payload);
   
       // Cleanup and navigation
       if (document.fullscreenElement) {
@@ -251,7 +289,7 @@ function ContestPage() {
             code={code}
             setCode={handleCodeChange}
           />
-          <Buttons onCompile={handleCompileAndRun} onSubmit={handleSubmit} />
+          <Buttons onCompile={handleCompileAndRun} onCancel={handleCancelRun} running={running} onSubmit={handleSubmit} />
           <button
             className={`${
               allProblemsSubmitted 
@@ -0,0 +1,352 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.FileInputStream;
+import java.io.FileOutputStream;
+import java.io.FilterOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.io.StringWriter;
+import java.lang.management.ManagementFactory;
+import java.lang.management.MemoryPoolMXBean;
+import java.lang.management.MemoryType;
+import java.lang.management.ThreadMXBean;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Paths;
+import java.security.Permission;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.Base64;
+import java.util.List;
+import java.util.Locale;
+import java.util.Properties;
+import java.util.TimeZone;
+import javax.tools.JavaCompiler;
+import javax.tools.JavaFileObject;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.ToolProvider;
+
+/**
+ * Warm Java execution service used by the sandbox worker.
+ *
+ * Keeps one JVM and one in-process javac alive. Every submission's Main is
+ * loaded in a throwaway class loader and run on its own thread group with
+ * System.in/out/err redirected to the case's files. Default locales, time
+ * zone, system properties and the security manager are put back after each
+ * run; if that fails the run answers restart=1 and the JVM exits.
+ *
+ * Requests and responses are single tab-separated lines on two pipes the
+ * worker passes as file descriptor numbers (java JavaRunner requests_fd
+ * responses_fd); stdin and stdout are /dev/null, so a submission writing to
+ * FileDescriptor.out directly can't forge a response:
+ *
+ *   PING                                   -> OK
+ *   COMPILE out_dir source [flag ...]      -> OK | FAIL base64(diagnostics)
+ *   RUN class_dir stdin stdout stderr ms max_output_bytes
+ *                                          -> DONE exit timed_out time_ms cpu_ms memory_kb out_of_memory restart
+ *
+ * Any other failure is answered with ERR base64(message).
+ */
+public class JavaRunner {
+
+    /** Thrown instead of letting a submission's System.exit take the JVM down. */
+    static final class ExitTrapped extends SecurityException {
+        final int status;
+
+        ExitTrapped(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    static volatile ThreadGroup submissionGroup;
+
+    static final class ExitGuard extends SecurityManager {
+        @Override
+        public void checkPermission(Permission permission) {
+        }
+
+        @Override
+        public void checkPermission(Permission permission, Object context) {
+        }
+
+        @Override
+        public void checkExit(int status) {
+            ThreadGroup group = submissionGroup;
+            if (group != null && group.parentOf(Thread.currentThread().getThreadGroup())) {
+                throw new ExitTrapped(status);
+            }
+        }
+    }
+
+    /** Drops everything written past a byte limit, so runaway output can't fill the disk. */
+    static final class CappedOutputStream extends FilterOutputStream {
+        private long room;
+
+        CappedOutputStream(OutputStream out, long limit) {
+            super(out);
+            this.room = limit;
+        }
+
+        @Override
+        public void write(int b) throws IOException {
+            if (room > 0) {
+                room--;
+                out.write(b);
+            }
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) throws IOException {
+            int kept = (int) Math.min(len, Math.max(room, 0));
+            if (kept > 0) {
+                room -= kept;
+                out.write(b, off, kept);
+            }
+        }
+    }
+
+    /**
+     * JVM-wide state a submission can change without leaving a thread
+     * behind: default locales and time zone, system properties and the
+     * security manager (clearing it disables ExitGuard).
+     */
+    static final class GlobalState {
+        final Locale locale = Locale.getDefault();
+        final Locale displayLocale = Locale.getDefault(Locale.Category.DISPLAY);
+        final Locale formatLocale = Locale.getDefault(Locale.Category.FORMAT);
+        final TimeZone timeZone = TimeZone.getDefault();
+        final Properties properties = (Properties) System.getProperties().clone();
+        final SecurityManager securityManager = System.getSecurityManager();
+
+        /** Puts the snapshot back; returns false if any of it didn't take. */
+        boolean restore() {
+            try {
+                // First, so a submission's own security manager can't veto
+                // the rest
+                if (System.getSecurityManager() != securityManager) {
+                    System.setSecurityManager(securityManager);
+                }
+                Locale.setDefault(locale);
+                Locale.setDefault(Locale.Category.DISPLAY, displayLocale);
+                Locale.setDefault(Locale.Category.FORMAT, formatLocale);
+                TimeZone.setDefault(timeZone);
+                System.setProperties((Properties) properties.clone());
+                return System.getSecurityManager() == securityManager
+                        && locale.equals(Locale.getDefault())
+                        && displayLocale.equals(Locale.getDefault(Locale.Category.DISPLAY))
+                        && formatLocale.equals(Locale.getDefault(Locale.Category.FORMAT))
+                        && timeZone.equals(TimeZone.getDefault())
+                        && properties.equals(System.getProperties());
+            } catch (Throwable e) {
+                return false;
+            }
+        }
+    }
+
+    static final class Outcome {
+        volatile int exitCode = 0;
+        volatile boolean outOfMemory = false;
+        volatile long cpuNanos = 0;
+    }
+
+    static JavaCompiler compiler;
+    static StandardJavaFileManager fileManager;
+
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream("/proc/self/fd/" + args[1]), true, "UTF-8");
+        BufferedReader requests = new BufferedReader(new InputStreamReader(
+                new FileInputStream("/proc/self/fd/" + args[0]), StandardCharsets.UTF_8));
+
+        compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler != null) {
+            fileManager = compiler.getStandardFileManager(null, null, StandardCharsets.UTF_8);
+        }
+        try {
+            System.setSecurityManager(new ExitGuard());
+        } catch (UnsupportedOperationException e) {
+            // Newer JVMs refuse; System.exit then ends the runner and the
+            // worker starts a fresh one.
+        }
+
+        String line;
+        while ((line = requests.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            String[] parts = line.split("\t", -1);
+            String response;
+            boolean restart = false;
+            try {
+                switch (parts[0]) {
+                    case "PING":
+                        response = "OK";
+                        break;
+                    case "COMPILE":
+                        response = compile(parts[1], parts[2], Arrays.asList(parts).subList(3, parts.length));
+                        break;
+                    case "RUN":
+                        response = run(parts[1], parts[2], parts[3], parts[4], Long.parseLong(parts[5]),
+                                Long.parseLong(parts[6]));
+                        restart = response.endsWith("\t1");
+                        break;
+                    default:
+                        response = "ERR\t" + encode("Unknown command " + parts[0]);
+                }
+            } catch (Throwable e) {
+                response = "ERR\t" + encode(e.toString());
+            }
+            protocol.println(response);
+            if (restart) {
+                // A submission thread refused to die; don't reuse this JVM.
+                System.exit(0);
+            }
+        }
+    }
+
+    static String encode(String text) {
+        return Base64.getEncoder().encodeToString(text.getBytes(StandardCharsets.UTF_8));
+    }
+
+    static String compile(String outDir, String source, List<String> flags) throws Exception {
+        if (compiler == null) {
+            return "ERR\t" + encode("No system Java compiler available");
+        }
+        List<String> options = new ArrayList<>(flags);
+        options.add("-d");
+        options.add(outDir);
+        StringWriter diagnostics = new StringWriter();
+        Iterable<? extends JavaFileObject> units = fileManager.getJavaFileObjects(source);
+        boolean ok = compiler.getTask(diagnostics, fileManager, null, options, null, units).call();
+        return ok ? "OK" : "FAIL\t" + encode(diagnostics.toString());
+    }
+
+    static String run(String classDir, String stdinPath, String stdoutPath, String stderrPath, long timeLimitMs,
+            long maxOutputBytes) throws Exception {
+        InputStream savedIn = System.in;
+        PrintStream savedOut = System.out;
+        PrintStream savedErr = System.err;
+        GlobalState savedState = new GlobalState();
+        ThreadMXBean threads = ManagementFactory.getThreadMXBean();
+        List<MemoryPoolMXBean> heapPools = new ArrayList<>();
+        // Collect first, so the peak starts from the live heap rather than
+        // garbage left by earlier runs and compiles
+        System.gc();
+        for (MemoryPoolMXBean pool : ManagementFactory.getMemoryPoolMXBeans()) {
+            if (pool.getType() == MemoryType.HEAP) {
+                pool.resetPeakUsage();
+                heapPools.add(pool);
+            }
+        }
+
+        ThreadGroup group = new ThreadGroup("submission");
+        Outcome outcome = new Outcome();
+        boolean timedOut;
+        boolean restart = false;
+        long elapsedNanos;
+        URLClassLoader loader = new URLClassLoader(
+                new URL[] {Paths.get(classDir).toUri().toURL()}, ClassLoader.getPlatformClassLoader());
+
+        try (InputStream in = new BufferedInputStream(new FileInputStream(stdinPath));
+             PrintStream out = new PrintStream(new BufferedOutputStream(
+                     new CappedOutputStream(new FileOutputStream(stdoutPath), maxOutputBytes)), false, "UTF-8");
+             PrintStream err = new PrintStream(new BufferedOutputStream(
+                     new CappedOutputStream(new FileOutputStream(stderrPath), maxOutputBytes)), false, "UTF-8")) {
+            System.setIn(in);
+            System.setOut(out);
+            System.setErr(err);
+            submissionGroup = group;
+
+            Thread main = new Thread(group, () -> {
+                try {
+                    Class<?> mainClass = Class.forName("Main", true, loader);
+                    Method entry = mainClass.getMethod("main", String[].class);
+                    entry.invoke(null, (Object) new String[0]);
+                } catch (InvocationTargetException e) {
+                    report(e.getCause(), outcome, err);
+                } catch (Throwable e) {
+                    report(e, outcome, err);
+                } finally {
+                    outcome.cpuNanos = threads.getCurrentThreadCpuTime();
+                }
+            }, "main");
+
+            long started = System.nanoTime();
+            main.start();
+            main.join(timeLimitMs);
+            elapsedNanos = System.nanoTime() - started;
+            timedOut = main.isAlive();
+            // Stop the submission and anything it spawned
+            restart = !stopAll(group);
+            out.flush();
+            err.flush();
+        } finally {
+            submissionGroup = null;
+            // Before anything else, in case the submission left a security
+            // manager of its own that refuses the rest
+            if (!savedState.restore()) {
+                // The next submission would inherit this one's state
+                restart = true;
+            }
+            System.setIn(savedIn);
+            System.setOut(savedOut);
+            System.setErr(savedErr);
+            loader.close();
+        }
+
+        long peakBytes = 0;
+        for (MemoryPoolMXBean pool : heapPools) {
+            peakBytes += pool.getPeakUsage().getUsed();
+        }
+        return String.join("\t",
+                "DONE",
+                Integer.toString(outcome.exitCode),
+                timedOut ? "1" : "0",
+                Long.toString(elapsedNanos / 1_000_000),
+                Long.toString(outcome.cpuNanos / 1_000_000),
+                Long.toString(peakBytes / 1024),
+                outcome.outOfMemory ? "1" : "0",
+                restart ? "1" : "0");
+    }
+
+    static void report(Throwable error, Outcome outcome, PrintStream err) {
+        if (error instanceof ExitTrapped) {
+            outcome.exitCode = ((ExitTrapped) error).status;
+            return;
+        }
+        if (error instanceof OutOfMemoryError) {
+            outcome.outOfMemory = true;
+        }
+        outcome.exitCode = 1;
+        err.print("Exception in thread \"main\" ");
+        error.printStackTrace(err);
+    }
+
+    /** Returns false if some thread of the group survived being stopped. */
+    @SuppressWarnings("deprecation")
+    static boolean stopAll(ThreadGroup group) throws InterruptedException {
+        Thread[] members = new Thread[group.activeCount() + 16];
+        int count = group.enumerate(members, true);
+        for (int i = 0; i < count; i++) {
+            try {
+                members[i].stop();
+            } catch (UnsupportedOperationException e) {
+                return false;
+            }
+        }
+        for (int i = 0; i < count; i++) {
+            members[i].join(100);
+            if (members[i].isAlive()) {
+                return false;
+            }
+        }
+        return true;
+    }
+}
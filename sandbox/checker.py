@@ -0,0 +1,147 @@
+"""
+Incremental output checker.
+
+A program's stdout is fed in chunks as it is produced and compared with the
+expected output on the fly, so a wrong answer is known (and the program can
+be stopped) as soon as the outputs diverge instead of after reading all of
+it.  Three modes:
+
+- ``exact``: byte for byte, apart from trailing whitespace at the very end;
+- ``whitespace``: the same whitespace-separated tokens;
+- ``float``: like ``whitespace``, but numeric tokens only need to agree
+  within a relative/absolute tolerance.
+"""
+
+EXACT = "exact"
+WHITESPACE = "whitespace"
+FLOAT = "float"
+MODES = (EXACT, WHITESPACE, FLOAT)
+
+# Bytes of expected and actual output quoted in a diff excerpt
+EXCERPT_BYTES = 48
+# A numeric token can't be much longer than the one it should match
+FLOAT_TOKEN_SLACK = 64
+
+
+def excerpt(data):
+    text = data[:EXCERPT_BYTES].decode("utf-8", "replace")
+    return text + "..." if len(data) > EXCERPT_BYTES else text
+
+
+def numbers_close(token, expected, tolerance):
+    try:
+        actual_value, expected_value = float(token), float(expected)
+    except ValueError:
+        return False
+    return abs(actual_value - expected_value) <= tolerance * max(1.0, abs(expected_value))
+
+
+class Checker:
+    def __init__(self, expected, mode=WHITESPACE, ignore_case=False, float_tolerance=1e-6):
+        if mode not in MODES:
+            raise ValueError("Unknown checker mode: %s" % mode)
+        self.mode = mode
+        self.ignore_case = ignore_case
+        self.float_tolerance = float_tolerance
+        self.expected = expected.lower() if ignore_case else expected
+        self.diff = None
+        if mode == EXACT:
+            self.position = 0
+            # Whitespace that is only allowed if nothing but whitespace follows
+            self.held = b""
+        else:
+            self.tokens = self.expected.split()
+            self.index = 0
+            # Token cut off at the end of the last chunk
+            self.partial = b""
+
+    @property
+    def diverged(self):
+        return self.diff is not None
+
+    def feed(self, chunk):
+        """
+        Compare the next chunk of output.  Returns False once the output has
+        diverged; anything fed after that is ignored.
+        """
+        if self.diverged:
+            return False
+        if self.ignore_case:
+            chunk = chunk.lower()
+        if self.mode == EXACT:
+            return self._feed_exact(chunk)
+        return self._feed_tokens(chunk)
+
+    def finish(self):
+        """
+        The output is complete; returns True if it matched.
+        """
+        if self.diverged:
+            return False
+        if self.mode == EXACT:
+            remainder = self.expected[self.position:]
+            if remainder.strip():
+                self._differ(self.position, remainder, b"")
+        else:
+            if self.partial:
+                self._match_token(self.partial)
+                self.partial = b""
+            if not self.diverged and self.index < len(self.tokens):
+                self._differ(self.index + 1, self.tokens[self.index], b"")
+        return not self.diverged
+
+    def _differ(self, position, expected, actual):
+        self.diff = {
+            "mode": self.mode,
+            # Byte offset (exact) or 1-based token number where they differ
+            "position": position,
+            "expected": excerpt(expected),
+            "actual": excerpt(actual),
+        }
+
+    def _feed_exact(self, chunk):
+        body = chunk.rstrip()
+        if not body:
+            self.held += chunk
+            return True
+        data = self.held + body
+        self.held = chunk[len(body):]
+        expected = self.expected[self.position:self.position + len(data)]
+        if expected != data:
+            offset = next((i for i, (a, b) in enumerate(zip(expected, data)) if a != b), len(expected))
+            self._differ(self.position + offset, self.expected[self.position + offset:], data[offset:])
+            return False
+        self.position += len(data)
+        return True
+
+    def _feed_tokens(self, chunk):
+        text = self.partial + chunk
+        tokens = text.split()
+        self.partial = tokens.pop() if tokens and not text[-1:].isspace() else b""
+        for token in tokens:
+            if not self._match_token(token):
+                return False
+        if self.partial and not self._could_match(self.partial):
+            self._match_token(self.partial)
+            return False
+        return True
+
+    def _match_token(self, token):
+        if self.index >= len(self.tokens):
+            self._differ(self.index + 1, b"", token)
+            return False
+        expected = self.tokens[self.index]
+        if token != expected and not (self.mode == FLOAT and numbers_close(token, expected, self.float_tolerance)):
+            self._differ(self.index + 1, expected, token)
+            return False
+        self.index += 1
+        return True
+
+    def _could_match(self, partial):
+        # Whether a token still being written can end up matching
+        if self.index >= len(self.tokens):
+            return False
+        expected = self.tokens[self.index]
+        if self.mode == FLOAT:
+            return len(partial) <= len(expected) + FLOAT_TOKEN_SLACK
+        return expected.startswith(partial)
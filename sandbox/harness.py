@@ -0,0 +1,223 @@
+"""
+Multi-test harness for Python submissions.
+
+Started once per submission by the worker (``python3 harness.py code.py``).
+It compiles the source once and then, for every JSON line ``{"input": ...}``
+read from stdin, runs the program as ``__main__`` with its own stdin, stdout
+and stderr, answering with one JSON line of results.
+
+Between test cases the modules the program imported are dropped and the
+interpreter-wide state a program commonly touches is put back: builtins,
+the recursion and int-to-str limits, sys.argv/path and hooks, tracing,
+the switch interval, gc settings, os.environ and the working directory.
+Not isolated: attributes a program sets on modules the harness itself had
+imported (os, sys, json, ...), threads it leaves running, signal handlers
+and state inside C extensions.
+"""
+import builtins
+import errno
+import gc
+import io
+import json
+import os
+import sys
+import time
+import traceback
+
+
+def reset_peak_memory():
+    # Writing 5 to clear_refs resets VmHWM so each case reports its own peak
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def peak_memory_kb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def print_user_traceback(stream):
+    # Drop the harness's own frame so the traceback looks like a plain run
+    error_type, error, tb = sys.exc_info()
+    traceback.print_exception(error_type, error, tb.tb_next, file=stream)
+
+
+class CappedOutput(io.BytesIO):
+    # Keeps at most limit bytes.  The write that goes over fails like a file
+    # over RLIMIT_FSIZE, so a runaway print loop stops instead of running
+    # the harness out of memory; later writes (e.g. the traceback) are
+    # dropped.
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.exceeded = False
+
+    def write(self, data):
+        room = self.limit - self.tell()
+        if room >= len(data):
+            return super().write(data)
+        super().write(bytes(data[:max(room, 0)]))
+        if not self.exceeded:
+            self.exceeded = True
+            raise OSError(errno.EFBIG, "Output limit exceeded")
+        return len(data)
+
+    def close(self):
+        # What the program wrote stays readable even if it closes the stream
+        pass
+
+
+def text_stream(buffer):
+    # Like the real sys.stdin/sys.stdout: text over a binary .buffer
+    return io.TextIOWrapper(buffer, encoding="utf-8", errors="replace", write_through=True)
+
+
+def interpreter_state():
+    state = {
+        "builtins": dict(builtins.__dict__),
+        "recursion_limit": sys.getrecursionlimit(),
+        "switch_interval": sys.getswitchinterval(),
+        "hooks": (sys.displayhook, sys.excepthook),
+        "gc": (gc.isenabled(), gc.get_threshold()),
+        "environ": dict(os.environ),
+        "cwd": os.getcwd(),
+    }
+    if hasattr(sys, "get_int_max_str_digits"):
+        state["int_max_str_digits"] = sys.get_int_max_str_digits()
+    return state
+
+
+def restore_interpreter_state(state):
+    sys.settrace(None)
+    sys.setprofile(None)
+    names = builtins.__dict__
+    for name in set(names) - set(state["builtins"]):
+        del names[name]
+    names.update(state["builtins"])
+    sys.setrecursionlimit(state["recursion_limit"])
+    sys.setswitchinterval(state["switch_interval"])
+    sys.displayhook, sys.excepthook = state["hooks"]
+    enabled, threshold = state["gc"]
+    if enabled:
+        gc.enable()
+    else:
+        gc.disable()
+    gc.set_threshold(*threshold)
+    if dict(os.environ) != state["environ"]:
+        os.environ.clear()
+        os.environ.update(state["environ"])
+    try:
+        os.chdir(state["cwd"])
+    except OSError:
+        pass
+    if "int_max_str_digits" in state:
+        sys.set_int_max_str_digits(state["int_max_str_digits"])
+
+
+def write_error(stream, text):
+    try:
+        stream.write(text.encode("utf-8"))
+    except OSError:
+        pass
+
+
+def run_case(code, path, input_text, output_limit, baseline_modules, baseline_state):
+    stdout, stderr = CappedOutput(output_limit), CappedOutput(output_limit)
+    saved = sys.stdin, sys.stdout, sys.stderr, list(sys.argv), list(sys.path)
+    sys.stdin = text_stream(io.BytesIO(input_text.encode("utf-8")))
+    sys.stdout, sys.stderr = text_stream(stdout), text_stream(stderr)
+    sys.argv = [path]
+    namespace = {"__name__": "__main__", "__file__": path, "__builtins__": builtins}
+
+    returncode = 0
+    out_of_memory = False
+    reset_peak_memory()
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        exec(code, namespace)
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            write_error(stderr, "%s\n" % e.code)
+            returncode = 1
+    except MemoryError:
+        out_of_memory = True
+        returncode = 1
+        print_user_traceback(text_stream(stderr))
+    except BaseException:
+        returncode = 1
+        print_user_traceback(text_stream(stderr))
+    finally:
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        sys.stdin, sys.stdout, sys.stderr, sys.argv, sys.path[:] = saved
+        # Forget everything the program imported, defined or changed
+        for name in list(sys.modules):
+            if name not in baseline_modules:
+                del sys.modules[name]
+        namespace.clear()
+        restore_interpreter_state(baseline_state)
+
+    return {
+        "stdout": stdout.getvalue().decode("utf-8", "replace"),
+        "stderr": stderr.getvalue().decode("utf-8", "replace"),
+        "returncode": returncode,
+        "time_ms": int(elapsed * 1000),
+        "cpu_ms": int(cpu * 1000),
+        "memory_kb": peak_memory_kb(),
+        "out_of_memory": out_of_memory,
+    }
+
+
+def main():
+    path = os.path.abspath(sys.argv[1])
+    compile_error = None
+    try:
+        with open(path) as source_file:
+            code = compile(source_file.read(), path, "exec")
+    except SyntaxError:
+        error_type, error, _ = sys.exc_info()
+        code, compile_error = None, "".join(traceback.format_exception_only(error_type, error))
+
+    # Keep the protocol channel on private descriptors and point fds 0 and 1
+    # at /dev/null so nothing the program does directly can corrupt it.
+    requests = os.fdopen(os.dup(0), "rb")
+    channel = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    sys.path.insert(0, os.path.dirname(path))
+    baseline_modules = set(sys.modules)
+    baseline_state = interpreter_state()
+
+    for line in requests:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if code is None:
+            result = {"stdout": "", "stderr": compile_error, "returncode": 1,
+                      "time_ms": 0, "cpu_ms": 0, "memory_kb": 0, "out_of_memory": False}
+        else:
+            result = run_case(code, path, request["input"], request["output_limit"], baseline_modules,
+                              baseline_state)
+        channel.write(json.dumps(result).encode("utf-8") + b"\n")
+        channel.flush()
+
+
+if __name__ == "__main__":
+    main()
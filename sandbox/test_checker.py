@@ -0,0 +1,105 @@
+import unittest
+
+from checker import EXACT, FLOAT, WHITESPACE, Checker
+
+
+def check(expected, chunks, *args, **kwargs):
+    checker = Checker(expected, *args, **kwargs)
+    for chunk in chunks:
+        checker.feed(chunk)
+    return checker.finish(), checker
+
+
+class ExactTests(unittest.TestCase):
+    def test_matching_output(self):
+        self.assertTrue(check(b"1 2\n3\n", [b"1 2\n3\n"], EXACT)[0])
+
+    def test_trailing_whitespace_at_the_end_is_ignored(self):
+        self.assertTrue(check(b"1 2\n", [b"1 2", b"\n\n  "], EXACT)[0])
+        self.assertTrue(check(b"1 2\n\n", [b"1 2"], EXACT)[0])
+
+    def test_inner_whitespace_must_match(self):
+        passed, checker = check(b"1 2\n", [b"1  2\n"], EXACT)
+        self.assertFalse(passed)
+        self.assertEqual(checker.diff["position"], 2)
+
+    def test_whitespace_split_across_chunks(self):
+        self.assertTrue(check(b"1 2\n3\n", [b"1", b" ", b"2\n", b"3"], EXACT)[0])
+        self.assertFalse(check(b"1 2\n", [b"1", b"  ", b"2"], EXACT)[0])
+
+    def test_missing_output(self):
+        passed, checker = check(b"1 2\n", [b"1"], EXACT)
+        self.assertFalse(passed)
+        self.assertEqual(checker.diff["position"], 1)
+        self.assertEqual(checker.diff["actual"], "")
+
+    def test_extra_output(self):
+        self.assertFalse(check(b"1\n", [b"1\n2\n"], EXACT)[0])
+
+
+class WhitespaceTests(unittest.TestCase):
+    def test_tokens_match_whatever_the_spacing(self):
+        self.assertTrue(check(b"1 2\n3", [b"1\n\n2   3 \n"])[0])
+
+    def test_token_split_across_chunks(self):
+        self.assertTrue(check(b"123 456", [b"12", b"3 4", b"56"], WHITESPACE)[0])
+
+    def test_diff_names_the_first_wrong_token(self):
+        passed, checker = check(b"1 2 3", [b"1 2 4"], WHITESPACE)
+        self.assertFalse(passed)
+        self.assertEqual(checker.diff, {"mode": WHITESPACE, "position": 3, "expected": "3", "actual": "4"})
+
+    def test_divergence_is_known_before_the_output_ends(self):
+        checker = Checker(b"1 2 3", WHITESPACE)
+        self.assertTrue(checker.feed(b"1 "))
+        self.assertFalse(checker.feed(b"9"))
+        self.assertTrue(checker.diverged)
+        # Output after divergence is ignored
+        self.assertFalse(checker.feed(b" 2 3"))
+        self.assertEqual(checker.diff["position"], 2)
+
+    def test_missing_and_extra_tokens(self):
+        self.assertFalse(check(b"1 2", [b"1"])[0])
+        passed, checker = check(b"1", [b"1 2"])
+        self.assertFalse(passed)
+        self.assertEqual(checker.diff["expected"], "")
+
+    def test_ignore_case(self):
+        self.assertTrue(check(b"YES", [b"yes\n"], ignore_case=True)[0])
+        self.assertFalse(check(b"YES", [b"yes\n"])[0])
+
+
+class FloatTests(unittest.TestCase):
+    def test_numbers_within_tolerance(self):
+        self.assertTrue(check(b"0.3333333 1000000", [b"0.33333331 1000000.5"], FLOAT, float_tolerance=1e-6)[0])
+
+    def test_numbers_outside_tolerance(self):
+        passed, checker = check(b"0.5 1.0", [b"0.5 1.1"], FLOAT)
+        self.assertFalse(passed)
+        self.assertEqual(checker.diff["position"], 2)
+
+    def test_number_split_across_chunks(self):
+        self.assertTrue(check(b"3.14159", [b"3.1", b"4159\n"], FLOAT, float_tolerance=1e-4)[0])
+
+    def test_words_must_match_exactly(self):
+        self.assertTrue(check(b"Case 1.0", [b"Case 1"], FLOAT)[0])
+        self.assertFalse(check(b"Case 1.0", [b"case 1"], FLOAT)[0])
+
+    def test_overlong_token_diverges_early(self):
+        checker = Checker(b"1.5", FLOAT)
+        self.assertFalse(checker.feed(b"1" * 100))
+
+
+class ModeTests(unittest.TestCase):
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            Checker(b"1", "regex")
+
+    def test_long_excerpts_are_cut(self):
+        passed, checker = check(b"a" * 100, [b"b" * 100])
+        self.assertFalse(passed)
+        self.assertTrue(checker.diff["actual"].endswith("..."))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,369 @@
+import base64
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import unittest
+
+SANDBOX_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def pack(files):
+    # A base64 tar, as the backend uploads bundles and test data
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+class WorkerTestCase(unittest.TestCase):
+    """
+    Drives a real worker over its protocol, in a private code root laid out
+    like the image's /code: the scripts are copied in, so the harness stays
+    readable to the run uid wherever the checkout lives.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="sandbox-test-")
+        os.chmod(self.root, 0o711)
+        self.addCleanup(shutil.rmtree, self.root, True)
+        shutil.copytree(SANDBOX_DIR, os.path.join(self.root, "sandbox"),
+                        ignore=shutil.ignore_patterns("test_*", "__pycache__"))
+        self.worker = self.start_worker()
+
+    def start_worker(self):
+        worker = subprocess.Popen(
+            [sys.executable, os.path.join(self.root, "sandbox", "worker.py")],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=dict(os.environ, SANDBOX_CODE_ROOT=self.root),
+        )
+        self.addCleanup(self.stop_worker, worker)
+        return worker
+
+    def stop_worker(self, worker):
+        if worker.poll() is None:
+            worker.kill()
+            worker.wait()
+        worker.stdin.close()
+        worker.stdout.close()
+
+    def request(self, **payload):
+        self.worker.stdin.write(json.dumps(payload).encode("utf-8") + b"\n")
+        self.worker.stdin.flush()
+        return json.loads(self.worker.stdout.readline())
+
+    def compile(self, source, language="python"):
+        response = self.request(op="compile", language=language, source=source)
+        self.assertIn("artifact", response, response)
+        return response["artifact"]
+
+    def run_program(self, source, language="python", **fields):
+        fields.setdefault("input", "")
+        return self.request(op="run", language=language, artifact=self.compile(source, language), **fields)
+
+
+class ProtocolTests(WorkerTestCase):
+    def test_ping(self):
+        self.assertEqual(self.request(op="ping"), {"ok": True, "pid": self.worker.pid})
+
+    def test_errors_are_answered_and_the_worker_carries_on(self):
+        self.assertEqual(self.request(op="nope"), {"error": "Unknown op: nope"})
+        self.assertEqual(self.request(op="run", language="python", artifact="missing", input=""),
+                         {"error": "Unknown artifact"})
+        self.assertEqual(self.request(op="run", language="python", artifact="../escape", input=""),
+                         {"error": "Invalid artifact id"})
+        self.assertTrue(self.request(op="ping")["ok"])
+
+    def test_runs_leave_no_workspace_behind(self):
+        self.assertEqual(self.run_program("print(1)")["stdout"], "1\n")
+        self.assertEqual(os.listdir(os.path.join(self.root, "runs")), [])
+
+
+class BundleTests(WorkerTestCase):
+    def test_submissions_compile_and_run_from_their_bundle(self):
+        self.request(op="upload", bundle="submission",
+                     data=pack({"code.py": b"print(int(input()) * 3)", "inputs/0": b"2", "inputs/1": b"5"}))
+        artifact = self.request(op="compile", language="python", bundle="submission")["artifact"]
+        outputs = [self.request(op="run", language="python", artifact=artifact, bundle="submission", case=case,
+                                expected=expected)
+                   for case, expected in ((0, "6"), (1, "15"))]
+        self.assertEqual([result["verdict"] for result in outputs], ["OK", "OK"])
+        self.request(op="discard", bundle="submission", artifact=artifact)
+        self.assertEqual(os.listdir(os.path.join(self.root, "bundles")), [])
+
+    def test_members_outside_the_bundle_are_refused(self):
+        for name in ("../escape", "/etc/escape"):
+            response = self.request(op="upload", bundle="submission", data=pack({name: b"x"}))
+            self.assertIn("Invalid bundle member", response["error"])
+        self.assertFalse(os.path.exists(os.path.join(self.root, "escape")))
+        self.assertEqual(self.request(op="upload", bundle=".hidden", data=pack({})), {"error": "Invalid bundle id"})
+
+
+class StagingTests(WorkerTestCase):
+    def test_runs_read_staged_inputs(self):
+        self.assertEqual(self.request(op="upload", bundle="submission", data=pack({}), testdata="problem"),
+                         {"bundle": "submission", "testdata_staged": False})
+        self.request(op="stage", testdata="problem", data=pack({"inputs/0": b"4"}))
+        # Staging again is a no-op, whatever is sent
+        self.request(op="stage", testdata="problem", data=pack({"inputs/0": b"5"}))
+        self.assertTrue(self.request(op="upload", bundle="other", data=pack({}), testdata="problem")["testdata_staged"])
+        result = self.run_program("print(input())", testdata="problem", case=0, expected="4")
+        self.assertEqual(result["verdict"], "OK", result)
+
+    def test_staged_test_data_holds_only_inputs(self):
+        response = self.request(op="stage", testdata="problem", data=pack({"outputs/0": b"expected"}))
+        self.assertIn("Unexpected bundle member", response["error"])
+
+
+@unittest.skipUnless(os.geteuid() == 0, "programs only get a uid of their own when the worker runs as root")
+class IsolationTests(WorkerTestCase):
+    def test_programs_do_not_run_as_the_worker(self):
+        result = self.run_program("import os\nprint(os.getuid())")
+        self.assertEqual(result["verdict"], "OK", result)
+        self.assertNotEqual(result["stdout"].strip(), "0")
+
+    def test_shared_trees_are_private_to_the_worker(self):
+        self.request(op="ping")
+        for name in ("artifacts", "bundles", "testdata", "ccache"):
+            self.assertEqual(os.stat(os.path.join(self.root, name)).st_mode & 0o777, 0o700)
+
+    def test_hidden_inputs_reach_only_their_own_stdin(self):
+        self.request(op="stage", testdata="problem", data=pack({"inputs/0": b"SECRET_HIDDEN_INPUT_42\n"}))
+        self.request(op="upload", bundle="submission", data=pack({"inputs/0": b"SECRET_BUNDLE_INPUT_7\n"}))
+        spy = "\n".join([
+            "import os, sys",
+            "print(sys.stdin.read().strip())",
+            "for path in %r:" % [
+                os.path.join(self.root, "testdata", "problem", "inputs", "0"),
+                os.path.join(self.root, "bundles", "submission", "inputs", "0"),
+            ],
+            "    try:",
+            "        print(open(path).read().strip())",
+            "    except OSError as e:",
+            "        print(type(e).__name__)",
+        ])
+        result = self.run_program(spy, testdata="problem", case=0)
+        self.assertEqual(result["stdout"].split(), ["SECRET_HIDDEN_INPUT_42", "PermissionError", "PermissionError"])
+
+
+class ArtifactTests(WorkerTestCase):
+    def test_compiled_artifacts_keep_no_source(self):
+        artifact = self.compile("int main(void) { return 0; }\n", "c")
+        self.assertEqual(os.listdir(os.path.join(self.root, "artifacts", artifact)), ["code"])
+
+    @unittest.skipUnless(os.geteuid() == 0, "programs only get a uid of their own when the worker runs as root")
+    def test_programs_cannot_find_other_submissions(self):
+        self.compile("print('someone else')")
+        pattern = os.path.join(self.root, "artifacts", "*", "code.py")
+        result = self.run_program("import glob\nprint(glob.glob(%r))" % pattern)
+        self.assertEqual(result["stdout"].strip(), "[]")
+
+
+
+def gone(pid, timeout=5):
+    # Killed and reaped, or at least a zombie
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open("/proc/%d/stat" % pid) as stat:
+                if stat.read().rsplit(")", 1)[1].split()[0] == "Z":
+                    return True
+        except OSError:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class CancelTests(WorkerTestCase):
+    # The backend cancels a request by terminating its worker
+    def assert_cancel_kills_program(self, **fields):
+        scratch = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, scratch, True)
+        os.chmod(scratch, 0o777)
+        pid_file = os.path.join(scratch, "pid")
+        artifact = self.compile("import os\nopen(%r, 'w').write(str(os.getpid()))\nwhile True:\n    pass\n" % pid_file)
+        self.worker.stdin.write(json.dumps(dict(
+            fields, op="run", language="python", artifact=artifact, input="", time_limit=60,
+        )).encode("utf-8") + b"\n")
+        self.worker.stdin.flush()
+        deadline = time.monotonic() + 10
+        while not os.path.exists(pid_file) or not os.path.getsize(pid_file):
+            self.assertLess(time.monotonic(), deadline, "the program never started")
+            time.sleep(0.05)
+        with open(pid_file) as pid_text:
+            pid = int(pid_text.read())
+
+        self.worker.terminate()
+        self.worker.wait()
+        self.assertTrue(gone(pid), "the program outlived its cancelled worker")
+
+    def test_cancel_kills_a_cold_run(self):
+        self.assert_cancel_kills_program()
+
+    def test_cancel_kills_a_zygote_child(self):
+        self.assert_cancel_kills_program(zygote=True)
+
+
+
+class CompileTests(WorkerTestCase):
+    def test_compile_time_limit_covers_preprocessing_and_compiling(self):
+        # Each doubling macro makes preprocessing take twice as long
+        macros = ["#define A0 x"] + ["#define A%d A%d A%d" % (i, i - 1, i - 1) for i in range(1, 25)]
+        source = "\n".join(macros + ["int main(void) { return 0; }", "A24", ""])
+        started = time.monotonic()
+        response = self.request(op="compile", language="c", source=source, compile_time_limit=1)
+        self.assertIn("Compilation timed out.", response["compile_error"])
+        self.assertLess(time.monotonic() - started, 1.8)
+
+
+class HarnessTests(WorkerTestCase):
+    def run_batch(self, source, inputs, **fields):
+        response = self.request(op="run_batch", language="python", artifact=self.compile(source), inputs=inputs,
+                                **fields)
+        self.assertIn("results", response, response)
+        return response["results"]
+
+    def test_each_case_gets_its_verdict(self):
+        results = self.run_batch("print(int(input()) * 2)", ["1", "2", "x"], expected=["2", "5", ""])
+        self.assertEqual([result["verdict"] for result in results], ["OK", "WA", "RE"])
+        self.assertIn("ValueError", results[2]["stderr"])
+
+    def test_cases_do_not_see_each_other(self):
+        source = "\n".join([
+            "import builtins, os, sys",
+            "print(getattr(builtins, 'leaked', 'clean'), sys.getrecursionlimit(), os.environ.get('LEAKED', 'clean'))",
+            "builtins.leaked = 'dirty'",
+            "sys.setrecursionlimit(500)",
+            "os.environ['LEAKED'] = 'dirty'",
+        ])
+        results = self.run_batch(source, ["", ""])
+        self.assertEqual(results[0]["stdout"], results[1]["stdout"])
+        self.assertTrue(results[1]["stdout"].startswith("clean "))
+        self.assertTrue(results[1]["stdout"].strip().endswith(" clean"))
+
+    def test_a_timed_out_case_restarts_the_harness_for_the_rest(self):
+        source = "case = input()\nwhile case == 'loop':\n    pass\nprint(case)"
+        results = self.run_batch(source, ["loop", "1"], expected=["", "1"], time_limit=0.5)
+        self.assertEqual([result["verdict"] for result in results], ["TLE", "OK"])
+
+    def test_stop_on_first_failure_ends_the_batch(self):
+        results = self.run_batch("print(input())", ["1", "2", "3"], expected=["1", "9", "3"],
+                                 stop_on_first_failure=True)
+        self.assertEqual([result["verdict"] for result in results], ["OK", "WA"])
+
+    def test_syntax_errors_fail_every_case(self):
+        results = self.run_batch("print(", ["1", "2"])
+        self.assertEqual([result["verdict"] for result in results], ["RE", "RE"])
+        self.assertIn("SyntaxError", results[0]["stderr"])
+
+
+class ZygoteTests(WorkerTestCase):
+    def run_forked(self, source, **fields):
+        return self.run_program(source, zygote=True, **fields)
+
+    def worker_children(self):
+        pid = self.worker.pid
+        with open("/proc/%d/task/%d/children" % (pid, pid)) as children:
+            commands = []
+            for child in children.read().split():
+                with open("/proc/%s/cmdline" % child, "rb") as cmdline:
+                    commands.append(cmdline.read().split(b"\0"))
+            return commands
+
+    def test_programs_read_stdin_and_write_stdout(self):
+        result = self.run_forked("print(int(input()) + 1)", input="41\n", expected="42")
+        self.assertEqual(result["verdict"], "OK", result)
+        self.assertEqual(result["stdout"], "42\n")
+        # Forked, not a cold interpreter the worker fell back to
+        self.assertTrue(any(arg.endswith(b"zygote.py") for command in self.worker_children() for arg in command))
+
+    def test_exit_status_and_traceback(self):
+        result = self.run_forked("import sys\nsys.exit(3)")
+        self.assertEqual((result["verdict"], result["returncode"]), ("RE", 3))
+        result = self.run_forked("raise ValueError('boom')")
+        self.assertEqual(result["verdict"], "RE")
+        self.assertIn("ValueError: boom", result["stderr"])
+        self.assertNotIn("zygote.py", result["stderr"])
+
+    def test_limits_and_the_zygote_survives_them(self):
+        result = self.run_forked("while True:\n    pass", time_limit=0.5)
+        self.assertEqual(result["verdict"], "TLE")
+        result = self.run_forked("data = bytearray(1 << 30)", memory_limit_mb=64)
+        self.assertEqual(result["verdict"], "MLE")
+        result = self.run_forked("print('still here')")
+        self.assertEqual(result["stdout"], "still here\n")
+
+    def test_programs_do_not_share_state(self):
+        source = "import math\nprint(getattr(math, 'leaked', 'clean'))\nmath.leaked = 'dirty'"
+        self.assertEqual(self.run_forked(source)["stdout"], "clean\n")
+        self.assertEqual(self.run_forked(source)["stdout"], "clean\n")
+
+
+@unittest.skipUnless(shutil.which("javac"), "needs a JDK")
+class WarmJVMTests(WorkerTestCase):
+    def run_warm(self, source, **fields):
+        response = self.request(op="compile", language="java", source=source, warm_jvm=True)
+        self.assertIn("artifact", response, response)
+        fields.setdefault("input", "")
+        return self.request(op="run", language="java", artifact=response["artifact"], warm_jvm=True, **fields)
+
+    def test_programs_run_in_the_warm_jvm(self):
+        source = ("public class Main { public static void main(String[] args) {"
+                  " System.out.println(new java.util.Scanner(System.in).nextInt() * 2); } }")
+        result = self.run_warm(source, input="21\n", expected="42")
+        self.assertEqual(result["verdict"], "OK", result)
+
+    def test_system_exit_ends_only_the_program(self):
+        result = self.run_warm("public class Main { public static void main(String[] args) { System.exit(3); } }")
+        self.assertEqual((result["verdict"], result["returncode"]), ("RE", 3))
+        result = self.run_warm("public class Main { public static void main(String[] args) {"
+                               " System.out.println(\"ok\"); } }")
+        self.assertEqual(result["stdout"], "ok\n")
+
+    def test_jvm_wide_state_is_restored(self):
+        source = ("public class Main { public static void main(String[] args) {"
+                  " System.out.println(java.util.Locale.getDefault() + \" \" + java.util.TimeZone.getDefault().getID()"
+                  " + \" \" + System.getProperty(\"leaked\", \"clean\"));"
+                  " java.util.Locale.setDefault(java.util.Locale.CHINA);"
+                  " java.util.TimeZone.setDefault(java.util.TimeZone.getTimeZone(\"Asia/Tokyo\"));"
+                  " System.setProperty(\"leaked\", \"dirty\");"
+                  " System.setSecurityManager(null); } }")
+        first = self.run_warm(source)
+        second = self.run_warm(source)
+        self.assertEqual(first["verdict"], "OK", first)
+        self.assertEqual(second["stdout"], first["stdout"])
+        self.assertTrue(first["stdout"].strip().endswith(" clean"))
+
+
+class VerdictTests(WorkerTestCase):
+    def test_endless_wrong_output_is_a_wrong_answer_in_harness_mode_too(self):
+        artifact = self.compile("while True:\n    print(9)\n")
+        run = self.request(op="run", language="python", artifact=artifact, input="", expected="8",
+                           output_limit_kb=64)
+        batch = self.request(op="run_batch", language="python", artifact=artifact, inputs=[""],
+                             expected=["8"], output_limit_kb=64)
+        self.assertEqual(run["verdict"], "WA")
+        self.assertEqual(batch["results"][0]["verdict"], "WA")
+        self.assertEqual(batch["results"][0]["diff"], run["diff"])
+
+    def test_endless_output_to_stderr_is_over_the_limit_in_both_modes(self):
+        artifact = self.compile("import sys\nwhile True:\n    sys.stderr.write('9' * 1024)\n")
+        run = self.request(op="run", language="python", artifact=artifact, input="", expected="8",
+                           output_limit_kb=64)
+        batch = self.request(op="run_batch", language="python", artifact=artifact, inputs=[""],
+                             expected=["8"], output_limit_kb=64)
+        self.assertEqual(run["verdict"], "OLE")
+        self.assertEqual(batch["results"][0]["verdict"], "OLE")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,1247 @@
+"""
+Long-lived sandbox worker.
+
+The backend starts this script once per pool slot (``docker exec -i`` into the
+sandbox container) and then talks to it over stdin/stdout, one JSON object per
+line.  Keeping the process alive avoids paying a ``docker cp``/``docker exec``
+round-trip for every test case.
+"""
+import base64
+import fcntl
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import resource
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+from checker import Checker, WHITESPACE
+
+CODE_ROOT = os.environ.get("SANDBOX_CODE_ROOT", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RUNS_ROOT = os.path.join(CODE_ROOT, "runs")
+HARNESS_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "harness.py")
+ZYGOTE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zygote.py")
+JAVA_RUNNER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "JavaRunner.java")
+# Compiled JavaRunner.class; the image builds it, otherwise it is built here
+# on first use
+JAVA_RUNNER_CLASSES = os.path.join(CODE_ROOT, "jvm")
+# Precompiled headers built into the image (see dockerfile); put first on the
+# include path of C/C++ compiles when present
+PCH_ROOT = os.path.join(CODE_ROOT, "pch")
+# ccache-style cache of C/C++ binaries keyed by the preprocessed source,
+# shared by every worker in the container
+COMPILER_CACHE_ROOT = os.path.join(CODE_ROOT, "ccache")
+COMPILER_CACHE_MAX_ENTRIES = 2000
+ARTIFACTS_ROOT = os.path.join(CODE_ROOT, "artifacts")
+# Artifacts are shared by every backend process, so the size cap is kept
+# here; one run within this many seconds keeps an artifact from eviction
+ARTIFACT_MIN_IDLE = 600
+# Uploaded submission bundles (source plus every test-case input), shared by
+# all workers in the container.  Like the artifacts, test data and compiler
+# cache, only the worker can open them (see prepare_roots)
+BUNDLES_ROOT = os.path.join(CODE_ROOT, "bundles")
+# Bundles older than this are left over from a crashed backend
+BUNDLE_MAX_AGE = 3600
+# Problem test data, staged once per problem version and shared by every
+# submission to it.  Only the inputs; the expected outputs come with each run
+# request and stay in memory
+TESTDATA_ROOT = os.path.join(CODE_ROOT, "testdata")
+# Test data no submission has used for this long belongs to a past contest
+TESTDATA_MAX_AGE = 7 * 24 * 3600
+# A worker started as root runs programs and compilers under a uid of its
+# own from this range, claimed with a lock file under UIDS_ROOT
+UIDS_ROOT = os.path.join(CODE_ROOT, "uids")
+RUN_UID_BASE = 20000
+RUN_UID_COUNT = 1000
+
+# Per-language toolchain.  "{artifact}" is the box holding the source and
+# everything the compiler produced (for a run, the files the artifact kept,
+# loaded into its own box); "{source}" is the source file in it.
+LANGUAGES = {
+    "python": {
+        "ext": "py",
+        "compile": None,
+        "run": ["python3", "{source}"],
+        # One interpreter for every test case of a submission (run_batch)
+        "harness": ["python3", HARNESS_SCRIPT, "{source}"],
+        # Runs can be forked from a warm zygote instead of a cold python3
+        "zygote": True,
+        # What the artifact keeps of the build; the source is the program
+        "artifact": ["code.py"],
+    },
+    "c": {
+        "ext": "c",
+        "compile": ["gcc", "{source}", "-o", "{artifact}/code"],
+        "run": ["{artifact}/code"],
+        "pch": True,
+        # Preprocess only; its output keys the compiler cache
+        "preprocess": ["gcc", "-E", "-P", "{source}"],
+        "outputs": ["code"],
+        "artifact": ["code"],
+    },
+    "cpp": {
+        "ext": "cpp",
+        "compile": ["g++", "{source}", "-o", "{artifact}/code"],
+        "run": ["{artifact}/code"],
+        "pch": True,
+        "preprocess": ["g++", "-E", "-P", "{source}"],
+        "outputs": ["code"],
+        "artifact": ["code"],
+    },
+    "java": {
+        "ext": "java",
+        "compile": ["javac", "-d", "{artifact}", "{source}"],
+        # The JVM reserves far more address space than it uses, so its heap is
+        # capped with -Xmx instead of RLIMIT_AS.
+        "run": ["java", "-Xmx{memory_mb}m", "-cp", "{artifact}", "Main"],
+        "limit_address_space": False,
+        # Can be compiled and run inside the warm JVM (JavaRunner)
+        "warm_jvm": True,
+        "artifact": ["*.class"],
+    },
+}
+
+# Defaults used when a request carries no limits of its own
+DEFAULT_TIME_LIMIT = 2.0
+DEFAULT_MEMORY_LIMIT_MB = 256
+COMPILE_TIME_LIMIT = 10.0
+# Output (stdout and stderr together) a run may produce before it is stopped
+# as OLE, and how much of each stream is sent back
+DEFAULT_OUTPUT_LIMIT_KB = 16 * 1024
+DEFAULT_OUTPUT_EXCERPT_KB = 64
+# Bytes read from a program's output at a time
+CHUNK_BYTES = 65536
+
+# Heap of the warm JVM.  It has to fit javac as well as the per-run memory
+# limit; runs above their own limit are reported as MLE, and runs with a
+# larger limit than this go to a cold JVM.
+WARM_JVM_HEAP_MB = 512
+
+OUT_OF_MEMORY_MARKERS = (b"MemoryError", b"std::bad_alloc", b"java.lang.OutOfMemoryError")
+
+# Process groups of the programs running right now, taken down with the
+# worker when the backend cancels the request (SIGTERM)
+RUNNING_GROUPS = set()
+
+# This worker's uid for programs (claim_run_uid); None when it isn't root
+RUN_UID = None
+
+
+def drop_privileges(uid):
+    os.setgroups([])
+    os.setgid(uid)
+    os.setuid(uid)
+
+
+def drop_to_run_uid():
+    # preexec_fn of everything that runs submitted code or compiles it
+    if RUN_UID is not None:
+        drop_privileges(RUN_UID)
+
+
+def give_to_run_uid(path):
+    if RUN_UID is not None:
+        os.chown(path, RUN_UID, RUN_UID)
+
+
+def kill_uid(uid):
+    # kill(-1) from a child holding the uid reaches every process it owns
+    pid = os.fork()
+    if pid == 0:
+        try:
+            drop_privileges(uid)
+            os.kill(-1, signal.SIGKILL)
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def claim_run_uid():
+    """
+    Claim an unprivileged uid for this worker's programs, held by an flock
+    for the worker's lifetime so no two workers share one.  Anything a
+    crashed previous holder left running is killed first.  None unless the
+    worker runs as root; programs then run as the worker itself.
+    """
+    if os.geteuid() != 0:
+        return None
+    for uid in range(RUN_UID_BASE, RUN_UID_BASE + RUN_UID_COUNT):
+        claim = os.open(os.path.join(UIDS_ROOT, str(uid)), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(claim, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(claim)
+            continue
+        kill_uid(uid)
+        return uid
+    raise RuntimeError("No free sandbox uid")
+
+
+def prepare_roots():
+    """
+    Only the worker may open the shared trees: they hold every problem's
+    hidden inputs and every submission's code.  Programs reach their own
+    workspace through runs/, which they can't list.
+    """
+    for root in (ARTIFACTS_ROOT, BUNDLES_ROOT, TESTDATA_ROOT, COMPILER_CACHE_ROOT, UIDS_ROOT):
+        os.makedirs(root, 0o700, exist_ok=True)
+        os.chmod(root, 0o700)
+    os.makedirs(RUNS_ROOT, 0o711, exist_ok=True)
+    os.chmod(RUNS_ROOT, 0o711)
+
+
+@contextmanager
+def workspace():
+    """
+    Fresh, uniquely named directory for a single run, removed afterwards.
+    The program gets box/ inside it, owned by its uid; everything beside
+    that (e.g. its redirected streams) belongs to the worker.  The owning
+    pid is part of the name so leftovers of a crashed worker can be
+    recognised and swept.
+    """
+    path = tempfile.mkdtemp(prefix="run-%d-" % os.getpid(), dir=RUNS_ROOT)
+    try:
+        os.chmod(path, 0o711)
+        box = os.path.join(path, "box")
+        os.mkdir(box, 0o700)
+        give_to_run_uid(box)
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def load_artifact(artifact, box):
+    # Programs can't open the artifacts tree, so each run gets its
+    # artifact's files linked (or copied) into its box, read-only to it
+    for directory, _, files in os.walk(artifact):
+        target = os.path.join(box, os.path.relpath(directory, artifact))
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            try:
+                os.link(os.path.join(directory, name), os.path.join(target, name))
+            except OSError:
+                shutil.copy2(os.path.join(directory, name), os.path.join(target, name))
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def sweep_stale_workspaces():
+    if os.path.isdir(RUNS_ROOT):
+        for name in os.listdir(RUNS_ROOT):
+            parts = name.split("-")
+            if len(parts) >= 3 and parts[0] == "run" and parts[1].isdigit() and not pid_alive(int(parts[1])):
+                shutil.rmtree(os.path.join(RUNS_ROOT, name), ignore_errors=True)
+    for root, max_age in ((BUNDLES_ROOT, BUNDLE_MAX_AGE), (TESTDATA_ROOT, TESTDATA_MAX_AGE)):
+        if not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            try:
+                if time.time() - os.stat(path).st_mtime > max_age:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+
+def handle_ping(request):
+    return {"ok": True, "pid": os.getpid()}
+
+
+def format_command(template, artifact, source, **extra):
+    return [part.format(artifact=artifact, source=source, **extra) for part in template]
+
+
+def limit_resources(cpu_seconds, memory_bytes):
+    # Runs in the child between fork and exec
+    def apply():
+        cpu = int(cpu_seconds) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        if memory_bytes:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        drop_to_run_uid()
+    return apply
+
+
+def kill_tree(pid):
+    # The child leads its own session, so its whole process tree shares the
+    # process group id.  One that hasn't got that far is killed on its own.
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    except PermissionError:
+        pass
+
+
+class OutputCapture:
+    """
+    Bounded capture of one run's stdout and stderr.  Only the first
+    excerpt_bytes of each stream are kept, and past limit_bytes in total the
+    run is over its output limit.  With a checker, stdout is compared with
+    the expected output as it arrives.
+    """
+
+    def __init__(self, limit_bytes=None, excerpt_bytes=None, checker=None):
+        self.limit_bytes = limit_bytes
+        self.excerpt_bytes = excerpt_bytes
+        self.checker = checker
+        self.lock = threading.Lock()
+        self.total = 0
+        self.kept = {"stdout": bytearray(), "stderr": bytearray()}
+        self.truncated = False
+        self.exceeded = False
+
+    def add(self, name, chunk):
+        """
+        Take the next chunk of a stream.  Returns False once reading on is
+        pointless: the output is over the limit or already wrong.
+        """
+        with self.lock:
+            self.total += len(chunk)
+            kept = self.kept[name]
+            room = len(chunk) if self.excerpt_bytes is None else max(self.excerpt_bytes - len(kept), 0)
+            kept += chunk[:room]
+            if room < len(chunk):
+                self.truncated = True
+            if self.limit_bytes is not None and self.total > self.limit_bytes:
+                self.exceeded = True
+            if name == "stdout" and self.checker is not None:
+                self.checker.feed(chunk)
+            return not self.stopped()
+
+    def stopped(self):
+        return self.exceeded or (self.checker is not None and self.checker.diverged)
+
+    def read_file(self, name, path):
+        # For runs whose output went to a file rather than a pipe
+        try:
+            with open(path, "rb") as output_file:
+                while not self.stopped():
+                    chunk = output_file.read(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    self.add(name, chunk)
+        except OSError:
+            pass
+
+    def apply(self, result):
+        """
+        Put the kept output into a run result and settle its verdict: over
+        the output limit first, then a wrong answer, then however the
+        program ended.  A program stopped because its output had already
+        diverged is a wrong answer whatever it would have done next.
+        """
+        result["stdout"] = bytes(self.kept["stdout"])
+        result["stderr"] = bytes(self.kept["stderr"])
+        result["output_truncated"] = self.truncated
+        if self.exceeded:
+            result["verdict"] = "OLE"
+        elif self.checker is not None:
+            if self.checker.diverged or (result["verdict"] == "OK" and not self.checker.finish()):
+                result["verdict"] = "WA"
+            if self.checker.diff:
+                result["diff"] = self.checker.diff
+        return result
+
+
+def run_limited(command, cwd, input_bytes, time_limit, memory_limit_mb=None, capture=None):
+    """
+    Run a command under a wall-clock limit, a CPU limit and (optionally) an
+    address-space limit.  Whatever happens, every process it started is
+    killed before this returns.  Output is read into capture as it is
+    produced, and the program is stopped as soon as capture has seen enough
+    (without one, all output is kept).
+    """
+    capture = capture or OutputCapture()
+    memory_bytes = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+    started = time.monotonic()
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+        preexec_fn=limit_resources(time_limit, memory_bytes),
+    )
+    RUNNING_GROUPS.add(process.pid)
+
+    def read(name, stream):
+        while True:
+            chunk = os.read(stream.fileno(), CHUNK_BYTES)
+            if not chunk:
+                break
+            if not capture.add(name, chunk):
+                kill_tree(process.pid)
+                break
+        stream.close()
+
+    def feed():
+        try:
+            process.stdin.write(input_bytes)
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+    threads = [
+        threading.Thread(target=read, args=("stdout", process.stdout)),
+        threading.Thread(target=read, args=("stderr", process.stderr)),
+        threading.Thread(target=feed),
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    timed_out = threading.Event()
+
+    def expire():
+        timed_out.set()
+        kill_tree(process.pid)
+
+    watchdog = threading.Timer(time_limit, expire)
+    watchdog.start()
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    finally:
+        watchdog.cancel()
+        # Take down anything the program left running in the background
+        kill_tree(process.pid)
+        RUNNING_GROUPS.discard(process.pid)
+    elapsed = time.monotonic() - started
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    for thread in threads:
+        thread.join()
+
+    cpu_seconds = usage.ru_utime + usage.ru_stime
+    return capture.apply({
+        "returncode": process.returncode,
+        "time_ms": int(elapsed * 1000),
+        "cpu_ms": int(cpu_seconds * 1000),
+        "memory_kb": usage.ru_maxrss,
+        "verdict": classify(timed_out.is_set(), process.returncode, cpu_seconds, usage.ru_maxrss, time_limit, memory_limit_mb),
+    })
+
+
+def classify(timed_out, returncode, cpu_seconds, memory_kb, time_limit, memory_limit_mb):
+    if timed_out or returncode == -signal.SIGXCPU or cpu_seconds > time_limit:
+        return "TLE"
+    if memory_limit_mb and memory_kb > memory_limit_mb * 1024:
+        return "MLE"
+    if returncode != 0:
+        return "RE"
+    return "OK"
+
+
+class Zygote:
+    """
+    Handle on this worker's preforked Python zygote (zygote.py), started on
+    first use and restarted if it dies.
+    """
+
+    def __init__(self):
+        self.process = None
+
+    def ensure_started(self):
+        if self.process is None or self.process.poll() is not None:
+            self.process = subprocess.Popen(
+                ["python3", ZYGOTE_SCRIPT],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+
+    def run(self, source, workspace_path, input_bytes, time_limit, memory_limit_mb, capture):
+        """
+        Run a Python program in a child forked from the zygote.  Returns None
+        if the zygote itself failed, so the caller can fall back to a cold
+        interpreter.
+        """
+        self.ensure_started()
+        # The program runs in box/; its redirected streams live beside it,
+        # opened by the zygote's child before it takes the run uid
+        paths = {name: os.path.join(workspace_path, name) for name in ("stdin", "stdout", "stderr")}
+        with open(os.open(paths["stdin"], os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as stdin_file:
+            stdin_file.write(input_bytes)
+
+        request = {
+            "source": source,
+            "cwd": os.path.join(workspace_path, "box"),
+            "uid": RUN_UID,
+            "stdin_path": paths["stdin"],
+            "stdout_path": paths["stdout"],
+            "stderr_path": paths["stderr"],
+            "time_limit": time_limit,
+            "memory_limit_mb": memory_limit_mb,
+            # Files may grow one byte past the output limit, so going over
+            # it shows
+            "output_limit_bytes": capture.limit_bytes + 1,
+        }
+        try:
+            self.process.stdin.write(json.dumps(request).encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+            # The zygote names the child it forked before waiting for it
+            child = json.loads(self.process.stdout.readline())["pid"]
+            RUNNING_GROUPS.add(child)
+            try:
+                line = self.process.stdout.readline()
+            finally:
+                RUNNING_GROUPS.discard(child)
+            response = json.loads(line)
+        except (OSError, ValueError, KeyError, TypeError):
+            self.process.kill()
+            return None
+
+        for name in ("stdout", "stderr"):
+            capture.read_file(name, paths[name])
+
+        cpu_seconds = response["cpu_ms"] / 1000
+        return capture.apply({
+            "returncode": response["returncode"],
+            "time_ms": response["time_ms"],
+            "cpu_ms": response["cpu_ms"],
+            "memory_kb": response["memory_kb"],
+            "verdict": classify(response["timed_out"], response["returncode"], cpu_seconds,
+                                response["memory_kb"], time_limit, memory_limit_mb),
+        })
+
+
+ZYGOTE = Zygote()
+
+
+class WarmJVM:
+    """
+    Handle on this worker's warm JVM (JavaRunner.java): javac runs in
+    process and every Main is loaded in a throwaway class loader.  Started
+    on first use and restarted if it dies.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.requests = None
+        self.responses = None
+
+    def ensure_started(self):
+        if self.process is not None and self.process.poll() is None:
+            return True
+        if not os.path.exists(os.path.join(JAVA_RUNNER_CLASSES, "JavaRunner.class")):
+            os.makedirs(JAVA_RUNNER_CLASSES, exist_ok=True)
+            try:
+                built = subprocess.run(["javac", "-d", JAVA_RUNNER_CLASSES, JAVA_RUNNER_SOURCE],
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except OSError:
+                return False
+            if built.returncode != 0:
+                return False
+        # The protocol runs over private pipes, not the JVM's stdin and
+        # stdout, so a submission writing to FileDescriptor.out can't forge
+        # a response
+        requests_read, requests_write = os.pipe()
+        responses_read, responses_write = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                ["java", "-Xmx%dm" % WARM_JVM_HEAP_MB, "-XX:+UseSerialGC", "-cp", JAVA_RUNNER_CLASSES, "JavaRunner",
+                 str(requests_read), str(responses_write)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                pass_fds=(requests_read, responses_write),
+                start_new_session=True,
+                preexec_fn=drop_to_run_uid,
+            )
+        except OSError:
+            self.process = None
+            for fd in (requests_read, requests_write, responses_read, responses_write):
+                os.close(fd)
+            return False
+        os.close(requests_read)
+        os.close(responses_write)
+        self.requests = os.fdopen(requests_write, "wb")
+        self.responses = os.fdopen(responses_read, "rb")
+        return True
+
+    def stop(self):
+        if self.process is not None:
+            kill_tree(self.process.pid)
+            self.process.wait()
+            self.process = None
+            for channel in (self.requests, self.responses):
+                try:
+                    channel.close()
+                except OSError:
+                    pass
+            self.requests = self.responses = None
+
+    def request(self, fields, timeout):
+        """
+        Send one tab-separated request and return the response fields, or
+        None if the JVM didn't answer in time or died.
+        """
+        if not self.ensure_started():
+            return None
+        # The submission runs inside the JVM, so cancelling takes it down
+        RUNNING_GROUPS.add(self.process.pid)
+        try:
+            self.requests.write("\t".join(fields).encode("utf-8") + b"\n")
+            self.requests.flush()
+            ready, _, _ = select.select([self.responses], [], [], timeout)
+            line = self.responses.readline() if ready else b""
+        except OSError:
+            line = b""
+        finally:
+            RUNNING_GROUPS.discard(self.process.pid)
+        if not line:
+            self.stop()
+            return None
+        return line.rstrip(b"\n").decode("utf-8").split("\t")
+
+    def compile(self, building, source, flags, time_limit):
+        """
+        Compile with the in-process javac.  Returns None on success, the
+        compiler output on a compile error, or False if the JVM failed and
+        the caller should fall back to the javac CLI.
+        """
+        response = self.request(["COMPILE", building, source] + list(flags), time_limit)
+        if response is None or response[0] not in ("OK", "FAIL"):
+            return False
+        if response[0] == "FAIL":
+            return base64.b64decode(response[1]).decode("utf-8", "replace")
+        return None
+
+    def run(self, artifact, workspace_path, input_bytes, time_limit, memory_limit_mb, capture):
+        """
+        Run Main from the artifact inside the warm JVM.  Returns None if the
+        JVM failed for reasons of its own, so the caller can fall back to a
+        cold java process.
+        """
+        # The JVM runs as the run uid, so the case's own streams are handed
+        # to it; it opens nothing else of the worker's
+        paths = {name: os.path.join(workspace_path, name) for name in ("stdin", "stdout", "stderr")}
+        for name, path in paths.items():
+            with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as stream_file:
+                if name == "stdin":
+                    stream_file.write(input_bytes)
+            give_to_run_uid(path)
+
+        started = time.monotonic()
+        response = self.request(
+            ["RUN", artifact, paths["stdin"], paths["stdout"], paths["stderr"], str(int(time_limit * 1000)),
+             str(capture.limit_bytes + 1)],
+            # JavaRunner enforces the limit itself; this only catches a JVM
+            # that stopped responding
+            time_limit + 2,
+        )
+        if response is None and time.monotonic() - started >= time_limit:
+            # The submission wedged the JVM; it has been killed already
+            response = ["DONE", "-9", "1", str(int((time.monotonic() - started) * 1000)), "0", "0", "0", "1"]
+        if response is None or response[0] != "DONE":
+            return None
+
+        for name in ("stdout", "stderr"):
+            capture.read_file(name, paths[name])
+
+        returncode, timed_out, time_ms, cpu_ms, memory_kb, out_of_memory = response[1:7]
+        returncode, time_ms, cpu_ms, memory_kb = int(returncode), int(time_ms), int(cpu_ms), int(memory_kb)
+        if out_of_memory == "1":
+            verdict = "MLE"
+        else:
+            verdict = classify(timed_out == "1", returncode, cpu_ms / 1000, memory_kb, time_limit, memory_limit_mb)
+        return capture.apply({
+            "returncode": returncode,
+            "time_ms": time_ms,
+            "cpu_ms": cpu_ms,
+            "memory_kb": memory_kb,
+            "verdict": verdict,
+        })
+
+
+JVM = WarmJVM()
+
+
+def artifact_path(artifact_id):
+    # Artifact ids are generated here; never let one escape the artifacts root.
+    if not artifact_id or os.path.basename(artifact_id) != artifact_id:
+        raise ValueError("Invalid artifact id")
+    return os.path.join(ARTIFACTS_ROOT, artifact_id)
+
+
+def bundle_path(bundle_id):
+    if not bundle_id or os.path.basename(bundle_id) != bundle_id or bundle_id.startswith("."):
+        raise ValueError("Invalid bundle id")
+    return os.path.join(BUNDLES_ROOT, bundle_id)
+
+
+def testdata_path(testdata_id):
+    if not testdata_id or os.path.basename(testdata_id) != testdata_id or testdata_id.startswith("."):
+        raise ValueError("Invalid test data id")
+    return os.path.join(TESTDATA_ROOT, testdata_id)
+
+
+def bundle_file(request, name):
+    with open(os.path.join(bundle_path(request["bundle"]), name), "rb") as bundle_member:
+        return bundle_member.read()
+
+
+def case_input(request, case):
+    # A test case's stdin: inline, from the problem's staged test data or
+    # from the submission's bundle
+    if "testdata" in request:
+        with open(os.path.join(testdata_path(request["testdata"]), "inputs", str(int(case))), "rb") as staged:
+            return staged.read()
+    if "bundle" in request:
+        return bundle_file(request, os.path.join("inputs", str(int(case))))
+    return request["input"].encode("utf-8")
+
+
+def unpack(data, root, target, allowed=None):
+    """
+    Extract a base64 tar into target, atomically.  Only plain files with
+    relative paths (under one of the allowed directories, if given) are
+    accepted.  Returns False if target already existed.
+    """
+    staging = tempfile.mkdtemp(prefix=".upload-", dir=root)
+    try:
+        with tarfile.open(fileobj=io.BytesIO(base64.b64decode(data))) as tar:
+            for member in tar.getmembers():
+                name = os.path.normpath(member.name)
+                if not member.isfile() or os.path.isabs(name) or name.startswith(".."):
+                    raise ValueError("Invalid bundle member: %s" % member.name)
+                if allowed is not None and name.split(os.sep, 1)[0] not in allowed:
+                    raise ValueError("Unexpected bundle member: %s" % member.name)
+                path = os.path.join(staging, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as member_file:
+                    shutil.copyfileobj(tar.extractfile(member), member_file)
+        if os.path.isdir(target):
+            # Someone else got there first (e.g. test data staged concurrently)
+            shutil.rmtree(staging, ignore_errors=True)
+            return False
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return True
+
+
+def expected_output(request, case):
+    # A test case's expected stdout, sent with the request (one string, or a
+    # list for a batch); None if there is nothing to check
+    expected = request.get("expected")
+    if isinstance(expected, list):
+        expected = expected[case]
+    return None if expected is None else expected.encode("utf-8")
+
+
+def output_limit_bytes(request):
+    return (request.get("output_limit_kb") or DEFAULT_OUTPUT_LIMIT_KB) * 1024
+
+
+def output_capture(request, case):
+    checker = None
+    expected = expected_output(request, case)
+    if expected is not None:
+        options = request.get("checker") or {}
+        checker = Checker(
+            expected,
+            options.get("mode", WHITESPACE),
+            options.get("ignore_case", False),
+            options.get("float_tolerance", 1e-6),
+        )
+    return OutputCapture(
+        output_limit_bytes(request),
+        (request.get("output_excerpt_kb") or DEFAULT_OUTPUT_EXCERPT_KB) * 1024,
+        checker,
+    )
+
+
+def handle_upload(request):
+    """
+    Unpack a submission bundle: a tar of code.<ext>, plus inputs/<case>
+    unless the cases come from staged test data.  Reports whether the
+    referenced test data is staged here.
+    """
+    unpack(request["data"], BUNDLES_ROOT, bundle_path(request["bundle"]))
+    response = {"bundle": request["bundle"]}
+    if "testdata" in request:
+        path = testdata_path(request["testdata"])
+        response["testdata_staged"] = os.path.isdir(path)
+        if response["testdata_staged"]:
+            # Still in use; keep it from being swept
+            os.utime(path)
+    return response
+
+
+def handle_stage(request):
+    """
+    Stage a problem's test data (a tar of inputs/<case>) under its content
+    hash, unless it is already here.
+    """
+    path = testdata_path(request["testdata"])
+    if not os.path.isdir(path):
+        unpack(request["data"], TESTDATA_ROOT, path, allowed=("inputs",))
+    return {"testdata": request["testdata"], "staged": True}
+
+
+def artifact_size(artifact):
+    total = 0
+    for directory, _, files in os.walk(artifact):
+        for name in files:
+            total += os.path.getsize(os.path.join(directory, name))
+    return total
+
+
+def compile_flags(toolchain, request):
+    flags = list(request.get("flags", []))
+    if toolchain.get("pch") and os.path.isdir(PCH_ROOT):
+        flags = ["-I", PCH_ROOT] + flags
+    return flags
+
+
+def compiler_cache_key(toolchain, building, source, flags, time_limit):
+    """
+    Hash of the compiler, the flags and the preprocessed source, so edits
+    that only touch comments or layout still hit.  None if the source
+    doesn't preprocess; the real compile then reports the error.
+    """
+    # Relative path so __FILE__ doesn't leak the random build directory
+    command = format_command(toolchain["preprocess"], building, os.path.basename(source))
+    result = run_limited(command[:1] + flags + command[1:], building, b"", time_limit)
+    if result["verdict"] != "OK":
+        return None
+    compiler = shutil.which(command[0])
+    if compiler is None:
+        return None
+    compiler_stat = os.stat(compiler)
+    digest = hashlib.sha256()
+    digest.update(json.dumps([compiler, compiler_stat.st_size, compiler_stat.st_mtime, flags]).encode("utf-8"))
+    digest.update(result["stdout"])
+    return digest.hexdigest()
+
+
+def restore_cached_build(key, toolchain, building):
+    entry = os.path.join(COMPILER_CACHE_ROOT, key)
+    try:
+        for name in toolchain["outputs"]:
+            shutil.copy2(os.path.join(entry, name), os.path.join(building, name))
+        # Mark as recently used for trimming
+        os.utime(entry)
+    except OSError:
+        return False
+    return True
+
+
+def store_cached_build(key, toolchain, building):
+    staging = tempfile.mkdtemp(prefix=".store-", dir=COMPILER_CACHE_ROOT)
+    try:
+        for name in toolchain["outputs"]:
+            shutil.copy2(os.path.join(building, name), os.path.join(staging, name))
+        os.rename(staging, os.path.join(COMPILER_CACHE_ROOT, key))
+    except OSError:
+        # Another worker stored the same key first
+        shutil.rmtree(staging, ignore_errors=True)
+        return
+    trim_compiler_cache()
+
+
+def trim_compiler_cache():
+    entries = [os.path.join(COMPILER_CACHE_ROOT, name) for name in os.listdir(COMPILER_CACHE_ROOT)
+               if not name.startswith(".")]
+    if len(entries) <= COMPILER_CACHE_MAX_ENTRIES:
+        return
+    entries.sort(key=lambda path: os.stat(path).st_mtime if os.path.exists(path) else 0)
+    for path in entries[:len(entries) - COMPILER_CACHE_MAX_ENTRIES]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def handle_compile(request):
+    toolchain = LANGUAGES.get(request["language"])
+    if not toolchain:
+        return {"error": "Unsupported language"}
+
+    # A content-addressed key lets every worker in the container share one
+    # compiled copy of byte-identical submissions.
+    artifact_id = request.get("key") or uuid.uuid4().hex
+    artifact = artifact_path(artifact_id)
+    if os.path.isdir(artifact):
+        touch(artifact)
+        return {"artifact": artifact_id, "size": artifact_size(artifact), "cached": True}
+
+    # The compiler runs as the run uid in a box of its own, like a program
+    with workspace() as path:
+        building = os.path.join(path, "box")
+        source = os.path.join(building, "code.%s" % toolchain["ext"])
+        if "bundle" in request:
+            shutil.copyfile(os.path.join(bundle_path(request["bundle"]), "code.%s" % toolchain["ext"]), source)
+        else:
+            with open(source, "w") as source_file:
+                source_file.write(request["source"])
+
+        flags = compile_flags(toolchain, request)
+        # One limit for the whole compile, however many steps it takes, so
+        # it ends within the backend's own timeout as a compile error
+        deadline = time.monotonic() + request.get("compile_time_limit", COMPILE_TIME_LIMIT)
+
+        def remaining():
+            return max(deadline - time.monotonic(), 0)
+
+        compiled = False
+        response = {}
+        if request.get("warm_jvm") and toolchain.get("warm_jvm"):
+            compile_error = JVM.compile(building, source, flags, remaining())
+            if compile_error:
+                return {"compile_error": compile_error}
+            compiled = compile_error is None
+
+        cache_key = None
+        if toolchain.get("preprocess") and not compiled:
+            cache_key = compiler_cache_key(toolchain, building, source, flags, remaining())
+            if cache_key and restore_cached_build(cache_key, toolchain, building):
+                compiled = True
+                response["compiler_cache"] = "hit"
+
+        if toolchain["compile"] and not compiled:
+            command = format_command(toolchain["compile"], building, source)
+            result = run_limited(command[:1] + flags + command[1:], building, b"", remaining())
+            if result["verdict"] != "OK":
+                compile_error = (result["stdout"] + result["stderr"]).decode("utf-8", "replace")
+                if result["verdict"] == "TLE":
+                    compile_error += "\nCompilation timed out."
+                return {"compile_error": compile_error}
+            if cache_key:
+                store_cached_build(cache_key, toolchain, building)
+                response["compiler_cache"] = "miss"
+
+        # Copied out of the box and renamed into place so a concurrent
+        # compile of the same key never sees a half-written artifact.
+        stored = tempfile.mkdtemp(prefix=".build-", dir=ARTIFACTS_ROOT)
+        try:
+            store_artifact(toolchain, building, stored)
+        except BaseException:
+            shutil.rmtree(stored, ignore_errors=True)
+            raise
+    try:
+        os.rename(stored, artifact)
+    except OSError:
+        # Somebody else finished the same key first; theirs is identical.
+        shutil.rmtree(stored, ignore_errors=True)
+    response.update({"artifact": artifact_id, "size": artifact_size(artifact), "cached": False})
+    if request.get("artifact_cache_max_bytes"):
+        trim_artifacts(request["artifact_cache_max_bytes"])
+    return response
+
+
+def store_artifact(toolchain, building, stored):
+    # Only what running needs: compiled languages leave their source (and
+    # anything else the build wrote) behind
+    for directory, _, files in os.walk(building):
+        for name in files:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, building)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            if not any(fnmatch.fnmatch(relative, pattern) for pattern in toolchain["artifact"]):
+                continue
+            target = os.path.join(stored, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(path, target)
+
+
+def touch(path):
+    # Mark as recently used for trimming
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def trim_artifacts(max_bytes):
+    # Least recently used first, skipping any that ran recently enough that
+    # a submission may still be using them; the backend recompiles one it
+    # finds gone.
+    entries = []
+    for name in os.listdir(ARTIFACTS_ROOT):
+        path = os.path.join(ARTIFACTS_ROOT, name)
+        if name.startswith("."):
+            continue
+        try:
+            entries.append((os.stat(path).st_mtime, artifact_size(path), path))
+        except OSError:
+            continue
+    total = sum(size for _, size, _ in entries)
+    idle_before = time.time() - ARTIFACT_MIN_IDLE
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes or mtime > idle_before:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def handle_run(request):
+    toolchain = LANGUAGES.get(request["language"])
+    if not toolchain:
+        return {"error": "Unsupported language"}
+
+    artifact = artifact_path(request["artifact"])
+    if not os.path.isdir(artifact):
+        return {"error": "Unknown artifact"}
+    touch(artifact)
+
+    time_limit = request.get("time_limit") or DEFAULT_TIME_LIMIT
+    memory_limit_mb = request.get("memory_limit_mb") or DEFAULT_MEMORY_LIMIT_MB
+    # The worker reads the case's input and hands it over on stdin; the
+    # program itself can open nothing outside its box
+    input_bytes = case_input(request, request.get("case"))
+
+    with workspace() as path:
+        box = os.path.join(path, "box")
+        load_artifact(artifact, box)
+        source = os.path.join(box, "code.%s" % toolchain["ext"])
+        result = None
+        if request.get("zygote") and toolchain.get("zygote"):
+            result = ZYGOTE.run(source, path, input_bytes, time_limit, memory_limit_mb,
+                                output_capture(request, request.get("case")))
+        elif request.get("warm_jvm") and toolchain.get("warm_jvm") and memory_limit_mb <= WARM_JVM_HEAP_MB:
+            # A larger limit than the shared heap can't be honoured in the
+            # warm JVM; such runs get a cold java with -Xmx of their own
+            result = JVM.run(box, path, input_bytes, time_limit, memory_limit_mb,
+                             output_capture(request, request.get("case")))
+        if result is None:
+            result = run_limited(
+                format_command(toolchain["run"], box, source, memory_mb=memory_limit_mb),
+                box,
+                input_bytes,
+                time_limit,
+                memory_limit_mb if toolchain.get("limit_address_space", True) else None,
+                output_capture(request, request.get("case")),
+            )
+    # Allocation failures under RLIMIT_AS (or the JVM heap cap) surface as
+    # runtime errors long before the resident size reaches the limit.
+    if result["verdict"] == "RE" and any(marker in result["stderr"] for marker in OUT_OF_MEMORY_MARKERS):
+        result["verdict"] = "MLE"
+
+    result["stdout"] = result["stdout"].decode("utf-8", "replace")
+    result["stderr"] = result["stderr"].decode("utf-8", "replace")
+    return result
+
+
+def harness_verdict(case, time_limit, memory_limit_mb):
+    if case.get("out_of_memory"):
+        return "MLE"
+    if case["time_ms"] > time_limit * 1000:
+        return "TLE"
+    if case["returncode"] != 0:
+        return "RE"
+    if case["memory_kb"] > memory_limit_mb * 1024:
+        return "MLE"
+    return "OK"
+
+
+def run_harness(command, cwd, inputs, time_limit, memory_limit_mb, output_limit):
+    """
+    Feed inputs one at a time to a single harness process, yielding each
+    case's result as it finishes.  Stops early when a case times out or the
+    harness dies; the caller restarts it for the remaining inputs.
+    """
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+        preexec_fn=limit_resources(time_limit * len(inputs), memory_limit_mb * 1024 * 1024),
+    )
+    RUNNING_GROUPS.add(process.pid)
+    try:
+        for input_text in inputs:
+            started = time.monotonic()
+            try:
+                process.stdin.write(json.dumps({
+                    "input": input_text,
+                    "output_limit": output_limit,
+                }).encode("utf-8") + b"\n")
+                process.stdin.flush()
+            except (BrokenPipeError, OSError):
+                pass
+            ready, _, _ = select.select([process.stdout], [], [], time_limit)
+            line = process.stdout.readline() if ready else b""
+            if line:
+                case = json.loads(line)
+                case["verdict"] = harness_verdict(case, time_limit, memory_limit_mb)
+                case.pop("out_of_memory", None)
+                yield case
+                continue
+
+            # Timed out, or the interpreter died (e.g. hit RLIMIT_AS/CPU)
+            elapsed = time.monotonic() - started
+            kill_tree(process.pid)
+            returncode = process.wait()
+            yield {
+                "stdout": "",
+                "stderr": "",
+                "returncode": returncode,
+                "time_ms": int(elapsed * 1000),
+                "cpu_ms": 0,
+                "memory_kb": 0,
+                "verdict": "TLE" if not ready or returncode == -signal.SIGXCPU else "RE",
+            }
+            break
+    finally:
+        kill_tree(process.pid)
+        RUNNING_GROUPS.discard(process.pid)
+        process.wait()
+
+
+def feed_output(capture, result):
+    """
+    Check output the harness collected the way run_limited checks it live:
+    chunk by chunk, ignoring the rest once the verdict is settled.  Output
+    that goes wrong before the limit is a wrong answer in both modes.
+    """
+    for name in ("stdout", "stderr"):
+        data = result[name].encode("utf-8")
+        for start in range(0, len(data), CHUNK_BYTES):
+            if not capture.add(name, data[start:start + CHUNK_BYTES]):
+                return
+
+
+def handle_run_batch(request):
+    toolchain = LANGUAGES.get(request["language"])
+    if not toolchain or "harness" not in toolchain:
+        return {"error": "Batch runs are not supported for this language"}
+
+    artifact = artifact_path(request["artifact"])
+    if not os.path.isdir(artifact):
+        return {"error": "Unknown artifact"}
+    touch(artifact)
+
+    time_limit = request.get("time_limit") or DEFAULT_TIME_LIMIT
+    memory_limit_mb = request.get("memory_limit_mb") or DEFAULT_MEMORY_LIMIT_MB
+    if "cases" in request:
+        cases = request["cases"]
+        inputs = [case_input(request, case).decode("utf-8", "replace") for case in cases]
+    else:
+        inputs = request["inputs"]
+        cases = list(range(len(inputs)))
+
+    # With stop_on_first_failure the batch ends at the first failing case;
+    # the backend skips the ones after it
+    results = []
+    with workspace() as path:
+        box = os.path.join(path, "box")
+        load_artifact(artifact, box)
+        command = format_command(toolchain["harness"], box, os.path.join(box, "code.%s" % toolchain["ext"]))
+        while len(results) < len(inputs):
+            # The harness keeps one byte past the limit, so going over it shows
+            with closing(run_harness(command, box, inputs[len(results):], time_limit, memory_limit_mb,
+                                     output_limit_bytes(request) + 1)) as harness:
+                for result in harness:
+                    capture = output_capture(request, cases[len(results)])
+                    feed_output(capture, result)
+                    capture.apply(result)
+                    result["stdout"] = result["stdout"].decode("utf-8", "replace")
+                    result["stderr"] = result["stderr"].decode("utf-8", "replace")
+                    results.append(result)
+                    if request.get("stop_on_first_failure") and result["verdict"] != "OK":
+                        return {"results": results}
+    return {"results": results}
+
+
+def handle_warm(request):
+    # The pool dedicates this worker to one language; start its warm runtime
+    # now so the first run doesn't pay for it
+    toolchain = LANGUAGES.get(request.get("language"), {})
+    warm = []
+    if request.get("zygote") and toolchain.get("zygote"):
+        ZYGOTE.ensure_started()
+        warm.append("zygote")
+    if request.get("warm_jvm") and toolchain.get("warm_jvm") and JVM.ensure_started():
+        warm.append("jvm")
+    return {"ok": True, "warm": warm}
+
+
+def handle_discard(request):
+    if "bundle" in request:
+        shutil.rmtree(bundle_path(request["bundle"]), ignore_errors=True)
+    if "artifact" in request:
+        shutil.rmtree(artifact_path(request["artifact"]), ignore_errors=True)
+    return {"ok": True}
+
+
+HANDLERS = {
+    "ping": handle_ping,
+    "upload": handle_upload,
+    "stage": handle_stage,
+    "compile": handle_compile,
+    "run": handle_run,
+    "run_batch": handle_run_batch,
+    "warm": handle_warm,
+    "discard": handle_discard,
+}
+
+
+def stop(signum, frame):
+    # The backend cancelled the request in progress; stop its programs now
+    # rather than leaving them to their time limits
+    for pid in list(RUNNING_GROUPS):
+        kill_tree(pid)
+    os._exit(1)
+
+
+def main():
+    global RUN_UID
+    signal.signal(signal.SIGTERM, stop)
+    channel_in = sys.stdin.buffer
+    channel_out = sys.stdout.buffer
+    # Nothing but protocol messages may reach the real stdout.
+    sys.stdout = sys.stderr
+    prepare_roots()
+    RUN_UID = claim_run_uid()
+    sweep_stale_workspaces()
+
+    for line in channel_in:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            handler = HANDLERS.get(request.get("op"))
+            if handler is None:
+                response = {"error": "Unknown op: %s" % request.get("op")}
+            else:
+                response = handler(request)
+        except Exception as e:
+            response = {"error": str(e)}
+        channel_out.write(json.dumps(response).encode("utf-8") + b"\n")
+        channel_out.flush()
+
+
+if __name__ == "__main__":
+    main()
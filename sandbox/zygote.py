@@ -0,0 +1,177 @@
+"""
+Preforked Python zygote.
+
+One zygote runs next to each sandbox worker with the standard library
+modules submissions commonly use already imported.  For every JSON line on
+stdin it fork()s a child that runs the requested program with stdin, stdout
+and stderr rewired to the case's files, reports the child's pid, waits for
+it under the time limit and answers with one more JSON line.  Children start in a few milliseconds
+because there is no interpreter start-up or import cost left to pay.
+"""
+import json
+import os
+import resource
+import signal
+import sys
+import time
+import traceback
+
+# Modules students reach for most; importing them here makes them free in
+# every child.
+PRELOADED_MODULES = (
+    "array", "bisect", "collections", "copy", "datetime", "decimal",
+    "fractions", "functools", "heapq", "io", "itertools", "math",
+    "operator", "random", "re", "statistics", "string", "typing",
+)
+
+for _name in PRELOADED_MODULES:
+    try:
+        __import__(_name)
+    except ImportError:
+        pass
+
+
+class Expired(Exception):
+    pass
+
+
+def on_alarm(signum, frame):
+    raise Expired()
+
+
+def run_child(request):
+    # Runs in the forked child and never returns
+    try:
+        os.setsid()
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        cpu = int(request["time_limit"]) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        memory = request["memory_limit_mb"] * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        # Caps the redirected stdout/stderr files
+        output = request["output_limit_bytes"]
+        resource.setrlimit(resource.RLIMIT_FSIZE, (output, output))
+        os.chdir(request["cwd"])
+
+        for fd, path, flags in (
+            (0, request["stdin_path"], os.O_RDONLY),
+            (1, request["stdout_path"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC),
+            (2, request["stderr_path"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC),
+        ):
+            opened = os.open(path, flags, 0o600)
+            os.dup2(opened, fd)
+            os.close(opened)
+        for fd in request["close_fds"]:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        # The streams were opened as root; from here on the child is the
+        # worker's run uid and can open nothing outside its box
+        if request.get("uid") is not None:
+            os.setgroups([])
+            os.setgid(request["uid"])
+            os.setuid(request["uid"])
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", closefd=False)
+        sys.argv = [request["source"]]
+        sys.path[0] = os.path.dirname(request["source"])
+    except BaseException:
+        os._exit(127)
+
+    returncode = 0
+    try:
+        with open(request["source"]) as source_file:
+            code = compile(source_file.read(), request["source"], "exec")
+        exec(code, {"__name__": "__main__", "__file__": request["source"], "__builtins__": __builtins__})
+    except SystemExit as e:
+        if e.code is None:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
+        else:
+            sys.stderr.write("%s\n" % e.code)
+            returncode = 1
+    except SyntaxError:
+        error_type, error, _ = sys.exc_info()
+        sys.stderr.write("".join(traceback.format_exception_only(error_type, error)))
+        returncode = 1
+    except BaseException:
+        # Leave the zygote's own frame out of the traceback
+        error_type, error, tb = sys.exc_info()
+        traceback.print_exception(error_type, error, tb.tb_next)
+        returncode = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        pass
+    os._exit(returncode & 0xFF)
+
+
+def run(request, close_fds, channel):
+    request["close_fds"] = close_fds
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        run_child(request)
+    # The worker kills the child directly if its request is cancelled
+    channel.write(json.dumps({"pid": pid}).encode("utf-8") + b"\n")
+    channel.flush()
+
+    timed_out = False
+    status = usage = None
+    signal.setitimer(signal.ITIMER_REAL, request["time_limit"])
+    try:
+        _, status, usage = os.wait4(pid, 0)
+    except Expired:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+        if status is None:
+            timed_out = True
+            _, status, usage = os.wait4(pid, 0)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    # Take down anything the program left running in the background
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+    if os.WIFSIGNALED(status):
+        returncode = -os.WTERMSIG(status)
+    else:
+        returncode = os.WEXITSTATUS(status)
+    return {
+        "returncode": returncode,
+        "timed_out": timed_out,
+        "time_ms": int((time.monotonic() - started) * 1000),
+        "cpu_ms": int((usage.ru_utime + usage.ru_stime) * 1000),
+        "memory_kb": usage.ru_maxrss,
+    }
+
+
+def main():
+    signal.signal(signal.SIGALRM, on_alarm)
+    requests = os.fdopen(os.dup(0), "rb")
+    channel = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    # Children must not inherit the protocol channel
+    close_fds = [requests.fileno(), channel.fileno()]
+
+    for line in requests:
+        if not line.strip():
+            continue
+        response = run(json.loads(line), close_fds, channel)
+        channel.write(json.dumps(response).encode("utf-8") + b"\n")
+        channel.flush()
+
+
+if __name__ == "__main__":
+    main()